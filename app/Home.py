@@ -1,13 +1,20 @@
 import streamlit as st
 
+import warmup
+
+
 st.set_page_config(
     page_title="SalesForce Explorer",
     page_icon="💸"
 )
+# Once per server process, in the background so the page renders at once
+warmup_thread = warmup.start_background()
 
 st.write("# Analytics Dashboard")
 
 st.sidebar.success("Select a View")
+if warmup_thread.is_alive():
+    st.sidebar.caption("Warming up caches, the first page load may be slower")
 
 st.markdown(
     """
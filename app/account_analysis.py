@@ -1,20 +1,21 @@
 from typing import (Dict, Optional)
+from datetime import date
 import re
 import json
 import warnings
 
 import numpy as np
 import pandas as pd
-import plotly.express as px
-
-import pyvis
 
 import neo4j
 
+# plotly and pyvis are imported by the functions that draw, see
+# scripts/import_budget.py
+
 try:
-    from utils import GraphConnector
+    from utils import (GraphConnector, date_range_filter, where_clause)
 except:
-    from .utils import GraphConnector
+    from .utils import (GraphConnector, date_range_filter, where_clause)
 
 ###########
 # GLOBALS #
@@ -93,31 +94,165 @@ def get_node_company_name(acct_num: int, conn: GraphConnector):
     return company_name
 
 
-def get_account_opportunities(acct_num: int, conn: GraphConnector):
+def get_account_opportunities(acct_num: int,
+                              conn: GraphConnector,
+                              start: Optional[date]=None,
+                              end: Optional[date]=None
+                             ):
+    """
+    Retrieves the opportunities of an account
+
+    Parameters
+    ----------
+    acct_num
+        The AccountId for the desired account
+    conn
+        connection to the Neo4j database
+    start, end
+        only include opportunities opened in this inclusive date range
+    """
+    predicates, params = date_range_filter('opp', start, end)
     query = (
-        "MATCH (acct:Account {accountId: $acct_num})-[]-(opp:Opportunity) "
-        "MATCH (opp)-[]-(con:Contact) "
-        "MATCH (opp)-[]-(src:Source) "
-        "MATCH (opp)-[]-(stg:Stage) "
-        "MATCH (opp)-[]-(opt:OpportunityType) "
-        "RETURN opp.name, opp.closedDate, opp.amount, "
+        "MATCH (acct:Account {accountId: $acct_num})<-[:WITH]-(opp:Opportunity) "
+        + where_clause(predicates)
+        + "MATCH (opp)-[:WORKING_WITH]->(con:Contact) "
+        "MATCH (opp)-[:SOURCED_FROM]->(src:Source) "
+        "MATCH (opp)-[:IN_STAGE]->(stg:Stage) "
+        "MATCH (opp)-[:HAS_TYPE]->(opt:OpportunityType) "
+        "RETURN opp.name, toString(opp.closedDate), opp.amount, "
         "opp.description, con.name, src.source, "
         "stg.stage, opt.type;"
     )
     result = conn.query(
         query,
         acct_num=acct_num,
-        result_transformer_=neo4j.Result.data
+        result_transformer_=neo4j.Result.data,
+        **params
     )
     result = pd.DataFrame().from_dict(result)
     return result
 
 
+def get_account_contacts(acct_num: int, conn: GraphConnector):
+    """
+    Retrieves the contacts of an account with their place in the reporting
+    hierarchy. Management chains are precomputed by the loaders, so the top
+    manager is a single index seek instead of a REPORTS_TO traversal.
+    """
+    query = (
+        "MATCH (acct:Account {accountId: $acct_num})<-[:WORKS_FOR]-(con:Contact) "
+        "OPTIONAL MATCH (top:Contact {contactId: con.topManagerId}) "
+        "RETURN con.name AS `Name`, con.title AS `Title`, "
+        "con.depth AS `Level`, con.directReports AS `Direct Reports`, "
+        "con.spanOfControl AS `Span of Control`, top.name AS `Top Manager` "
+        "ORDER BY `Level`, `Span of Control` DESC;"
+    )
+    result = conn.query(
+        query,
+        acct_num=acct_num,
+        result_transformer_=neo4j.Result.to_df
+    )
+    return result
+
+
+def get_accounts_summary(acct_nums: list, conn: GraphConnector):
+    """
+    Retrieves summary information for several accounts in a single round
+    trip
+
+    Parameters
+    ----------
+    acct_nums : list[int]
+        The AccountIds for the desired accounts
+    """
+    query = (
+        "UNWIND $acct_nums AS acctNum "
+        "MATCH (acct:Account {accountId: acctNum}) "
+        "OPTIONAL MATCH (acct)-[:SHIPPING_ADR_IN]->(st:State) "
+        "OPTIONAL MATCH (acct)-[:HAS_ANNUAL_REVENUE]->(ar:AnnualRevenue) "
+        "OPTIONAL MATCH (acct)-[:GIVEN_RATING]->(rt:Rating) "
+        "RETURN acct.accountId AS `Account Id`, acct.name AS `Company Name`, "
+        "acct.type AS `Type`, st.state AS `State`, "
+        "ar.annualRevenue AS `Annual Revenue`, rt.rating AS `Rating`, "
+        "COUNT { (acct)<-[:WORKS_FOR]-(:Contact) } AS `Contacts`;"
+    )
+    result = conn.query(
+        query,
+        acct_nums=list(acct_nums),
+        result_transformer_=neo4j.Result.to_df
+    )
+    return result
+
+
+def get_accounts_opportunities(acct_nums: list,
+                               conn: GraphConnector,
+                               start: Optional[date]=None,
+                               end: Optional[date]=None
+                              ):
+    """
+    Retrieves the opportunities for several accounts in a single round trip.
+    Columns match `get_account_opportunities` with the account id first.
+    """
+    predicates, params = date_range_filter('opp', start, end)
+    query = (
+        "UNWIND $acct_nums AS acctNum "
+        "MATCH (acct:Account {accountId: acctNum})<-[:WITH]-(opp:Opportunity) "
+        + where_clause(predicates)
+        + "MATCH (opp)-[:WORKING_WITH]->(con:Contact) "
+        "MATCH (opp)-[:SOURCED_FROM]->(src:Source) "
+        "MATCH (opp)-[:IN_STAGE]->(stg:Stage) "
+        "MATCH (opp)-[:HAS_TYPE]->(opt:OpportunityType) "
+        "RETURN acct.accountId, opp.name, toString(opp.closedDate), "
+        "opp.amount, opp.description, con.name, src.source, "
+        "stg.stage, opt.type;"
+    )
+    result = conn.query(
+        query,
+        acct_nums=list(acct_nums),
+        result_transformer_=neo4j.Result.data,
+        **params
+    )
+    result = pd.DataFrame().from_dict(result)
+    return result
+
+
+def get_accounts_stage_breakdown(acct_nums: list,
+                                 conn: GraphConnector,
+                                 start: Optional[date]=None,
+                                 end: Optional[date]=None
+                                ):
+    """
+    Retrieves the number and value of opportunities per stage for several
+    accounts in a single round trip
+    """
+    predicates, params = date_range_filter('opp', start, end)
+    query = (
+        "UNWIND $acct_nums AS acctNum "
+        "MATCH (acct:Account {accountId: acctNum})<-[:WITH]-(opp:Opportunity) "
+        + where_clause(predicates)
+        + "MATCH (opp)-[:IN_STAGE]->(stg:Stage) "
+        "RETURN acct.accountId AS `Account Id`, stg.stage AS `Stage`, "
+        "COUNT(opp) AS `Opportunities`, "
+        "SUM(toInteger(opp.amount)) AS `Amount (USD)`;"
+    )
+    result = conn.query(
+        query,
+        acct_nums=list(acct_nums),
+        result_transformer_=neo4j.Result.to_df,
+        **params
+    )
+    return result
+
+
 #######################
 # DATA PROC FUNCTIONS #
 #######################
 
 def preproc_results_dataframe(result):
+    # Multi-account results carry the account id as an extra first column
+    acct_ids = None
+    if 'acct.accountId' in result.columns:
+        acct_ids = result.pop('acct.accountId')
     result.columns = [
         'Opp Name',
         'Closed Date',
@@ -150,6 +285,8 @@ def preproc_results_dataframe(result):
     # Remove date in Closed Date if Stage not Closed *
     idx = (~result['Stage'].str.contains('Closed'))
     result.loc[idx, 'Closed Date'] = ''
+    if acct_ids is not None:
+        result.insert(0, 'Account Id', acct_ids.values)
     return result
 
 
@@ -198,12 +335,58 @@ def opportunity_summary(result):
     return metrics, dfs
 
 
-def get_financial_sentiments(acct_num: int):
-    data = json.load(
-        open('./app/resources/sample_preds.json', 'r')
-    )
-    data = data[str(acct_num)]
-    return data
+def opportunity_summary_by_account(result):
+    """
+    Vectorized `opportunity_summary` metrics for many accounts at once
+
+    Parameters
+    ----------
+    result : pd.DataFrame
+        Preprocessed opportunity data with an 'Account Id' column
+
+    RETURNS
+    -------
+    pd.DataFrame
+        One row per account with the same metrics as `opportunity_summary`
+    """
+    stage = result['Stage']
+    amount = result['Amount (USD)'].astype(int)
+    lost = stage.str.contains('Closed Lost')
+    won = stage.str.contains('Closed Won')
+    open_ = ~stage.str.contains('Closed')
+
+    values = pd.DataFrame({
+        "Total Account Value": amount.where(~lost, 0),
+        "Total Closed Won Opp Value": amount.where(won, 0),
+        "Total Closed Lost Opp Value": amount.where(lost, 0),
+        "Total Open Opp Value": amount.where(open_, 0),
+        "Opportunities": 1,
+        "Open Opportunities": open_.astype(int)
+    })
+    metrics = values.groupby(result['Account Id'].values).sum()
+    metrics.index.name = 'Account Id'
+
+    total = metrics["Total Account Value"]
+    closed_won = metrics["Total Closed Won Opp Value"]
+    closed_lost = metrics["Total Closed Lost Opp Value"]
+    metrics["% Total Value Closed"] = closed_won / total
+    metrics["% Closed Value Won"] = closed_won / (1+closed_won + closed_lost)
+    metrics["% Total Value Open"] = metrics["Total Open Opp Value"] / total
+    return metrics
+
+
+def get_financial_sentiments(acct_num: int,
+                             path: str='./app/resources/sample_preds.json'
+                            ):
+    """
+    Retrieves the Item 7 sentence sentiments for an account from the
+    sentiment store written by `models/inference/sentiment_batch.py`
+
+    Returns None if no sentiments have been computed for the account.
+    """
+    with open(path, 'r') as f:
+        data = json.load(f)
+    return data.get(str(acct_num))
 
 
 def get_dist_stats_sentiment(data: list):
@@ -241,6 +424,8 @@ def interpret_value(val: float):
 #################
 
 def opportunity_summary_graphs(dfs):
+    import plotly.express as px
+
     # Data formatting
     total_opps = dfs['TotalOpps'][['Amount (USD)']]
     closed_won_opps = dfs['ClosedWonOpps'][['Amount (USD)']]
@@ -282,6 +467,8 @@ def visualize_graph(
     graph,
     node_text_properties: Dict = NODE_TEXT_PROPERTIES
 ):
+    import pyvis.network
+
     viz = pyvis.network.Network(
         height='750px',
         width='100%',
@@ -308,7 +495,33 @@ def visualize_graph(
     return viz
 
 
+def comparison_stage_chart(breakdown: pd.DataFrame):
+    """
+    Grouped bar chart of opportunity value per stage for each account
+
+    Parameters
+    ----------
+    breakdown : pd.DataFrame
+        Output of `get_accounts_stage_breakdown`
+    """
+    import plotly.express as px
+
+    data = breakdown.copy()
+    data['Account Id'] = data['Account Id'].astype(str)
+    fig = px.bar(
+        data,
+        x='Stage',
+        y='Amount (USD)',
+        color='Account Id',
+        barmode='group',
+        hover_data=['Opportunities']
+    )
+    return fig
+
+
 def create_sentiment_dist(data):
+    import plotly.express as px
+
     fig = px.histogram(
         data,
         marginal='violin'
@@ -0,0 +1,148 @@
+"""
+Concurrent loading of everything the Account View needs for an account.
+
+The reads for an account are independent of each other, so they are started
+together on a thread pool over a single shared driver instead of one after
+another. Loaded accounts are kept in a small cache, which also lets the page
+prefetch the neighbouring accounts in the selector in the background.
+"""
+from typing import (Dict, Iterable, Optional)
+from collections import OrderedDict
+from concurrent.futures import (Future, ThreadPoolExecutor)
+from dataclasses import dataclass
+import threading
+import time
+
+import pandas as pd
+from neo4j.graph import Graph
+
+try:
+    from utils import (CheckedConnector, GraphConnector)
+    from opportunity_engine import get_opportunity_engine
+    import account_analysis as aa
+except:
+    from .utils import (CheckedConnector, GraphConnector)
+    from .opportunity_engine import get_opportunity_engine
+    from . import account_analysis as aa
+
+
+@dataclass
+class AccountBundle:
+    """
+    All of the data the Account View renders for a single account
+    """
+    acct_num: int
+    subgraph: Graph
+    company_name: str
+    opportunities: pd.DataFrame
+    sentiments: Optional[list]
+
+
+class AccountLoader:
+    def __init__(self,
+                 conn: GraphConnector,
+                 max_workers: int = 8,
+                 cache_size: int = 16,
+                 max_age: float = 300.0,
+                 use_engine: bool = False
+                ):
+        """
+        Parameters
+        ----------
+        conn
+            connection shared by all reads. The neo4j driver is thread safe.
+        max_workers
+            threads used for the reads
+        cache_size
+            number of loaded or in-flight accounts to keep
+        max_age
+            seconds before a cached account is fetched again
+        use_engine
+            slice opportunities from the in-memory opportunity engine
+            instead of querying them per account
+        """
+        self.conn = conn
+        # Reads raise on query errors, so a failed load is never cached
+        self._checked = CheckedConnector(conn)
+        self.cache_size = cache_size
+        self.max_age = max_age
+        self.use_engine = use_engine
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='account-loader'
+        )
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _submit(self, acct_num: int) -> Dict[str, Future]:
+        submit = self._pool.submit
+        return {
+            'subgraph': submit(
+                aa.get_account_subgraph, acct_num, self._checked
+            ),
+            'company_name': submit(
+                aa.get_node_company_name, acct_num, self._checked
+            ),
+            'opportunities': submit(self._opportunities, acct_num),
+            'sentiments': submit(aa.get_financial_sentiments, acct_num)
+        }
+
+    def _opportunities(self, acct_num: int):
+        if self.use_engine:
+            engine = get_opportunity_engine(self._checked)
+            return engine.account_opportunities(acct_num)
+        return aa.get_account_opportunities(acct_num, self._checked)
+
+    def _futures(self, acct_num: int) -> Dict[str, Future]:
+        with self._lock:
+            entry = self._cache.get(acct_num)
+            if entry is not None and time.monotonic()-entry[0] < self.max_age:
+                self._cache.move_to_end(acct_num)
+                return entry[1]
+            futures = self._submit(acct_num)
+            self._cache[acct_num] = (time.monotonic(), futures)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return futures
+
+    def load(self, acct_num: int) -> AccountBundle:
+        """
+        Returns the bundle for an account, waiting on any reads still in
+        flight. A failed load is evicted so the next call retries it.
+        """
+        futures = self._futures(acct_num)
+        try:
+            results = {k: f.result() for k, f in futures.items()}
+        except Exception:
+            self.invalidate(acct_num)
+            raise
+        return AccountBundle(acct_num=acct_num, **results)
+
+    def prefetch(self, acct_nums: Iterable[int]):
+        """
+        Starts loading accounts in the background without waiting on them
+        """
+        for acct_num in acct_nums:
+            self._futures(acct_num)
+
+    def invalidate(self, acct_num: Optional[int] = None):
+        with self._lock:
+            if acct_num is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(acct_num, None)
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self.conn.close()
+
+
+def neighbours(acct_nums: list, acct_num: int, n: int = 1):
+    """
+    Returns the n accounts before and after `acct_num` in the selector order
+    """
+    idx = acct_nums.index(acct_num)
+    return [
+        acct_nums[i] for i in range(idx-n, idx+n+1)
+        if 0 <= i < len(acct_nums) and i != idx
+    ]
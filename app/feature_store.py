@@ -0,0 +1,268 @@
+"""
+Columnar store of the subscription model's features.
+
+The subscription pipeline engineers the same features for every organization
+that the model was trained on. The store keeps them as one matrix with a row
+per organization, in the column order the model expects, next to a sorted
+array of organization ids:
+
+    models/features/sub/
+        organization_id.npy     sorted ids, one per row
+        features.npy            float32 matrix, columns in `SUB_FEATURES` order
+        manifest.json           features, number of rows, data hash, ...
+
+Both arrays are memory-mapped on load. Looking up organizations is a binary
+search over the ids followed by a row gather, so a whole cohort is scored
+with a single `predict_proba` call on a slice of the matrix.
+
+Example
+-------
+python app/feature_store.py
+python app/feature_store.py --lookup 501 502 503
+"""
+from typing import (List, Optional, Sequence)
+import argparse
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+try:
+    from model_registry import (data_hash, write_atomic)
+except:
+    from .model_registry import (data_hash, write_atomic)
+
+
+FEATURE_STORE_DIR = './models/features/sub/'
+IDS_FILE = 'organization_id.npy'
+MATRIX_FILE = 'features.npy'
+MANIFEST_FILE = 'manifest.json'
+KEY = 'organization_id'
+
+# Tree ensembles in sklearn predict on float32, storing it avoids a copy
+DTYPE = np.float32
+
+# Input columns of the subscription model, in training order
+SUB_FEATURES = (
+    [f'num_passes_week_{i}' for i in range(1, 7)]
+    + [f'num_failures_week_{i}' for i in range(1, 7)]
+    + [f'sum_test_duration_week_{i}' for i in range(1, 7)]
+    + [f'num_members_added_week_{i}' for i in range(1, 7)]
+    + [
+        'first_run_at_minus_organization_created_at',
+        'first_used_feature_a_minus_organization_created_at',
+        'first_used_feature_a_minus_first_run_at',
+        'first_used_feature_b_minus_organization_created_at',
+        'first_used_feature_b_minus_first_run_at',
+        'first_used_feature_b_minus_first_used_feature_a',
+    ]
+)
+
+
+class FeatureStore:
+    def __init__(self,
+                 ids: np.ndarray,
+                 matrix: np.ndarray,
+                 features: List[str]=SUB_FEATURES,
+                 manifest: Optional[dict]=None
+                ):
+        """
+        Parameters
+        ----------
+        ids
+            sorted organization ids, one per row of `matrix`
+        matrix
+            features per organization, columns in `features` order
+        features
+            feature names
+        manifest
+            metadata the store was saved with
+        """
+        if len(ids) != len(matrix):
+            raise ValueError(
+                f"{len(ids)} ids for a matrix of {len(matrix)} rows"
+            )
+        self.ids = ids
+        self.matrix = matrix
+        self.features = list(features)
+        self.manifest = manifest or {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, org_id):
+        return bool(self.positions([org_id])[1][0])
+
+    ############
+    # BUILDING #
+    ############
+
+    @classmethod
+    def from_frame(cls, data, features: List[str]=SUB_FEATURES):
+        """
+        Builds the store from the output of the subscription pipeline
+
+        Parameters
+        ----------
+        data
+            DataFrame with an `organization_id` column and every feature
+        features
+            columns to keep, in model order
+
+        RETURNS
+        -------
+        FeatureStore
+        """
+        missing = [f for f in features if f not in data.columns]
+        if missing:
+            raise KeyError(f"Missing features: {', '.join(missing)}")
+        data = data.drop_duplicates(subset=[KEY], keep='last')
+        ids = data[KEY].to_numpy(dtype=np.int64)
+        order = np.argsort(ids, kind='stable')
+        matrix = np.ascontiguousarray(
+            data[list(features)].fillna(0).to_numpy(dtype=DTYPE)[order]
+        )
+        return cls(ids[order], matrix, features)
+
+    ###########
+    # STORAGE #
+    ###########
+
+    def save(self, path: str=FEATURE_STORE_DIR):
+        """
+        Writes the arrays, then the manifest. `load` checks the arrays
+        against the manifest, so a reader never pairs old ids with a new
+        matrix.
+        """
+        os.makedirs(path, exist_ok=True)
+        for name, arr in ((IDS_FILE, self.ids), (MATRIX_FILE, self.matrix)):
+            tmp = os.path.join(path, f".tmp-{name}")
+            with open(tmp, 'wb') as f:
+                np.save(f, arr)
+            os.replace(tmp, os.path.join(path, name))
+        self.manifest = {
+            'features': self.features,
+            'rows': len(self),
+            'dtype': np.dtype(self.matrix.dtype).name,
+            'data_hash': data_hash(self.ids, self.matrix),
+            'created_at': time.time()
+        }
+        write_atomic(
+            os.path.join(path, MANIFEST_FILE),
+            json.dumps(self.manifest, indent=2)
+        )
+        return path
+
+    @classmethod
+    def load(cls, path: str=FEATURE_STORE_DIR, mmap_mode: Optional[str]='r'):
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+        ids = np.load(os.path.join(path, IDS_FILE), mmap_mode=mmap_mode)
+        matrix = np.load(os.path.join(path, MATRIX_FILE), mmap_mode=mmap_mode)
+        if len(ids) != manifest['rows'] or len(matrix) != manifest['rows']:
+            raise ValueError(f"Feature store {path} is being rewritten")
+        return cls(ids, matrix, manifest['features'], manifest)
+
+    ##########
+    # LOOKUP #
+    ##########
+
+    def positions(self, org_ids: Sequence[int]):
+        """
+        Rows of the given organizations
+
+        RETURNS
+        -------
+        tuple[np.ndarray, np.ndarray]
+            row positions and whether each organization is in the store.
+            Positions of missing organizations are not meaningful.
+        """
+        org_ids = np.asarray(org_ids, dtype=np.int64)
+        pos = np.searchsorted(self.ids, org_ids)
+        pos = np.minimum(pos, max(len(self.ids)-1, 0))
+        found = (
+            self.ids[pos] == org_ids if len(self.ids)
+            else np.zeros(len(org_ids), dtype=bool)
+        )
+        return pos, found
+
+    def rows(self,
+             org_ids: Sequence[int],
+             features: Optional[List[str]]=None
+            ):
+        """
+        Gathers the feature rows of the given organizations
+
+        Parameters
+        ----------
+        org_ids
+            organization ids
+        features
+            column order to return, e.g. the features recorded for a model
+            version. Defaults to the store's order.
+
+        RETURNS
+        -------
+        np.ndarray
+            one row per organization id
+        """
+        pos, found = self.positions(org_ids)
+        if not found.all():
+            missing = np.asarray(org_ids)[~found]
+            raise KeyError(f"Unknown organizations: {missing.tolist()[:10]}")
+        matrix = self.matrix[pos]
+        if features is not None and list(features) != self.features:
+            matrix = matrix[:, [self.features.index(f) for f in features]]
+        return matrix
+
+
+_STORE = None
+_STORE_KEY = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_feature_store(path: str=FEATURE_STORE_DIR):
+    """
+    The process-wide store, reloaded when the manifest is rewritten. None if
+    the store has not been built.
+    """
+    global _STORE, _STORE_KEY
+    try:
+        key = (path, os.stat(os.path.join(path, MANIFEST_FILE)).st_mtime_ns)
+    except FileNotFoundError:
+        return None
+    with _STORE_LOCK:
+        if _STORE_KEY != key:
+            _STORE = FeatureStore.load(path)
+            _STORE_KEY = key
+        return _STORE
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Build the subscription feature store"
+    )
+    parser.add_argument('--path', default=FEATURE_STORE_DIR)
+    parser.add_argument('--lookup', nargs='*', type=int, default=None,
+                        help="print the features of these organizations "
+                             "instead of building the store")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.lookup is not None:
+        store = FeatureStore.load(args.path)
+        for org_id, row in zip(args.lookup, store.rows(args.lookup)):
+            print(org_id, dict(zip(store.features, row.tolist())))
+    else:
+        from global_analysis import sub_data_pipeline
+        start = time.perf_counter()
+        store = FeatureStore.from_frame(sub_data_pipeline())
+        store.save(args.path)
+        print(
+            f"Wrote {len(store)} organizations x {len(store.features)} "
+            f"features to {args.path} in {time.perf_counter()-start:.2f}s"
+        )
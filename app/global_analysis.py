@@ -1,18 +1,30 @@
+from typing import Optional
+from datetime import date
+from functools import lru_cache
 import re
-import joblib
 
+import numpy as np
 import pandas as pd
-import plotly.express as px
-import pydeck as pdk
-
-from sklearn.preprocessing import StandardScaler
 
 import neo4j
 
+# plotly and pydeck are imported by the chart builders that use them, so
+# pages that render no charts do not pay for them on import. See
+# scripts/import_budget.py.
+
 try:
-    from utils import GraphConnector
+    from utils import (GraphConnector, date_range_filter, where_clause)
+    from model_registry import get_registry
+    from feature_store import (FeatureStore, FEATURE_STORE_DIR, SUB_FEATURES,
+                               get_feature_store)
 except:
-    from .utils import GraphConnector
+    from .utils import (GraphConnector, date_range_filter, where_clause)
+    from .model_registry import get_registry
+    from .feature_store import (FeatureStore, FEATURE_STORE_DIR, SUB_FEATURES,
+                                get_feature_store)
+
+
+SUB_MODEL_NAME = 'sub'
 
 
 #################
@@ -111,84 +123,120 @@ def get_company_shipping_states(conn: GraphConnector):
     return result.values.tolist()
 
 
-def get_number_opportunities_per_account(conn: GraphConnector):
+def get_number_opportunities_per_account(conn: GraphConnector,
+                                         start: Optional[date]=None,
+                                         end: Optional[date]=None
+                                        ):
+    """
+    Counts the opportunities of each account that were not lost
+
+    Parameters
+    ----------
+    conn
+        connection to the Neo4j database
+    start, end
+        only count opportunities opened in this inclusive date range
+    """
+    predicates, params = date_range_filter('opp', start, end)
     query = (
-        "MATCH (acct:Account)-[]-(opp:Opportunity) "
-        "MATCH (opp)-[]-(stg:Stage) "
-        "WHERE stg.stage<>'Closed Lost' "
-        "RETURN acct.accountId, COUNT(opp);"
+        "MATCH (acct:Account)<-[:WITH]-(opp:Opportunity) "
+        + where_clause(["NOT opp:ClosedLost"] + predicates)
+        + "RETURN acct.accountId, COUNT(opp);"
     )
     result = conn.query(
         query,
-        result_transformer_=neo4j.Result.to_df
+        result_transformer_=neo4j.Result.to_df,
+        **params
     )
     return result
 
 
-def get_number_open_opps_per_account(conn: GraphConnector):
+def get_number_open_opps_per_account(conn: GraphConnector,
+                                     start: Optional[date]=None,
+                                     end: Optional[date]=None
+                                    ):
+    predicates, params = date_range_filter('opp', start, end)
     query = (
-        "MATCH (acct:Account)-[]-(opp:Opportunity) "
-        "MATCH (opp)-[]-(stg:Stage) "
-        "WHERE stg.stage<>'Closed Won' AND stg.stage<>'Closed Lost' "
-        "RETURN acct.accountId, COUNT(opp);"
+        "MATCH (acct:Account)<-[:WITH]-(opp:Opportunity:Open) "
+        + where_clause(predicates)
+        + "RETURN acct.accountId, COUNT(opp);"
     )
     result = conn.query(
         query,
-        result_transformer_=neo4j.Result.to_df
+        result_transformer_=neo4j.Result.to_df,
+        **params
     )
     return result
 
 
-def get_number_closed_won_opps_per_account(conn: GraphConnector):
+def get_number_closed_won_opps_per_account(conn: GraphConnector,
+                                           start: Optional[date]=None,
+                                           end: Optional[date]=None
+                                          ):
+    predicates, params = date_range_filter('opp', start, end)
     query = (
-        "MATCH (acct:Account)-[]-(opp:Opportunity) "
-        "MATCH (opp)-[]-(stg:Stage) "
-        "WHERE stg.stage='Closed Won' "
-        "RETURN acct.accountId, COUNT(opp);"
+        "MATCH (acct:Account)<-[:WITH]-(opp:Opportunity:ClosedWon) "
+        + where_clause(predicates)
+        + "RETURN acct.accountId, COUNT(opp);"
     )
     result = conn.query(
         query,
-        result_transformer_=neo4j.Result.to_df
+        result_transformer_=neo4j.Result.to_df,
+        **params
     )
     return result
 
 
-def get_average_opp_value_per_account(conn: GraphConnector):
+def get_average_opp_value_per_account(conn: GraphConnector,
+                                      start: Optional[date]=None,
+                                      end: Optional[date]=None
+                                     ):
+    predicates, params = date_range_filter('opp', start, end)
     query = (
-        "MATCH (acct:Account)-[]-(opp:Opportunity) "
-        "RETURN acct.accountId, AVG(toInteger(opp.amount));"
+        "MATCH (acct:Account)<-[:WITH]-(opp:Opportunity) "
+        + where_clause(predicates)
+        + "RETURN acct.accountId, AVG(toInteger(opp.amount));"
     )
     result = conn.query(
         query,
-        result_transformer_=neo4j.Result.to_df
+        result_transformer_=neo4j.Result.to_df,
+        **params
     )
     return result
 
 
-def get_sum_closed_opps_per_account(conn: GraphConnector):
+def get_sum_closed_opps_per_account(conn: GraphConnector,
+                                    start: Optional[date]=None,
+                                    end: Optional[date]=None
+                                   ):
+    predicates, params = date_range_filter('opp', start, end)
     query = (
-        "MATCH (acct:Account)-[]-(opp:Opportunity) "
-        "MATCH (opp)-[:IN_STAGE]-(stg:Stage) "
-        "WHERE stg.stage='Closed Won "
-        "RETURN acct.accountId, SUM(toInteger(opp.amount));"
+        "MATCH (acct:Account)<-[:WITH]-(opp:Opportunity:ClosedWon) "
+        + where_clause(predicates)
+        + "RETURN acct.accountId, SUM(toInteger(opp.amount));"
     )
     result = conn.query(
         query,
-        result_transformer_=neo4j.Result.to_df
+        result_transformer_=neo4j.Result.to_df,
+        **params
     )
     return result
 
 
-def get_sum_open_opps_per_account(conn: GraphConnector):
+def get_sum_open_opps_per_account(conn: GraphConnector,
+                                  start: Optional[date]=None,
+                                  end: Optional[date]=None
+                                 ):
+    predicates, params = date_range_filter('opp', start, end)
     query = (
-        "MATCH (acct:Account)-[]-(opp:Opportunity) "
-        "MATCH (opp)-[:IN_STAGE]-(stg:Stage) "
-        "WHERE stg.stage<>'Closed Won AND stg.stage<>'Closed Lost' "
-        "RETURN acct.accountId, SUM(toInteger(opp.amount));"
+        "MATCH (acct:Account)<-[:WITH]-(opp:Opportunity:Open) "
+        + where_clause(predicates)
+        + "RETURN acct.accountId, SUM(toInteger(opp.amount));"
     )
     result = conn.query(
         query,
-        result_transformer_=neo4j.Result.to_df
+        result_transformer_=neo4j.Result.to_df,
+        **params
     )
     return result
 
@@ -224,17 +272,32 @@ def get_distribution_adj_per_account(conn: GraphConnector,
     return result
 
 
-def get_opp_value_per_state(conn: GraphConnector):
+def get_opp_value_per_state(conn: GraphConnector,
+                            start: Optional[date]=None,
+                            end: Optional[date]=None
+                           ):
+    """
+    Sums the value of the open pipeline per shipping state
+
+    Parameters
+    ----------
+    conn
+        connection to the Neo4j database
+    start, end
+        only include opportunities opened in this inclusive date range. The
+        range is an index seek on Opportunity.openDate.
+    """
+    predicates, params = date_range_filter('opp', start, end)
     query = (
-        "MATCH (opp:Opportunity)-[:WITH]->(:Account)"
-        "-[:SHIPPING_ADR_IN]->(st:State) "
-        "MATCH (opp)-[]->(stg:Stage) "
-        "WHERE stg.stage<>'Closed Won' AND stg.stage<>'Closed Lost' "
+        "MATCH (opp:Opportunity:Open) "
+        + where_clause(predicates)
+        + "MATCH (opp)-[:WITH]->(:Account)-[:SHIPPING_ADR_IN]->(st:State) "
         "RETURN st.state, SUM(toInteger(opp.amount));"
     )
     result = conn.query(
         query,
-        result_transformer_=neo4j.Result.to_df
+        result_transformer_=neo4j.Result.to_df,
+        **params
     )
     return result
 
@@ -243,12 +306,24 @@ def get_opp_value_per_state(conn: GraphConnector):
 # SUBSCRIPTION #
 ################
 
-def load_sub_data(
-    path: str="https://maca-screener.s3.us-east-2.amazonaws.com/churn-dataset.csv"
-):
+SUB_DATA_URL = (
+    "https://maca-screener.s3.us-east-2.amazonaws.com/churn-dataset.csv"
+)
+
+
+@lru_cache(maxsize=1)
+def _read_sub_data(path: str):
     return pd.read_csv(path)
 
 
+def load_sub_data(path: str=SUB_DATA_URL):
+    """
+    Reads the churn dataset. It is downloaded once per process, callers get
+    a copy they are free to modify.
+    """
+    return _read_sub_data(path).copy()
+
+
 def preprocess_sub_data(data: pd.DataFrame):
     # Format date columns
     date_cols = [
@@ -293,13 +368,10 @@ def sub_feature_engineering(data: pd.DataFrame):
         'first_used_feature_a',
         'first_used_feature_b',
     ]
-    for i, col in enumerate(date_cols[:-1], start=1):
-        if i >= 2:
-            data[f"{col}_minus_{date_cols[0]}"] = (data[col] - data[date_cols[0]]).dt.days
-        if i >= 3:
-            data[f"{col}_minus_{date_cols[1]}"] = (data[col] - data[date_cols[1]]).dt.days
-        if i >= 4:
-            data[f"{col}_minus_{date_cols[2]}"] = (data[col] - data[date_cols[2]]).dt.days
+    # Days between every pair of milestones, later minus earlier
+    for i, col in enumerate(date_cols):
+        for prev in date_cols[:i]:
+            data[f"{col}_minus_{prev}"] = (data[col] - data[prev]).dt.days
     data.fillna(0, inplace=True)
     return data
 
@@ -311,39 +383,116 @@ def sub_data_pipeline():
     return data
 
 
+def get_sub_feature_store(path: str=FEATURE_STORE_DIR,
+                          data: Optional[pd.DataFrame]=None
+                         ):
+    """
+    Retrieves the subscription feature store, building it from the
+    subscription pipeline the first time
+
+    Parameters
+    ----------
+    path
+        directory of the store
+    data
+        output of `sub_data_pipeline`, to avoid running it again when the
+        store has to be built
+
+    RETURNS
+    -------
+    FeatureStore
+    """
+    store = get_feature_store(path)
+    if store is None:
+        if data is None:
+            data = sub_data_pipeline()
+        FeatureStore.from_frame(data).save(path)
+        store = get_feature_store(path)
+    return store
+
+
 ##############
 # PREDICTION #
 ##############
 
-def get_sub_model(path:str='./models/weights/sub/model.joblib'):
-    model = joblib.load(path)
-    return model
+def get_sub_model(name: str=SUB_MODEL_NAME, version: Optional[str]=None):
+    """
+    Retrieves the subscription model from the model registry. The model is
+    loaded once per process and the active version is looked up on every
+    call, so activating another version does not need a restart.
+
+    RETURNS
+    -------
+    tuple[object, ModelVersion]
+        the model and its registry version
+    """
+    return get_registry().load(name, version)
 
 
 def build_feature_vector(passes_feats: dict,
                          failed_feats: dict,
                          duration_feats: dict,
-                         members_feats: dict
+                         members_feats: dict,
+                         features: Optional[list]=None
                         ):
-    data = passes_feats | failed_feats | duration_feats |members_feats
-    # These had minimal impact of the ultimate prediction of the model
-    other_vars = {
-        'first_run_at_minus_organization_created_at': 0,
-        'first_used_feature_a_minus_organization_created_at': 0,
-        'first_used_feature_a_minus_first_run_at': 0,
-        'first_used_feature_b_minus_organization_created_at': 0,
-        'first_used_feature_b_minus_first_run_at': 0,
-        'first_used_feature_b_minus_first_used_feature_b': 0
-    }
-    data = data | other_vars
-    feature_vector = pd.DataFrame.from_dict(data, orient='index').transpose()
-    return feature_vector.astype(float).values
+    """
+    Builds a single model input from hand-entered weekly values
+
+    Parameters
+    ----------
+    passes_feats, failed_feats, duration_feats, members_feats
+        weekly values keyed by feature name
+    features
+        feature order of the model, defaults to `SUB_FEATURES`
+
+    The date deltas are not entered and default to 0. They had minimal
+    impact on the ultimate prediction of the model.
+    """
+    data = passes_feats | failed_feats | duration_feats | members_feats
+    features = features or SUB_FEATURES
+    return np.array([[data.get(f, 0) for f in features]], dtype=np.float32)
 
 
 def make_prediction(model, feature_vector):
     return model.predict_proba(feature_vector)[0][1]
 
 
+def score_organizations(model,
+                        store: FeatureStore,
+                        org_ids: list,
+                        features: Optional[list]=None
+                       ):
+    """
+    Likelihood to subscribe for organizations in the feature store
+
+    Parameters
+    ----------
+    model
+        subscription model
+    store
+        feature store, see `get_sub_feature_store`
+    org_ids
+        organizations to score, unknown ids are left out
+    features
+        feature order of the model, defaults to the store's order
+
+    RETURNS
+    -------
+    pd.Series
+        probability per organization id
+    """
+    _, found = store.positions(org_ids)
+    org_ids = np.asarray(org_ids, dtype=np.int64)[found]
+    if not len(org_ids):
+        return pd.Series(dtype=float, name='probability')
+    probs = model.predict_proba(store.rows(org_ids, features))[:, 1]
+    return pd.Series(
+        probs,
+        index=pd.Index(org_ids, name='organization_id'),
+        name='probability'
+    )
+
+
 #################
 # VIZ FUNCTIONS #
 #################
@@ -351,6 +500,8 @@ def make_prediction(model, feature_vector):
 def create_distribution_chart(data: pd.DataFrame,
                               feature: str
                              ):
+    import plotly.express as px
+
     dist_fig = px.histogram(
         data,
         x=feature,
@@ -360,6 +511,8 @@ def create_distribution_chart(data: pd.DataFrame,
     return dist_fig
 
 def create_map_distribution_chart(data: pd.DataFrame):
+    import pydeck as pdk
+
     loc_data = pd.read_csv(
         './app/resources/statelatlong.csv',
         header=0,
@@ -404,12 +557,29 @@ def create_map_distribution_chart(data: pd.DataFrame):
     return deck
 
 
-def create_ts_dist_charts(data: pd.DataFrame, sma_periods=3):
-    data = data[
+def daily_subscriptions(data: pd.DataFrame):
+    """
+    Number of organizations subscribing within 6 weeks per subscription day
+    """
+    return data[
         ['subscription_created_at','sub_in_6_weeks']
     ][data['subscription_created_at']!=0].groupby(
         'subscription_created_at'
     ).sum()
+
+
+def create_ts_dist_charts(daily: pd.DataFrame, sma_periods=3):
+    """
+    Parameters
+    ----------
+    daily
+        output of `daily_subscriptions`
+    sma_periods
+        window of the moving average trendline
+    """
+    import plotly.express as px
+
+    data = daily.copy()
     sub_date_min = data.index.min()
     sub_date_max = data.index.max()
     idx = pd.period_range(
@@ -434,11 +604,21 @@ def create_ts_dist_charts(data: pd.DataFrame, sma_periods=3):
     return ts_fig, dist_fig
 
 
-def correlation_heatmap(data: pd.DataFrame):
+def sub_correlation_matrix(data: pd.DataFrame):
+    """
+    Correlation between the subscription features, without the ids and the
+    date deltas
+    """
+    data = data.copy()
     cols = [c.replace("_"," ").title() for c in data.columns]
     data.columns = cols
     data.drop(columns=['Organization Id','Id'], inplace=True)
     data.drop(columns=[c for c in data.columns if 'Minus' in c], inplace=True)
-    corr = data.corr()
+    return data.corr()
+
+
+def correlation_heatmap(corr: pd.DataFrame):
+    import plotly.express as px
+
     corr_fig = px.imshow(corr)
     return corr_fig
@@ -0,0 +1,385 @@
+"""
+Versioned registry of the dashboard's models.
+
+Every model has a directory of versions next to a pointer to the active one:
+
+    models/registry/<name>/
+        CURRENT                 active version
+        v1/model.joblib
+        v1/manifest.json        features, training data hash, metrics, ...
+        v2/...
+
+Models are loaded lazily on first use with `mmap_mode='r'`. Plain NumPy
+arrays inside them (e.g. coefficients) are then mapped from the file and only
+paged in when read, instead of being read into memory up front. Arrays that
+are copied on unpickling are not shared: a RandomForest's trees copy their
+node arrays, so a forest takes as much memory as with a full load. joblib
+itself is only imported then.
+Loaded versions are kept in a single process-wide registry. The pointer is
+read on every lookup, so activating or rolling back a version from the CLI
+takes effect without restarting the app.
+
+Example
+-------
+python app/model_registry.py register sub ./models/weights/sub/model.joblib
+python app/model_registry.py list sub
+python app/model_registry.py rollback sub
+python app/model_registry.py benchmark sub
+"""
+from typing import (Dict, List, Optional)
+from dataclasses import dataclass
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+
+REGISTRY_DIR = './models/registry/'
+MODEL_FILE = 'model.joblib'
+MANIFEST_FILE = 'manifest.json'
+POINTER_FILE = 'CURRENT'
+
+# Artifacts used before the registry existed, served when a model has no
+# registered versions
+LEGACY_PATHS = {
+    'sub': './models/weights/sub/model.joblib'
+}
+
+
+@dataclass
+class ModelVersion:
+    """
+    A registered model version and its manifest
+    """
+    name: str
+    version: str
+    path: str
+    manifest: dict
+
+    @property
+    def model_path(self):
+        return os.path.join(self.path, MODEL_FILE)
+
+    @property
+    def features(self) -> Optional[List[str]]:
+        return self.manifest.get('features')
+
+
+###########
+# HELPERS #
+###########
+
+def data_hash(*arrays):
+    """
+    Content hash of the training data, recorded in the manifest
+    """
+    h = hashlib.sha256()
+    for arr in arrays:
+        arr = np.ascontiguousarray(np.asarray(arr))
+        h.update(f"{arr.dtype.str}{arr.shape}".encode())
+        h.update(arr.tobytes())
+    return h.hexdigest()
+
+
+def write_atomic(path: str, text: str):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    with os.fdopen(fd, 'w') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def version_number(version: str):
+    return int(version.lstrip('v'))
+
+
+############
+# REGISTRY #
+############
+
+class ModelRegistry:
+    def __init__(self, root: str=REGISTRY_DIR):
+        self.root = root
+        self._models: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def _dir(self, name: str, version: Optional[str]=None):
+        if version is None:
+            return os.path.join(self.root, name)
+        return os.path.join(self.root, name, version)
+
+    def versions(self, name: str):
+        """
+        Registered versions, oldest first
+        """
+        if not os.path.isdir(self._dir(name)):
+            return []
+        return sorted(
+            (v for v in os.listdir(self._dir(name))
+             if v.startswith('v') and v[1:].isdigit()),
+            key=version_number
+        )
+
+    def current_version(self, name: str):
+        """
+        The active version, or the newest if none was activated
+        """
+        try:
+            with open(os.path.join(self._dir(name), POINTER_FILE)) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            versions = self.versions(name)
+            return versions[-1] if versions else None
+
+    def version(self, name: str, version: Optional[str]=None):
+        version = version or self.current_version(name)
+        if version is None:
+            return None
+        path = self._dir(name, version)
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+        return ModelVersion(name, version, path, manifest)
+
+    def register(self,
+                 name: str,
+                 model,
+                 features: Optional[List[str]]=None,
+                 data_hash: Optional[str]=None,
+                 metrics: Optional[dict]=None,
+                 notes: str='',
+                 activate: bool=True,
+                 benchmark: bool=True
+                ):
+        """
+        Stores a model as a new version
+
+        Parameters
+        ----------
+        name
+            model name, e.g. 'sub'
+        model
+            fitted model
+        features
+            feature names in the order the model expects them
+        data_hash
+            hash of the training data, see `data_hash`
+        metrics
+            evaluation metrics to keep with the version
+        notes
+            free text
+        activate
+            make the new version the active one
+        benchmark
+            record load time and size in the manifest
+
+        RETURNS
+        -------
+        str
+            the new version
+        """
+        import joblib
+
+        versions = self.versions(name)
+        version = f"v{version_number(versions[-1])+1 if versions else 1}"
+        path = self._dir(name, version)
+        os.makedirs(path)
+        # Uncompressed, so the arrays can be memory-mapped on load
+        joblib.dump(model, os.path.join(path, MODEL_FILE))
+        manifest = {
+            'name': name,
+            'version': version,
+            'created_at': time.time(),
+            'model_type': type(model).__name__,
+            'params': model.get_params() if hasattr(model, 'get_params')
+                      else {},
+            'features': features,
+            'data_hash': data_hash,
+            'metrics': metrics or {},
+            'notes': notes
+        }
+        write_atomic(
+            os.path.join(path, MANIFEST_FILE),
+            json.dumps(manifest, indent=2, default=str)
+        )
+        if benchmark:
+            self.benchmark(name, version)
+        if activate:
+            self.activate(name, version)
+        return version
+
+    def activate(self, name: str, version: str):
+        """
+        Points the model at a registered version. Running apps pick it up on
+        their next lookup.
+        """
+        if version not in self.versions(name):
+            raise ValueError(f"{name} has no version {version}")
+        write_atomic(os.path.join(self._dir(name), POINTER_FILE), version)
+
+    def rollback(self, name: str):
+        """
+        Activates the version registered before the active one
+
+        RETURNS
+        -------
+        str
+            the version now active
+        """
+        versions = self.versions(name)
+        idx = versions.index(self.current_version(name))
+        if idx == 0:
+            raise ValueError(f"{name} {versions[0]} is the oldest version")
+        self.activate(name, versions[idx-1])
+        return versions[idx-1]
+
+    def load(self, name: str, version: Optional[str]=None):
+        """
+        Returns the model for a version, the active one by default. Each
+        version is loaded once per process.
+
+        RETURNS
+        -------
+        tuple[object, ModelVersion]
+            the model and its version
+        """
+        import joblib
+
+        info = self.version(name, version)
+        if info is None:
+            return self._load_legacy(name)
+        key = (name, info.version)
+        with self._lock:
+            if key not in self._models:
+                self._models[key] = joblib.load(
+                    info.model_path,
+                    mmap_mode='r'
+                )
+            return self._models[key], info
+
+    def _load_legacy(self, name: str):
+        import joblib
+
+        if name not in LEGACY_PATHS:
+            raise KeyError(f"No registered versions of {name}")
+        path = LEGACY_PATHS[name]
+        info = ModelVersion(name, 'legacy', os.path.dirname(path), {})
+        key = (name, 'legacy')
+        with self._lock:
+            if key not in self._models:
+                self._models[key] = joblib.load(path, mmap_mode='r')
+            return self._models[key], info
+
+    def evict(self, name: Optional[str]=None):
+        """
+        Drops loaded models, e.g. versions that are no longer active
+        """
+        with self._lock:
+            for key in list(self._models):
+                if name is None or key[0] == name:
+                    del self._models[key]
+
+    def benchmark(self, name: str, version: str, repeats: int=5):
+        """
+        Measures the size of a version and how long it takes to load with and
+        without memory mapping, and records it in its manifest
+
+        RETURNS
+        -------
+        dict
+            size in bytes and median load times in seconds
+        """
+        import joblib
+
+        info = self.version(name, version)
+        timings = {'mmap': [], 'full': []}
+        for _ in range(repeats):
+            for mode, mmap_mode in (('mmap', 'r'), ('full', None)):
+                start = time.perf_counter()
+                joblib.load(info.model_path, mmap_mode=mmap_mode)
+                timings[mode].append(time.perf_counter() - start)
+        result = {
+            'size_bytes': os.path.getsize(info.model_path),
+            'load_mmap_s': float(np.median(timings['mmap'])),
+            'load_full_s': float(np.median(timings['full'])),
+            'measured_at': time.time()
+        }
+        info.manifest['benchmark'] = result
+        write_atomic(
+            os.path.join(info.path, MANIFEST_FILE),
+            json.dumps(info.manifest, indent=2, default=str)
+        )
+        return result
+
+
+_REGISTRY = None
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_registry(root: str=REGISTRY_DIR):
+    """
+    The process-wide registry, shared by every page and session
+    """
+    global _REGISTRY
+    with _REGISTRY_LOCK:
+        if _REGISTRY is None:
+            _REGISTRY = ModelRegistry(root)
+        return _REGISTRY
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Manage registered models")
+    parser.add_argument('--root', default=REGISTRY_DIR)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    register = sub.add_parser('register', help="register a joblib artifact")
+    register.add_argument('name')
+    register.add_argument('path')
+    register.add_argument('--features', nargs='*', default=None)
+    register.add_argument('--notes', default='')
+    register.add_argument('--no-activate', action='store_true')
+
+    for command in ('list', 'rollback', 'benchmark'):
+        sub.add_parser(command).add_argument('name')
+
+    activate = sub.add_parser('activate')
+    activate.add_argument('name')
+    activate.add_argument('version')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    import joblib
+
+    args = parse_args()
+    registry = ModelRegistry(args.root)
+    if args.command == 'register':
+        version = registry.register(
+            args.name,
+            joblib.load(args.path),
+            features=args.features,
+            notes=args.notes,
+            activate=not args.no_activate
+        )
+        print(f"Registered {args.name} {version}")
+    elif args.command == 'activate':
+        registry.activate(args.name, args.version)
+        print(f"Activated {args.name} {args.version}")
+    elif args.command == 'rollback':
+        print(f"Activated {args.name} {registry.rollback(args.name)}")
+    elif args.command == 'benchmark':
+        for version in registry.versions(args.name):
+            print(version, registry.benchmark(args.name, version))
+    else:
+        current = registry.current_version(args.name)
+        for version in registry.versions(args.name):
+            info = registry.version(args.name, version)
+            marker = '*' if version == current else ' '
+            print(
+                f"{marker} {version} {info.manifest.get('model_type')} "
+                f"metrics={info.manifest.get('metrics')} "
+                f"benchmark={info.manifest.get('benchmark')}"
+            )
@@ -0,0 +1,354 @@
+"""
+In-memory columnar engine over the opportunities of every account.
+
+Both views ask questions of the same Opportunity x Account x Stage x Source x
+Type table. The engine loads it from Neo4j once, in a single query, into NumPy
+columns sorted by account:
+
+- string columns (stage, source, type, contact, state, status) are
+  categorical, stored as integer codes next to their categories
+- amounts are floats and open dates are datetime64[D]
+- an offset index maps each account to its contiguous run of rows
+
+Per-account and per-state aggregates are then `np.bincount` group-bys over a
+boolean mask. The opportunities of an account are gathered from its run of
+rows only, into a new frame, instead of filtering every opportunity.
+The engine is shared by every session of the process and reloaded when the
+graph version stamp changes.
+
+Results use the column names of the Cypher queries they replace, so they can
+be used in place of the `get_*` functions.
+"""
+from typing import (Dict, Iterable, Optional)
+from datetime import date
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import neo4j
+
+try:
+    from utils import (GraphConnector, get_graph_version)
+except:
+    from .utils import (GraphConnector, get_graph_version)
+
+
+LOAD_QUERY = (
+    "MATCH (acct:Account)<-[:WITH]-(opp:Opportunity) "
+    "OPTIONAL MATCH (opp)-[:WORKING_WITH]->(con:Contact) "
+    "OPTIONAL MATCH (opp)-[:SOURCED_FROM]->(src:Source) "
+    "OPTIONAL MATCH (opp)-[:IN_STAGE]->(stg:Stage) "
+    "OPTIONAL MATCH (opp)-[:HAS_TYPE]->(opt:OpportunityType) "
+    "OPTIONAL MATCH (acct)-[:SHIPPING_ADR_IN]->(st:State) "
+    "RETURN acct.accountId AS account, opp.name AS name, "
+    "toString(opp.openDate) AS openDate, "
+    "toString(opp.closedDate) AS closedDate, "
+    "toInteger(opp.amount) AS amount, opp.description AS description, "
+    "con.name AS contact, src.source AS source, stg.stage AS stage, "
+    "opt.type AS type, opp.status AS status, st.state AS state;"
+)
+
+CATEGORICAL = ['contact', 'source', 'stage', 'type', 'status', 'state']
+
+# Columns of `get_account_opportunities`, in order
+OPPORTUNITY_COLUMNS = {
+    'opp.name': 'name',
+    'toString(opp.closedDate)': 'closedDate',
+    'opp.amount': 'amount',
+    'opp.description': 'description',
+    'con.name': 'contact',
+    'src.source': 'source',
+    'stg.stage': 'stage',
+    'opt.type': 'type'
+}
+
+
+class OpportunityEngine:
+    def __init__(self,
+                 frame: pd.DataFrame,
+                 graph_version: Optional[int]=None
+                ):
+        """
+        Parameters
+        ----------
+        frame
+            one row per opportunity, with the columns of `LOAD_QUERY`
+        graph_version
+            version stamp of the graph the rows were read from
+        """
+        self.graph_version = graph_version
+        self.loaded_at = time.time()
+        frame = frame.dropna(subset=['account']).sort_values(
+            'account',
+            kind='stable'
+        )
+
+        # Offset index: rows of account i are offsets[i]:offsets[i+1]
+        account = frame['account'].to_numpy(dtype=np.int64)
+        self.accounts, starts = np.unique(account, return_index=True)
+        self.offsets = np.append(starts, len(account))
+        self.account_idx = np.repeat(
+            np.arange(len(self.accounts)),
+            np.diff(self.offsets)
+        )
+
+        self.amount = pd.to_numeric(frame['amount'], errors='coerce')\
+            .to_numpy(dtype=np.float64)
+        self.open_date = pd.to_datetime(frame['openDate'], errors='coerce')\
+            .to_numpy(dtype='datetime64[D]')
+        self.codes: Dict[str, np.ndarray] = {}
+        self.categories: Dict[str, np.ndarray] = {}
+        for col in CATEGORICAL:
+            cat = pd.Categorical(frame[col])
+            self.codes[col] = cat.codes
+            self.categories[col] = np.asarray(cat.categories, dtype=object)
+        self.text: Dict[str, np.ndarray] = {
+            col: frame[col].to_numpy(dtype=object)
+            for col in ('name', 'closedDate', 'description')
+        }
+
+        # Rows the per-account queries return, which MATCH every link
+        self.complete = np.logical_and.reduce([
+            self.codes[col] >= 0
+            for col in ('contact', 'source', 'stage', 'type')
+        ])
+
+    def __len__(self):
+        return len(self.account_idx)
+
+    @classmethod
+    def from_graph(cls, conn: GraphConnector):
+        version = get_graph_version(conn)
+        frame = conn.query(
+            LOAD_QUERY,
+            result_transformer_=neo4j.Result.to_df
+        )
+        if frame is None:
+            raise RuntimeError("Could not load the opportunities")
+        return cls(frame, version)
+
+    ###########
+    # HELPERS #
+    ###########
+
+    def _code(self, col: str, value: str):
+        """
+        Code of a category, -2 if it does not occur
+        """
+        found = np.flatnonzero(self.categories[col] == value)
+        return found[0] if len(found) else -2
+
+    def _mask(self,
+              start: Optional[date]=None,
+              end: Optional[date]=None,
+              status: Optional[str]=None,
+              exclude_status: Optional[str]=None,
+              rows: slice=slice(None)
+             ):
+        """
+        Rows opened in the inclusive date range with the given status
+        """
+        mask = np.ones(len(self.open_date[rows]), dtype=bool)
+        if start is not None:
+            mask &= self.open_date[rows] >= np.datetime64(start, 'D')
+        if end is not None:
+            mask &= self.open_date[rows] <= np.datetime64(end, 'D')
+        if status is not None:
+            mask &= self.codes['status'][rows] == self._code('status', status)
+        if exclude_status is not None:
+            mask &= (
+                self.codes['status'][rows]
+                != self._code('status', exclude_status)
+            )
+        return mask
+
+    def _per_account(self, mask: np.ndarray, column: str, how: str):
+        """
+        Groups the masked rows by account
+
+        Parameters
+        ----------
+        mask
+            rows to include
+        column
+            name of the result column
+        how
+            'count', 'sum' or 'mean' of the amounts
+        """
+        idx = self.account_idx[mask]
+        n = len(self.accounts)
+        counts = np.bincount(idx, minlength=n)
+        if how == 'count':
+            values = counts
+        else:
+            amount = self.amount[mask]
+            valid = ~np.isnan(amount)
+            sums = np.bincount(
+                idx[valid],
+                weights=amount[valid],
+                minlength=n
+            )
+            if how == 'sum':
+                values = sums.astype(np.int64)
+            else:
+                n_valid = np.bincount(idx[valid], minlength=n)
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    values = sums / n_valid
+        present = counts > 0
+        return pd.DataFrame({
+            'acct.accountId': self.accounts[present],
+            column: values[present]
+        })
+
+    def _account_rows(self, acct_nums: Iterable[int]):
+        """
+        Row positions of the given accounts, in the order given
+        """
+        acct_nums = np.asarray(list(acct_nums), dtype=np.int64)
+        if not len(self.accounts):
+            return np.empty(0, dtype=np.int64)
+        pos = np.searchsorted(self.accounts, acct_nums)
+        pos = np.minimum(pos, len(self.accounts)-1)
+        pos = pos[self.accounts[pos] == acct_nums]
+        if not len(pos):
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([
+            np.arange(self.offsets[i], self.offsets[i+1]) for i in pos
+        ])
+
+    def _opportunities(self, rows, start, end, with_account: bool=False):
+        mask = self._mask(start, end, rows=rows) & self.complete[rows]
+        columns = {}
+        if with_account:
+            columns['acct.accountId'] = self.accounts[self.account_idx[rows]]
+        for out, col in OPPORTUNITY_COLUMNS.items():
+            if col in self.codes:
+                columns[out] = self.categories[col][self.codes[col][rows]]
+            elif col == 'amount':
+                columns[out] = np.nan_to_num(self.amount[rows]).astype(int)
+            else:
+                columns[out] = self.text[col][rows]
+        frame = pd.DataFrame(columns)
+        return frame[mask].reset_index(drop=True)
+
+    ################
+    # GLOBAL VIEWS #
+    ################
+
+    def number_opportunities_per_account(self, start=None, end=None):
+        mask = self._mask(start, end, exclude_status='ClosedLost')
+        return self._per_account(mask, 'COUNT(opp)', 'count')
+
+    def number_open_opps_per_account(self, start=None, end=None):
+        mask = self._mask(start, end, status='Open')
+        return self._per_account(mask, 'COUNT(opp)', 'count')
+
+    def number_closed_won_opps_per_account(self, start=None, end=None):
+        mask = self._mask(start, end, status='ClosedWon')
+        return self._per_account(mask, 'COUNT(opp)', 'count')
+
+    def average_opp_value_per_account(self, start=None, end=None):
+        return self._per_account(
+            self._mask(start, end),
+            'AVG(toInteger(opp.amount))',
+            'mean'
+        )
+
+    def sum_closed_opps_per_account(self, start=None, end=None):
+        mask = self._mask(start, end, status='ClosedWon')
+        return self._per_account(mask, 'SUM(toInteger(opp.amount))', 'sum')
+
+    def sum_open_opps_per_account(self, start=None, end=None):
+        mask = self._mask(start, end, status='Open')
+        return self._per_account(mask, 'SUM(toInteger(opp.amount))', 'sum')
+
+    def opp_value_per_state(self, start=None, end=None):
+        """
+        Sums the value of the open pipeline per shipping state
+        """
+        mask = self._mask(start, end, status='Open')
+        mask &= self.codes['state'] >= 0
+        states = self.codes['state'][mask]
+        n = len(self.categories['state'])
+        counts = np.bincount(states, minlength=n)
+        # SUM skips null amounts
+        sums = np.bincount(
+            states,
+            weights=np.nan_to_num(self.amount[mask]),
+            minlength=n
+        )
+        present = counts > 0
+        return pd.DataFrame({
+            'st.state': self.categories['state'][present],
+            'SUM(toInteger(opp.amount))': sums[present].astype(np.int64)
+        })
+
+    #################
+    # ACCOUNT VIEWS #
+    #################
+
+    def account_opportunities(self, acct_num: int, start=None, end=None):
+        """
+        Opportunities of an account, as `get_account_opportunities`. Only
+        the account's rows are read, the frame holds copies of them.
+        """
+        i = np.searchsorted(self.accounts, acct_num)
+        if i == len(self.accounts) or self.accounts[i] != acct_num:
+            return pd.DataFrame(columns=list(OPPORTUNITY_COLUMNS))
+        rows = slice(self.offsets[i], self.offsets[i+1])
+        return self._opportunities(rows, start, end)
+
+    def accounts_opportunities(self, acct_nums: list, start=None, end=None):
+        """
+        Opportunities of several accounts, as `get_accounts_opportunities`
+        """
+        rows = self._account_rows(acct_nums)
+        return self._opportunities(rows, start, end, with_account=True)
+
+    def accounts_stage_breakdown(self, acct_nums: list, start=None, end=None):
+        """
+        Number and value of opportunities per stage for several accounts,
+        as `get_accounts_stage_breakdown`
+        """
+        rows = self._account_rows(acct_nums)
+        stage = self.codes['stage'][rows]
+        mask = self._mask(start, end, rows=rows) & (stage >= 0)
+        acct = self.account_idx[rows][mask]
+        stage = stage[mask]
+        amount = np.nan_to_num(self.amount[rows][mask])
+
+        # One group per (account, stage) pair
+        n_stages = len(self.categories['stage'])
+        keys, inverse = np.unique(acct*n_stages + stage, return_inverse=True)
+        return pd.DataFrame({
+            'Account Id': self.accounts[keys // n_stages],
+            'Stage': self.categories['stage'][keys % n_stages],
+            'Opportunities': np.bincount(inverse, minlength=len(keys)),
+            'Amount (USD)': np.bincount(
+                inverse, weights=amount, minlength=len(keys)
+            ).astype(np.int64)
+        })
+
+
+_ENGINE = None
+_CHECKED_AT = 0.0
+_ENGINE_LOCK = threading.Lock()
+
+
+def get_opportunity_engine(conn: GraphConnector, check_every: float=30.0):
+    """
+    The process-wide engine. The graph version is checked at most every
+    `check_every` seconds and the engine is reloaded when it changed.
+    Sessions holding the previous engine keep using it until they finish.
+    """
+    global _ENGINE, _CHECKED_AT
+    with _ENGINE_LOCK:
+        now = time.monotonic()
+        if _ENGINE is not None and now - _CHECKED_AT < check_every:
+            return _ENGINE
+        _CHECKED_AT = now
+        if _ENGINE is None or get_graph_version(conn) != _ENGINE.graph_version:
+            _ENGINE = OpportunityEngine.from_graph(conn)
+        return _ENGINE
@@ -1,10 +1,16 @@
+from datetime import (date, timedelta)
+import re
+
 import streamlit as st
 
 import sys
 sys.path.insert(0,'..')
 
 import global_analysis as ga
+from opportunity_engine import get_opportunity_engine
+from snapshot import (format_age, load_snapshot)
 from utils import GraphConnector
+import warmup
 
 
 ###############
@@ -16,6 +22,7 @@ st.set_page_config(
     page_icon="🌆",
     layout="wide"
 )
+warmup.start_background()
 
 ###########
 # SIDEBAR #
@@ -30,9 +37,30 @@ st.sidebar.markdown(
     """
 )
 st.sidebar.markdown("---")
+start = end = None
+if st.sidebar.checkbox('Filter opportunities by open date'):
+    dates = st.sidebar.date_input(
+        'Opened between:',
+        value=(date.today()-timedelta(days=90), date.today())
+    )
+    if len(dates) == 2:
+        start, end = dates
+
+# Precomputed datasets, only valid for the unfiltered view
+snapshot = load_snapshot() if start is None and end is None else None
+if snapshot is not None:
+    st.sidebar.caption(
+        f"Data as of {format_age(snapshot.age)} ago "
+        f"(graph version {snapshot.graph_version})"
+    )
+else:
+    st.sidebar.caption("Live data")
 
 # Init connection to neo4j
 conn = GraphConnector()
+if snapshot is None:
+    # Without a snapshot the aggregates are computed in memory
+    engine = get_opportunity_engine(conn)
 
 def total_col(df, col):
     return df[col].sum()
@@ -43,7 +71,10 @@ def rename_col(df, oldcol, newcol):
 
 # Opportunities
 # All opps data
-all_opps_df = ga.get_number_opportunities_per_account(conn)
+if snapshot is not None:
+    all_opps_df = snapshot['all_opps']
+else:
+    all_opps_df = engine.number_opportunities_per_account(start, end)
 rename_col(all_opps_df, 'COUNT(opp)', 'Opportunities')
 all_opps = total_col(all_opps_df, 'Opportunities')
 all_opps_dist = ga.create_distribution_chart(
@@ -52,7 +83,10 @@ all_opps_dist = ga.create_distribution_chart(
 )
 
 # Open opps data
-open_opps_df = ga.get_number_open_opps_per_account(conn)
+if snapshot is not None:
+    open_opps_df = snapshot['open_opps']
+else:
+    open_opps_df = engine.number_open_opps_per_account(start, end)
 rename_col(open_opps_df, 'COUNT(opp)', 'Opportunities')
 open_opps = total_col(open_opps_df, 'Opportunities')
 open_opps_dist = ga.create_distribution_chart(
@@ -61,7 +95,10 @@ open_opps_dist = ga.create_distribution_chart(
 )
 
 # Closed opps data
-closed_opps_df = ga.get_number_closed_won_opps_per_account(conn)
+if snapshot is not None:
+    closed_opps_df = snapshot['closed_opps']
+else:
+    closed_opps_df = engine.number_closed_won_opps_per_account(start, end)
 rename_col(closed_opps_df, 'COUNT(opp)', 'Opportunities')
 closed_opps = total_col(closed_opps_df, 'Opportunities')
 closed_opps_dist = ga.create_distribution_chart(
@@ -127,7 +164,10 @@ st.markdown("---")
 
 # Map viz
 st.markdown("# Geographic Distribution of Opportunity Value")
-open_value_per_state = ga.get_opp_value_per_state(conn)
+if snapshot is not None:
+    open_value_per_state = snapshot['open_value_per_state']
+else:
+    open_value_per_state = engine.opp_value_per_state(start, end)
 rename_col(
     open_value_per_state,
     'SUM(toInteger(opp.amount))',
@@ -144,7 +184,14 @@ st.pydeck_chart(map_fig)
 
 # Subscription Analysis
 st.markdown('# Subscription Analysis')
-sub_data = ga.sub_data_pipeline()
+if snapshot is not None:
+    sub_data = None
+    daily_subs = snapshot['daily_subscriptions']
+    sub_corr = snapshot['sub_correlation']
+else:
+    sub_data = ga.sub_data_pipeline()
+    daily_subs = ga.daily_subscriptions(sub_data)
+    sub_corr = ga.sub_correlation_matrix(sub_data)
 
 st.markdown("## New Subscribers per Day")
 sma_periods = st.selectbox(
@@ -152,7 +199,7 @@ sma_periods = st.selectbox(
     [i for i in range(30)],
     index=10
 )
-ts_fig, sub_dist_fig = ga.create_ts_dist_charts(sub_data, sma_periods)
+ts_fig, sub_dist_fig = ga.create_ts_dist_charts(daily_subs, sma_periods)
 st.plotly_chart(ts_fig)
 
 st.markdown("## Distribution of Days by New Subscriber Count")
@@ -160,7 +207,7 @@ st.plotly_chart(sub_dist_fig)
 
 st.markdown("## Correlation Analysis")
 st.write("This information is best viewed by zooming in. The labels will follow.")
-corr_fig = ga.correlation_heatmap(sub_data)
+corr_fig = ga.correlation_heatmap(sub_corr)
 st.plotly_chart(corr_fig, use_container_width=True)
 
 st.markdown("## Subscription Prediction")
@@ -202,7 +249,7 @@ with st.container():
     for i, ci in enumerate(cs, 1):
         with ci:
             dur = st.number_input(f'Duration in Week {i}')
-            duration.update({f'sum_test_duration_{i}': dur})
+            duration.update({f'sum_test_duration_week_{i}': dur})
 
 with st.container():
     st.write("Number of new members added per week")
@@ -214,19 +261,46 @@ with st.container():
                 f'New members in Week {i}',
                 value=0
             )
-            members.update({f'num_new_members_added_week_{i}': mems})
+            members.update({f'num_members_added_week_{i}': mems})
 
 calculate = st.button('Predict')
 if calculate:
+    model, model_version = ga.get_sub_model()
     feature_vector = ga.build_feature_vector(
         passes_feats=passes,
         failed_feats=failed,
         duration_feats=duration,
-        members_feats=members
+        members_feats=members,
+        features=model_version.features
     )
-    model = ga.get_sub_model()
     pred = ga.make_prediction(model, feature_vector)
     msg = "### The approximate likelihood the user will subscribe is: {:.2f}%"\
             .format(pred*100)
     st.markdown(msg)
+    st.caption(f"Model version: {model_version.version}")
     calculate = False
+
+st.markdown("## Score Existing Organizations")
+st.write(
+    """Enter organization ids, separated by commas, to score them with the
+    features computed by the subscription pipeline.
+    """
+)
+org_input = st.text_input('Organization ids')
+org_ids = [int(i) for i in re.findall(r'\d+', org_input)]
+if org_ids:
+    store = ga.get_sub_feature_store(data=sub_data)
+    model, model_version = ga.get_sub_model()
+    scores = ga.score_organizations(
+        model,
+        store,
+        org_ids,
+        features=model_version.features
+    )
+    unknown = sorted(set(org_ids) - set(scores.index))
+    if unknown:
+        st.warning(f"Unknown organizations: {', '.join(map(str, unknown))}")
+    st.dataframe(
+        (scores*100).round(2).rename('Likelihood to Subscribe (%)')
+    )
+    st.caption(f"Model version: {model_version.version}")
@@ -1,3 +1,5 @@
+from datetime import (date, timedelta)
+
 import streamlit as st
 import streamlit.components.v1 as components
 
@@ -5,7 +7,17 @@ import sys
 sys.path.insert(0, '..')
 
 import account_analysis as aa
+from account_loader import (AccountLoader, neighbours)
+from opportunity_engine import get_opportunity_engine
 from utils import GraphConnector
+import warmup
+
+
+@st.cache_resource
+def get_account_loader():
+    # One loader and driver per server process, shared across sessions
+    return AccountLoader(GraphConnector(), use_engine=True)
+
 
 # Settings and basic content
 st.set_page_config(
@@ -13,13 +25,68 @@ st.set_page_config(
     layout='wide',
     page_icon="🏡"
 )
+warmup.start_background()
 st.sidebar.header("Account View")
-conn = GraphConnector()
+loader = get_account_loader()
+engine = get_opportunity_engine(loader.conn)
+acct_nums = aa.get_account_numbers(loader.conn)
+mode = st.sidebar.radio(
+    'Mode:',
+    ('Single Account', 'Compare Accounts')
+)
+start = end = None
+if st.sidebar.checkbox('Filter by open date'):
+    dates = st.sidebar.date_input(
+        'Opened between:',
+        value=(date.today()-timedelta(days=90), date.today())
+    )
+    if len(dates) == 2:
+        start, end = dates
+
+if mode == 'Compare Accounts':
+    compare_nums = st.sidebar.multiselect(
+        'Select accounts to compare:',
+        acct_nums,
+        default=acct_nums[:2]
+    )
+    st.markdown('# Account Comparison')
+    if not compare_nums:
+        st.write('Select at least one account to compare.')
+        st.stop()
+
+    summary = aa.get_accounts_summary(compare_nums, loader.conn)
+    opportunities = engine.accounts_opportunities(compare_nums, start, end)
+    breakdown = engine.accounts_stage_breakdown(compare_nums, start, end)
+
+    st.markdown('## Accounts')
+    st.dataframe(summary.set_index('Account Id'))
+
+    st.markdown('## Summary Statistics')
+    if len(opportunities):
+        opportunities = aa.preproc_results_dataframe(opportunities)
+        metrics = aa.opportunity_summary_by_account(opportunities)
+        st.dataframe(metrics.transpose())
+
+        st.markdown('## Opportunity Value per Stage')
+        st.plotly_chart(
+            aa.comparison_stage_chart(breakdown),
+            use_container_width=True
+        )
+
+        st.markdown('## Opportunities')
+        st.dataframe(opportunities)
+    else:
+        st.write('None of the selected accounts have opportunities.')
+    st.stop()
+
 acct_num = st.sidebar.selectbox(
     'Select an account:',
-    aa.get_account_numbers(conn)
+    acct_nums
+)
+prefetch = st.sidebar.checkbox(
+    'Prefetch neighbouring accounts',
+    value=True
 )
-conn.close()
 
 st.sidebar.markdown(
     """Navigation  
@@ -32,12 +99,25 @@ st.sidebar.markdown(
 st.sidebar.markdown("---")
 
 if acct_num:
+    opportunities = None
+    if start is not None:
+        # The cached bundle holds every opportunity
+        opportunities = engine.account_opportunities(acct_num, start, end)
+        if not len(opportunities):
+            st.markdown(
+                f"Account {acct_num} has no opportunities opened between "
+                f"{start} and {end}."
+            )
+            st.stop()
     try:
-        conn = GraphConnector()
-        subgraph = aa.get_account_subgraph(acct_num, conn)
-        company_name = aa.get_node_company_name(acct_num, conn)
-        opportunities = aa.get_account_opportunities(acct_num, conn)
-        opportunities = aa.preproc_results_dataframe(opportunities)
+        bundle = loader.load(acct_num)
+        if prefetch:
+            loader.prefetch(neighbours(acct_nums, acct_num))
+        subgraph = bundle.subgraph
+        company_name = bundle.company_name
+        if opportunities is None:
+            opportunities = bundle.opportunities
+        opportunities = aa.preproc_results_dataframe(opportunities.copy())
         metrics, dfs = aa.opportunity_summary(opportunities)
         if len(opportunities) == 1:
             dist_fig = pie_fig= None
@@ -48,7 +128,6 @@ if acct_num:
         # If time, write the error to a log file
         # st.write(err)
         st.stop()
-        conn.close()
 
     # Account summary
     st.markdown(f'# Account {acct_num} : {company_name}')
@@ -123,12 +202,16 @@ if acct_num:
     st.markdown("---\n## Opportunities")
     st.dataframe(opportunities)
 
+    # Contacts and their reporting hierarchy
+    st.markdown("---\n## Contacts")
+    st.dataframe(aa.get_account_contacts(acct_num, loader.conn))
+
     # Advanced analytics
     st.markdown("---\n## Advanced Analytics")
 
     st.markdown("### 10-K Financial Sentiment Analysis")
-    if acct_num < 7:
-        sents = aa.get_financial_sentiments(acct_num)
+    sents = bundle.sentiments
+    if sents:
         stats = aa.get_dist_stats_sentiment(sents)
         sent_dist_fig = aa.create_sentiment_dist(sents)
 
@@ -193,5 +276,7 @@ if acct_num:
             historical 10-Ks and are merely to give a rough range of
             possibilities that take recent fiscal events into account."""
         )
-
-    conn.close()
+    else:
+        st.write(
+            "No 10-K sentiment analysis is available for this account yet."
+        )
@@ -0,0 +1,314 @@
+"""
+Precomputed snapshots of the Global View datasets.
+
+Computing the Global View means running every opportunity aggregate against
+Neo4j and downloading and preprocessing the churn dataset. The refresher does
+that out of band, either on a schedule or as soon as a load bumps the graph
+version, and writes the results to a snapshot directory:
+
+    snapshots/global/
+        CURRENT                 id of the latest complete snapshot
+        1718000000000/
+            all_opps.parquet
+            ...
+            manifest.json       graph version, creation time, timings
+
+A snapshot is written to a temporary directory, renamed into place and only
+then published by rewriting the pointer, so the pages never see a partial
+snapshot. The pages read the snapshot the pointer names, which takes
+milliseconds, and show how old it is.
+
+Example
+-------
+python app/snapshot.py --once
+python app/snapshot.py --interval 3600 --poll 30
+"""
+from typing import (Dict, Optional)
+from dataclasses import dataclass
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+
+import pandas as pd
+
+try:
+    from utils import (GraphConnector, get_graph_version)
+    from model_registry import write_atomic
+    import global_analysis as ga
+except:
+    from .utils import (GraphConnector, get_graph_version)
+    from .model_registry import write_atomic
+    from . import global_analysis as ga
+
+
+SNAPSHOT_DIR = './snapshots/global/'
+POINTER_FILE = 'CURRENT'
+MANIFEST_FILE = 'manifest.json'
+# Older snapshots are pruned after a new one is published
+KEEP = 3
+
+# Opportunity aggregates, computed without a date filter
+GRAPH_DATASETS = {
+    'all_opps': ga.get_number_opportunities_per_account,
+    'open_opps': ga.get_number_open_opps_per_account,
+    'closed_opps': ga.get_number_closed_won_opps_per_account,
+    'open_value_per_state': ga.get_opp_value_per_state,
+}
+
+# Subscription datasets, computed from the output of the sub pipeline
+SUB_DATASETS = {
+    'daily_subscriptions': ga.daily_subscriptions,
+    'sub_correlation': ga.sub_correlation_matrix,
+}
+
+
+@dataclass
+class Snapshot:
+    """
+    A published snapshot, fully loaded in memory
+    """
+    snapshot_id: str
+    manifest: dict
+    datasets: Dict[str, pd.DataFrame]
+
+    def __getitem__(self, name: str):
+        # Copies, since the pages rename columns in place
+        return self.datasets[name].copy()
+
+    @property
+    def graph_version(self):
+        return self.manifest.get('graph_version')
+
+    @property
+    def age(self):
+        """
+        Seconds since the snapshot was computed
+        """
+        return time.time() - self.manifest['created_at']
+
+
+def format_age(seconds: float):
+    for unit, size in (('d', 86400), ('h', 3600), ('m', 60)):
+        if seconds >= size:
+            return f"{seconds/size:.0f}{unit}"
+    return f"{seconds:.0f}s"
+
+
+#############
+# COMPUTING #
+#############
+
+def compute_datasets(conn: GraphConnector,
+                     feature_store_path: Optional[str]=None
+                    ):
+    """
+    Computes every Global View dataset
+
+    Parameters
+    ----------
+    conn
+        connection to the Neo4j database
+    feature_store_path
+        also rebuild the subscription feature store from the same pipeline
+        run
+
+    RETURNS
+    -------
+    tuple[dict, dict]
+        datasets by name and the seconds each took
+    """
+    datasets, timings = {}, {}
+    for name, fx in GRAPH_DATASETS.items():
+        start = time.perf_counter()
+        result = fx(conn)
+        if result is None:
+            raise RuntimeError(f"Query for {name} failed")
+        datasets[name] = result
+        timings[name] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    sub_data = ga.sub_data_pipeline()
+    timings['sub_data_pipeline'] = time.perf_counter() - start
+    for name, fx in SUB_DATASETS.items():
+        start = time.perf_counter()
+        datasets[name] = fx(sub_data)
+        timings[name] = time.perf_counter() - start
+
+    if feature_store_path is not None:
+        start = time.perf_counter()
+        ga.FeatureStore.from_frame(sub_data).save(feature_store_path)
+        timings['feature_store'] = time.perf_counter() - start
+    return datasets, timings
+
+
+###########
+# WRITING #
+###########
+
+def current_id(root: str=SNAPSHOT_DIR):
+    try:
+        with open(os.path.join(root, POINTER_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def snapshot_ids(root: str=SNAPSHOT_DIR):
+    """
+    Complete snapshots, oldest first
+    """
+    if not os.path.isdir(root):
+        return []
+    return sorted((d for d in os.listdir(root) if d.isdigit()), key=int)
+
+
+def write_snapshot(datasets: Dict[str, pd.DataFrame],
+                   graph_version: Optional[int]=None,
+                   timings: Optional[dict]=None,
+                   root: str=SNAPSHOT_DIR,
+                   keep: int=KEEP
+                  ):
+    """
+    Writes and publishes a snapshot
+
+    RETURNS
+    -------
+    str
+        id of the new snapshot
+    """
+    os.makedirs(root, exist_ok=True)
+    snapshot_id = str(int(time.time()*1000))
+    tmp = os.path.join(root, f".tmp-{snapshot_id}")
+    os.makedirs(tmp)
+    for name, df in datasets.items():
+        df.to_parquet(os.path.join(tmp, f"{name}.parquet"))
+    manifest = {
+        'snapshot_id': snapshot_id,
+        'created_at': time.time(),
+        'graph_version': graph_version,
+        'datasets': sorted(datasets),
+        'timings': timings or {}
+    }
+    with open(os.path.join(tmp, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.rename(tmp, os.path.join(root, snapshot_id))
+    write_atomic(os.path.join(root, POINTER_FILE), snapshot_id)
+
+    # Published snapshots are loaded eagerly, so old ones can go right away
+    for old in snapshot_ids(root)[:-keep]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    return snapshot_id
+
+
+def refresh(conn: GraphConnector,
+            root: str=SNAPSHOT_DIR,
+            feature_store_path: Optional[str]=ga.FEATURE_STORE_DIR,
+            verbose: bool=True
+           ):
+    """
+    Computes and publishes a new snapshot. The graph version is read before
+    the queries run, so a load that finishes during the refresh triggers
+    another one.
+    """
+    start = time.perf_counter()
+    version = get_graph_version(conn)
+    datasets, timings = compute_datasets(conn, feature_store_path)
+    timings['total'] = time.perf_counter() - start
+    snapshot_id = write_snapshot(datasets, version, timings, root)
+    if verbose:
+        print(
+            f"Snapshot {snapshot_id} at graph version {version} in "
+            f"{timings['total']:.2f}s"
+        )
+    return snapshot_id
+
+
+def run(conn: GraphConnector,
+        root: str=SNAPSHOT_DIR,
+        interval: float=3600.0,
+        poll: float=30.0,
+        feature_store_path: Optional[str]=ga.FEATURE_STORE_DIR
+       ):
+    """
+    Refreshes the snapshot every `interval` seconds and whenever the graph
+    version changes, checked every `poll` seconds
+    """
+    snapshot = load_snapshot(root)
+    last_version = snapshot.graph_version if snapshot else None
+    last_refresh = time.time() - snapshot.age if snapshot else 0.0
+    while True:
+        version = get_graph_version(conn)
+        if version != last_version or time.time() - last_refresh >= interval:
+            try:
+                refresh(conn, root, feature_store_path)
+                last_version, last_refresh = version, time.time()
+            except Exception as err:
+                # Keep serving the previous snapshot and retry on next poll
+                print(f"ERROR: refresh failed: {err}")
+        time.sleep(poll)
+
+
+###########
+# READING #
+###########
+
+_SNAPSHOT = None
+_SNAPSHOT_LOCK = threading.Lock()
+
+
+def load_snapshot(root: str=SNAPSHOT_DIR):
+    """
+    The latest published snapshot, or None if there is none. Loaded once
+    per process and reloaded when a new snapshot is published.
+    """
+    global _SNAPSHOT
+    snapshot_id = current_id(root)
+    if snapshot_id is None:
+        return None
+    with _SNAPSHOT_LOCK:
+        if _SNAPSHOT is None or _SNAPSHOT.snapshot_id != snapshot_id:
+            path = os.path.join(root, snapshot_id)
+            with open(os.path.join(path, MANIFEST_FILE)) as f:
+                manifest = json.load(f)
+            datasets = {
+                name: pd.read_parquet(os.path.join(path, f"{name}.parquet"))
+                for name in manifest['datasets']
+            }
+            _SNAPSHOT = Snapshot(snapshot_id, manifest, datasets)
+        return _SNAPSHOT
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Precompute the Global View datasets"
+    )
+    parser.add_argument('--uri', default='bolt://localhost:7687')
+    parser.add_argument('--user', default='neo4j')
+    parser.add_argument('--password', default=None)
+    parser.add_argument('--root', default=SNAPSHOT_DIR)
+    parser.add_argument('--once', action='store_true',
+                        help="write a single snapshot and exit")
+    parser.add_argument('--interval', type=float, default=3600.0,
+                        help="seconds between scheduled refreshes")
+    parser.add_argument('--poll', type=float, default=30.0,
+                        help="seconds between graph version checks")
+    parser.add_argument('--no-feature-store', action='store_true',
+                        help="do not rebuild the subscription feature store")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    conn = GraphConnector(args.uri, args.user, args.password)
+    feature_store_path = None if args.no_feature_store \
+        else ga.FEATURE_STORE_DIR
+    try:
+        if args.once:
+            refresh(conn, args.root, feature_store_path)
+        else:
+            run(conn, args.root, args.interval, args.poll, feature_store_path)
+    finally:
+        conn.close()
@@ -1,4 +1,5 @@
 from typing import Optional
+from datetime import date
 from neo4j import GraphDatabase
 
 class GraphConnector:
@@ -33,3 +34,88 @@ class GraphConnector:
         except Exception as err:
             print(f"ERROR: {err}")
         return response
+
+
+class CheckedConnector:
+    """
+    Runs queries on the driver of a GraphConnector without catching errors.
+    `GraphConnector.query` prints them and returns None, which callers that
+    time or cache results would take for a successful query.
+    """
+    def __init__(self, conn: GraphConnector):
+        self.conn = conn
+        self.driver = conn.driver
+
+    def close(self):
+        self.conn.close()
+
+    def query(self,
+              query: str,
+              parameters: Optional[dict] = None,
+              database: Optional[str] = None,
+              **kwargs
+             ):
+        return self.driver.execute_query(
+            query,
+            parameters=parameters,
+            database=database,
+            **kwargs
+        )
+
+
+def get_graph_version(conn: GraphConnector):
+    """
+    Returns the version stamp written by the graph loaders, or None if the
+    graph has never been stamped. Caches of graph data can key on it.
+    """
+    response = conn.query(
+        "MATCH (v:GraphVersion {name: 'crm'}) RETURN v.version"
+    )
+    if response is None or not response.records:
+        return None
+    return response.records[0][0]
+
+
+def date_range_filter(var: str,
+                      start: Optional[date] = None,
+                      end: Optional[date] = None,
+                      prop: str = 'openDate'
+                     ):
+    """
+    Builds inclusive date range predicates on a node property. Bounds that
+    are not given are left out of the query entirely, so the planner can
+    use the range index on the property for the ones that are.
+
+    Parameters
+    ----------
+    var
+        variable of the node in the query
+    start
+        first date to include
+    end
+        last date to include
+    prop
+        date property to filter on
+
+    RETURNS
+    -------
+    tuple[list[str], dict]
+        predicates and their query parameters
+    """
+    predicates, params = [], {}
+    if start is not None:
+        predicates.append(f"{var}.{prop} >= $start")
+        params['start'] = start
+    if end is not None:
+        predicates.append(f"{var}.{prop} <= $end")
+        params['end'] = end
+    return predicates, params
+
+
+def where_clause(predicates: list):
+    """
+    Joins predicates into a WHERE clause, or nothing if there are none
+    """
+    if not predicates:
+        return ""
+    return f"WHERE {' AND '.join(predicates)} "
@@ -0,0 +1,217 @@
+"""
+Warm-up of the dashboard after a deploy or a Neo4j restart.
+
+The first user after a restart otherwise pays for cold Neo4j page caches,
+unloaded models and empty in-process caches. The warm-up runs the query set
+of both views once, loads the opportunity engine, the subscription model,
+feature store, snapshot and churn dataset, and optionally reads every node
+and relationship so their stores are in the page cache. It reports the time
+each step took.
+
+Every page starts it in a background thread with `start_background`, once
+per server process whichever page is opened first, which primes the
+in-process caches the pages share. Run from the command line, before
+`streamlit run`, it only warms Neo4j and the files on disk:
+
+Example
+-------
+python app/warmup.py
+python app/warmup.py --touch-stores
+"""
+from typing import (List, Optional)
+from dataclasses import dataclass
+from datetime import (date, timedelta)
+import argparse
+import threading
+import time
+
+try:
+    from utils import (CheckedConnector, GraphConnector, get_graph_version)
+    from opportunity_engine import get_opportunity_engine
+    from snapshot import load_snapshot
+    import account_analysis as aa
+    import global_analysis as ga
+except:
+    from .utils import (CheckedConnector, GraphConnector,
+                        get_graph_version)
+    from .opportunity_engine import get_opportunity_engine
+    from .snapshot import load_snapshot
+    from . import account_analysis as aa
+    from . import global_analysis as ga
+
+
+# Accounts whose Account View queries are run
+N_ACCOUNTS = 2
+
+# Default open date range of the date filters
+DATE_RANGE_DAYS = 90
+
+_THREAD = None
+_THREAD_LOCK = threading.Lock()
+
+
+@dataclass
+class WarmupStep:
+    name: str
+    seconds: float
+    error: Optional[str] = None
+
+
+def touch_queries(conn: GraphConnector):
+    """
+    One query per label and relationship type that reads every property
+    record, unlike a count, which the count store answers
+    """
+    labels = ga.get_node_labels(conn)
+    rel_types = ga.get_edge_types(conn)
+    return [
+        f"MATCH (n:`{label}`) RETURN sum(size(keys(n)))"
+        for label in labels
+    ] + [
+        f"MATCH ()-[r:`{rel_type}`]->() RETURN sum(size(keys(r)))"
+        for rel_type in rel_types
+    ]
+
+
+###########
+# WARM UP #
+###########
+
+def warm_up(conn: Optional[GraphConnector]=None,
+            touch_stores: bool=False,
+            verbose: bool=True
+           ):
+    """
+    Runs every warm-up step, continuing past failures
+
+    Parameters
+    ----------
+    conn
+        connection to the Neo4j database, a new one is opened by default
+    touch_stores
+        read every node and relationship into the Neo4j page cache
+    verbose
+        print each step as it finishes
+
+    RETURNS
+    -------
+    list[WarmupStep]
+        the steps with their time and error, if any
+    """
+    own_conn = conn is None
+    conn = conn or GraphConnector()
+    # Query errors fail their step
+    checked = CheckedConnector(conn)
+    steps: List[WarmupStep] = []
+
+    def step(name, fx, *args, **kwargs):
+        start = time.perf_counter()
+        error, result = None, None
+        try:
+            result = fx(*args, **kwargs)
+        except Exception as err:
+            error = f"{type(err).__name__}: {err}"
+        steps.append(WarmupStep(name, time.perf_counter()-start, error))
+        if verbose:
+            print(
+                f"[{'ok  ' if error is None else 'FAIL'}] {name:<40} "
+                f"{steps[-1].seconds*1000:9.1f}ms"
+                + (f" {error}" if error else "")
+            )
+        return result
+
+    total = time.perf_counter()
+    try:
+        step('graph version', get_graph_version, checked)
+
+        # Neo4j page cache
+        if touch_stores:
+            for query in step('list stores', touch_queries, checked) or []:
+                step(query.split(' RETURN')[0], checked.query, query)
+
+        # Global View queries, unfiltered and with the default date filter
+        end = date.today()
+        start = end - timedelta(days=DATE_RANGE_DAYS)
+        for fx in (ga.get_number_opportunities_per_account,
+                   ga.get_number_open_opps_per_account,
+                   ga.get_number_closed_won_opps_per_account,
+                   ga.get_opp_value_per_state):
+            step(fx.__name__, fx, checked)
+            step(f"{fx.__name__} (dates)", fx, checked, start, end)
+
+        # Account View queries
+        acct_nums = step(
+            'get_account_numbers', aa.get_account_numbers, checked
+        )
+        acct_nums = (acct_nums or [])[:N_ACCOUNTS]
+        for acct_num in acct_nums:
+            for fx in (aa.get_account_subgraph,
+                       aa.get_node_company_name,
+                       aa.get_account_opportunities,
+                       aa.get_account_contacts):
+                step(f"{fx.__name__} ({acct_num})", fx, acct_num, checked)
+        if acct_nums:
+            for fx in (aa.get_accounts_summary,
+                       aa.get_accounts_opportunities,
+                       aa.get_accounts_stage_breakdown):
+                step(fx.__name__, fx, acct_nums, checked)
+
+        # In-process caches shared by the pages
+        step('opportunity engine', get_opportunity_engine, checked)
+        step('snapshot', load_snapshot)
+        step('subscription model', ga.get_sub_model)
+        step('churn dataset', ga.load_sub_data)
+        step('feature store', ga.get_sub_feature_store)
+    finally:
+        if own_conn:
+            conn.close()
+    if verbose:
+        failed = sum(s.error is not None for s in steps)
+        print(
+            f"Warm-up finished in {time.perf_counter()-total:.2f}s, "
+            f"{failed} of {len(steps)} steps failed"
+        )
+    return steps
+
+
+def start_background():
+    """
+    Starts the warm-up in a background thread, once per process
+
+    RETURNS
+    -------
+    threading.Thread
+        the warm-up thread, alive until the warm-up finishes
+    """
+    global _THREAD
+    with _THREAD_LOCK:
+        if _THREAD is None:
+            _THREAD = threading.Thread(
+                target=warm_up,
+                kwargs={'verbose': False},
+                name='warmup',
+                daemon=True
+            )
+            _THREAD.start()
+    return _THREAD
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Warm up Neo4j and the dashboard caches"
+    )
+    parser.add_argument('--uri', default='bolt://localhost:7687')
+    parser.add_argument('--user', default='neo4j')
+    parser.add_argument('--password', default=None)
+    parser.add_argument('--touch-stores', action='store_true',
+                        help="read every node and relationship")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    steps = warm_up(
+        GraphConnector(args.uri, args.user, args.password),
+        touch_stores=args.touch_stores
+    )
+    raise SystemExit(int(any(s.error is not None for s in steps)))
@@ -0,0 +1,424 @@
+"""
+Offline CPU batch inference of 10-K Item 7 sentence sentiments.
+
+Runs the fine-tuned SEC-BERT sequence classifier from
+`models/training/financial-sentiment.ipynb` over the parsed Item 7 sentences
+of every account and writes the per-sentence sentiments to the dashboard's
+sentiment store (`app/resources/sample_preds.json` by default).
+
+The input directory is expected to contain one file per account named
+`<accountId>.txt` with one sentence per line.
+
+Example
+-------
+python models/inference/sentiment_batch.py \\
+    --input-dir ./data/item7 \\
+    --workers 4 --threads-per-worker 2 --quantize
+"""
+from typing import (List, Optional, Tuple)
+import os
+import json
+import time
+import argparse
+import pathlib
+import tempfile
+import multiprocessing as mp
+
+import numpy as np
+
+
+###########
+# GLOBALS #
+###########
+
+BERT = 'nlpaueb/sec-bert-base'
+MODEL_DIR = './models/weights/financial-sentiment/'
+STORE_PATH = './app/resources/sample_preds.json'
+CHECKPOINT_DIR = './models/inference/checkpoints/'
+MAX_LEN = 128
+
+# Set per worker process by _init_worker
+_WORKER = {}
+
+
+###########
+# BATCHES #
+###########
+
+def bucket_batches(lengths: List[int],
+                   max_tokens: int=4096,
+                   max_batch_size: int=64
+                  ):
+    """
+    Groups sentence indices into length-bucketed batches.
+
+    Sentences are sorted by token length so that each batch only pads to the
+    longest sentence it contains. A batch is closed once adding the next
+    sentence would exceed `max_tokens` padded tokens or `max_batch_size`
+    sentences.
+
+    Parameters
+    ----------
+    lengths
+        token length of each sentence
+    max_tokens
+        upper bound on (batch size x longest sentence) for a batch
+    max_batch_size
+        upper bound on the number of sentences in a batch
+
+    RETURNS
+    -------
+    list[list[int]]
+        batches of indices into `lengths`
+    """
+    order = np.argsort(lengths, kind='stable')
+    batches = []
+    batch = []
+    longest = 0
+    for idx in order:
+        n = max(lengths[idx], 1)
+        if batch and (
+            max(longest, n) * (len(batch)+1) > max_tokens
+            or len(batch) >= max_batch_size
+        ):
+            batches.append(batch)
+            batch = []
+            longest = 0
+        batch.append(int(idx))
+        longest = max(longest, n)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+##########
+# WORKER #
+##########
+
+def load_model(model_dir: str=MODEL_DIR,
+               tokenizer_name: str=BERT,
+               quantize: bool=False
+              ):
+    """
+    Loads the fine-tuned classifier and its tokenizer for CPU inference
+
+    Parameters
+    ----------
+    model_dir
+        directory the fine-tuned weights were saved to with `save_pretrained`
+    tokenizer_name
+        name or path of the tokenizer used during fine-tuning
+    quantize
+        apply dynamic int8 quantization to the Linear layers
+    """
+    import torch
+    from transformers import (BertForSequenceClassification,
+                              BertTokenizerFast)
+
+    tokenizer = BertTokenizerFast.from_pretrained(tokenizer_name)
+    model = BertForSequenceClassification.from_pretrained(model_dir)
+    model.eval()
+    if quantize:
+        model = torch.quantization.quantize_dynamic(
+            model,
+            {torch.nn.Linear},
+            dtype=torch.qint8
+        )
+    return tokenizer, model
+
+
+def load_student(path: str):
+    """
+    Loads a distilled student model saved by `models/training/distill.py`
+    """
+    import joblib
+
+    return joblib.load(path)
+
+
+def _init_worker(model_dir: str,
+                 tokenizer_name: str,
+                 quantize: bool,
+                 threads: int,
+                 student_path: Optional[str]=None
+                ):
+    if student_path:
+        _WORKER.update({'student': load_student(student_path)})
+        return
+
+    import torch
+
+    torch.set_num_threads(threads)
+    tokenizer, model = load_model(model_dir, tokenizer_name, quantize)
+    _WORKER.update({'tokenizer': tokenizer, 'model': model})
+
+
+def predict_logits(sentences: List[str],
+                   tokenizer,
+                   model,
+                   max_len: int=MAX_LEN,
+                   max_tokens: int=4096,
+                   max_batch_size: int=64
+                  ):
+    """
+    Runs the classifier over sentences using length-bucketed batches
+
+    RETURNS
+    -------
+    np.ndarray
+        (n_sentences, n_labels) logits, in the order of `sentences`
+    """
+    import torch
+
+    encoded = tokenizer(
+        sentences,
+        truncation='longest_first',
+        max_length=max_len,
+        padding=False
+    )
+    lengths = [len(ids) for ids in encoded['input_ids']]
+    logits = np.zeros(
+        (len(sentences), model.config.num_labels),
+        dtype=np.float32
+    )
+
+    with torch.inference_mode():
+        for batch in bucket_batches(lengths, max_tokens, max_batch_size):
+            features = tokenizer.pad(
+                {k: [encoded[k][i] for i in batch] for k in encoded.keys()},
+                return_tensors='pt'
+            )
+            logits[batch] = model(**features).logits.numpy()
+    return logits
+
+
+def score_sentences(sentences: List[str],
+                    tokenizer,
+                    model,
+                    **batch_args
+                   ):
+    """
+    Scores sentences with the classifier
+
+    Sentiment is P(positive) - P(negative), so values range from -1 to 1.
+
+    RETURNS
+    -------
+    list[float]
+        sentiment per sentence, in the order of `sentences`
+    """
+    logits = predict_logits(sentences, tokenizer, model, **batch_args)
+    # For two labels P(1) - P(0) == tanh((z1 - z0) / 2)
+    return np.tanh((logits[:, 1] - logits[:, 0]) / 2).tolist()
+
+
+def score_sentences_student(sentences: List[str], student):
+    """
+    Scores sentences with a distilled student, which predicts the teacher's
+    logit margin z1 - z0
+    """
+    return np.tanh(student.predict(sentences) / 2).tolist()
+
+
+def _score_account(task: Tuple[str, List[str], dict]):
+    acct_num, sentences, batch_args = task
+    start = time.perf_counter()
+    if 'student' in _WORKER:
+        scores = score_sentences_student(sentences, _WORKER['student'])
+    else:
+        scores = score_sentences(
+            sentences,
+            _WORKER['tokenizer'],
+            _WORKER['model'],
+            **batch_args
+        )
+    return acct_num, scores, time.perf_counter() - start
+
+
+###########
+# STORAGE #
+###########
+
+def read_sentences(path: pathlib.Path):
+    with open(path, 'r') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def write_json_atomic(data, path: str):
+    """
+    Writes `data` as JSON to a temp file next to `path` and renames it into
+    place so readers never see a partially written file.
+    """
+    dirname = os.path.dirname(os.path.abspath(path))
+    os.makedirs(dirname, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def completed_accounts(checkpoint_dir: str):
+    return {p.stem for p in pathlib.Path(checkpoint_dir).glob('*.json')}
+
+
+def merge_into_store(checkpoint_dir: str, store_path: str=STORE_PATH):
+    """
+    Merges every account checkpoint into the sentiment store. Accounts in the
+    checkpoints replace the same accounts already in the store.
+    """
+    store = {}
+    if os.path.isfile(store_path):
+        with open(store_path, 'r') as f:
+            store = json.load(f)
+    for path in sorted(pathlib.Path(checkpoint_dir).glob('*.json')):
+        with open(path, 'r') as f:
+            store[path.stem] = json.load(f)
+    write_json_atomic(store, store_path)
+    return len(store)
+
+
+#######
+# RUN #
+#######
+
+def run(input_dir: str,
+        store_path: str=STORE_PATH,
+        checkpoint_dir: str=CHECKPOINT_DIR,
+        model_dir: str=MODEL_DIR,
+        tokenizer_name: str=BERT,
+        student_path: Optional[str]=None,
+        workers: int=1,
+        threads_per_worker: int=1,
+        quantize: bool=False,
+        max_len: int=MAX_LEN,
+        max_tokens: int=4096,
+        max_batch_size: int=64,
+        accounts: Optional[List[str]]=None,
+        resume: bool=True,
+        verbose: bool=True
+       ):
+    """
+    Scores every account in `input_dir` and writes the results to the store
+
+    Each finished account is checkpointed to `checkpoint_dir`, so an
+    interrupted run picks up where it stopped when `resume` is set.
+
+    RETURNS
+    -------
+    dict
+        run statistics, including sentences per second
+    """
+    files = {
+        p.stem: p for p in sorted(pathlib.Path(input_dir).glob('*.txt'))
+    }
+    if accounts:
+        files = {k: v for k, v in files.items() if k in set(accounts)}
+
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    if resume:
+        done = completed_accounts(checkpoint_dir)
+        files = {k: v for k, v in files.items() if k not in done}
+
+    batch_args = {
+        'max_len': max_len,
+        'max_tokens': max_tokens,
+        'max_batch_size': max_batch_size
+    }
+    tasks = (
+        (acct_num, read_sentences(path), batch_args)
+        for acct_num, path in files.items()
+    )
+
+    n_sentences = 0
+    start = time.perf_counter()
+    ctx = mp.get_context('spawn')
+    with ctx.Pool(
+        processes=workers,
+        initializer=_init_worker,
+        initargs=(
+            model_dir,
+            tokenizer_name,
+            quantize,
+            threads_per_worker,
+            student_path
+        )
+    ) as pool:
+        load_time = time.perf_counter() - start
+        for i, (acct_num, scores, elapsed) in enumerate(
+            pool.imap_unordered(_score_account, tasks), 1
+        ):
+            write_json_atomic(
+                scores,
+                os.path.join(checkpoint_dir, f'{acct_num}.json')
+            )
+            n_sentences += len(scores)
+            if verbose:
+                rate = n_sentences / (time.perf_counter() - start)
+                print(
+                    f"[{i}/{len(files)}] account {acct_num}: "
+                    f"{len(scores)} sentences in {elapsed:.2f}s "
+                    f"({rate:.1f} sentences/s overall)"
+                )
+    total_time = time.perf_counter() - start
+
+    n_accounts = merge_into_store(checkpoint_dir, store_path)
+    stats = {
+        'accounts_scored': len(files),
+        'accounts_in_store': n_accounts,
+        'sentences': n_sentences,
+        'seconds': round(total_time, 3),
+        'model_load_seconds': round(load_time, 3),
+        'sentences_per_second': round(n_sentences / max(total_time, 1e-9), 2)
+    }
+    if verbose:
+        print(json.dumps(stats, indent=2))
+    return stats
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Batch CPU inference of Item 7 sentence sentiments"
+    )
+    parser.add_argument('--input-dir', required=True,
+                        help="directory of <accountId>.txt sentence files")
+    parser.add_argument('--store', default=STORE_PATH,
+                        help="sentiment store read by the dashboard")
+    parser.add_argument('--checkpoint-dir', default=CHECKPOINT_DIR)
+    parser.add_argument('--model-dir', default=MODEL_DIR)
+    parser.add_argument('--tokenizer', default=BERT)
+    parser.add_argument('--student',
+                        help="score with a distilled student (.joblib) "
+                             "instead of the BERT teacher")
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--threads-per-worker', type=int, default=1)
+    parser.add_argument('--quantize', action='store_true',
+                        help="dynamic int8 quantization of Linear layers")
+    parser.add_argument('--max-len', type=int, default=MAX_LEN)
+    parser.add_argument('--max-tokens', type=int, default=4096,
+                        help="padded token budget per batch")
+    parser.add_argument('--max-batch-size', type=int, default=64)
+    parser.add_argument('--accounts', nargs='*',
+                        help="only score these account ids")
+    parser.add_argument('--no-resume', action='store_true',
+                        help="ignore existing checkpoints")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    run(
+        input_dir=args.input_dir,
+        store_path=args.store,
+        checkpoint_dir=args.checkpoint_dir,
+        model_dir=args.model_dir,
+        tokenizer_name=args.tokenizer,
+        student_path=args.student,
+        workers=args.workers,
+        threads_per_worker=args.threads_per_worker,
+        quantize=args.quantize,
+        max_len=args.max_len,
+        max_tokens=args.max_tokens,
+        max_batch_size=args.max_batch_size,
+        accounts=args.accounts,
+        resume=not args.no_resume
+    )
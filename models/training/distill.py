@@ -0,0 +1,235 @@
+"""
+Distills the fine-tuned SEC-BERT sentiment teacher into a small student that
+is cheap enough to score every Item 7 sentence on CPU.
+
+The student is a linear model over hashed word n-grams that regresses the
+teacher's logit margin (z1 - z0). Matching the margin rather than the hard
+labels keeps the teacher's confidence, and the sentiment the dashboard uses,
+P(1) - P(0), is recovered as tanh(margin / 2).
+
+Workflow
+--------
+1. Compute and cache the teacher logits for the training sentences:
+   python models/training/distill.py targets
+2. Fit the student on the cached logits:
+   python models/training/distill.py train
+3. Compare the student to the teacher:
+   python models/training/evaluate_student.py
+"""
+from typing import (List, Optional)
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+from sklearn.pipeline import Pipeline
+from sklearn.linear_model import Ridge
+from sklearn.feature_extraction.text import HashingVectorizer
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'inference')
+)
+import sentiment_batch as sb
+
+
+###########
+# GLOBALS #
+###########
+
+SEED = 3141
+DATASET = "JanosAudran/financial-reports-sec"
+DATASET_CONFIG = "small_lite"
+LABEL = '1d'
+TARGETS_DIR = './models/weights/distill/'
+STUDENT_PATH = './models/weights/distill/student.joblib'
+
+
+########
+# DATA #
+########
+
+def load_sentence_data(split: str='train'):
+    """
+    Loads the same train/test split of 10-K sentences that was used to
+    fine-tune the teacher in `financial-sentiment.ipynb`
+
+    Parameters
+    ----------
+    split
+        'train' or 'test'
+
+    RETURNS
+    -------
+    tuple[list[str], np.ndarray]
+        sentences and their binary labels
+    """
+    import datasets
+
+    data = datasets.load_dataset(DATASET, DATASET_CONFIG, split="train")
+    data = data.train_test_split(train_size=0.5, test_size=0.05, seed=SEED)
+    data = data[split]
+    labels = np.array([int(lbl[LABEL]) for lbl in data['labels']])
+    return data['sentence'], labels
+
+
+def targets_path(split: str, targets_dir: str=TARGETS_DIR):
+    return os.path.join(targets_dir, f'teacher-{split}.npz')
+
+
+def build_teacher_targets(split: str='train',
+                          targets_dir: str=TARGETS_DIR,
+                          model_dir: str=sb.MODEL_DIR,
+                          tokenizer_name: str=sb.BERT,
+                          threads: Optional[int]=None
+                         ):
+    """
+    Runs the teacher over a split and caches its logits with the sentences
+    and gold labels so the student can be refit without rerunning BERT
+    """
+    import torch
+
+    if threads:
+        torch.set_num_threads(threads)
+    sentences, labels = load_sentence_data(split)
+    tokenizer, model = sb.load_model(model_dir, tokenizer_name)
+
+    start = time.perf_counter()
+    logits = sb.predict_logits(sentences, tokenizer, model)
+    elapsed = time.perf_counter() - start
+    print(
+        f"Teacher scored {len(sentences)} {split} sentences in "
+        f"{elapsed:.1f}s ({len(sentences)/elapsed:.1f} sentences/s)"
+    )
+
+    os.makedirs(targets_dir, exist_ok=True)
+    path = targets_path(split, targets_dir)
+    np.savez_compressed(
+        path,
+        sentences=np.array(sentences, dtype=object),
+        labels=labels,
+        logits=logits
+    )
+    return path
+
+
+def load_teacher_targets(split: str='train', targets_dir: str=TARGETS_DIR):
+    data = np.load(targets_path(split, targets_dir), allow_pickle=True)
+    return data['sentences'].tolist(), data['labels'], data['logits']
+
+
+###########
+# STUDENT #
+###########
+
+def make_student(n_features: int=2**18,
+                 ngram_range: tuple=(1, 2),
+                 alpha: float=1.0
+                ):
+    """
+    Instantiates the hashed n-gram student
+
+    Parameters
+    ----------
+    n_features
+        size of the hashed feature space
+    ngram_range
+        word n-gram sizes to hash
+    alpha
+        L2 regularization strength of the ridge regressor
+    """
+    return Pipeline([
+        ('hash', HashingVectorizer(
+            n_features=n_features,
+            ngram_range=ngram_range,
+            alternate_sign=False,
+            norm='l2',
+            lowercase=True
+        )),
+        ('ridge', Ridge(alpha=alpha, random_state=SEED))
+    ])
+
+
+def train_student(sentences: List[str],
+                  teacher_logits: np.ndarray,
+                  **student_args
+                 ):
+    """
+    Fits a student to the teacher's logit margin
+
+    Parameters
+    ----------
+    sentences
+        training sentences
+    teacher_logits
+        (n_sentences, 2) teacher logits for `sentences`
+    student_args
+        passed to `make_student`
+    """
+    margin = teacher_logits[:, 1] - teacher_logits[:, 0]
+    student = make_student(**student_args)
+    student.fit(sentences, margin)
+    return student
+
+
+def student_logits(student, sentences: List[str]):
+    """
+    Expresses the student's predicted margin as two-label logits so it can
+    be compared with the teacher directly
+    """
+    margin = student.predict(sentences)
+    return np.stack([np.zeros_like(margin), margin], axis=1)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Distill the sentiment teacher into a small student"
+    )
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    targets = sub.add_parser('targets', help="cache teacher logits")
+    targets.add_argument('--split', default='train')
+    targets.add_argument('--targets-dir', default=TARGETS_DIR)
+    targets.add_argument('--model-dir', default=sb.MODEL_DIR)
+    targets.add_argument('--tokenizer', default=sb.BERT)
+    targets.add_argument('--threads', type=int)
+
+    train = sub.add_parser('train', help="fit the student")
+    train.add_argument('--targets-dir', default=TARGETS_DIR)
+    train.add_argument('--output', default=STUDENT_PATH)
+    train.add_argument('--n-features', type=int, default=2**18)
+    train.add_argument('--max-ngram', type=int, default=2)
+    train.add_argument('--alpha', type=float, default=1.0)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.command == 'targets':
+        path = build_teacher_targets(
+            split=args.split,
+            targets_dir=args.targets_dir,
+            model_dir=args.model_dir,
+            tokenizer_name=args.tokenizer,
+            threads=args.threads
+        )
+        print(f"Saved teacher targets to {path}")
+    elif args.command == 'train':
+        import joblib
+
+        sentences, _, logits = load_teacher_targets('train', args.targets_dir)
+        start = time.perf_counter()
+        student = train_student(
+            sentences,
+            logits,
+            n_features=args.n_features,
+            ngram_range=(1, args.max_ngram),
+            alpha=args.alpha
+        )
+        print(f"Trained student in {time.perf_counter()-start:.1f}s")
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)),
+                    exist_ok=True)
+        joblib.dump(student, args.output)
+        print(f"Saved student to {args.output}")
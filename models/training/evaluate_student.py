@@ -0,0 +1,221 @@
+"""
+Compares distilled students against the SEC-BERT teacher on the held-out
+sentences: F1 against the gold labels, F1 against the teacher's predictions,
+CPU throughput and memory.
+
+Each model is loaded and timed in its own process so load time and resident
+memory are not polluted by the other models.
+
+Example
+-------
+python models/training/evaluate_student.py \\
+    --student ./models/weights/distill/student.joblib --quantized-teacher
+"""
+from typing import (List, Optional)
+import os
+import sys
+import time
+import argparse
+import multiprocessing as mp
+import queue as queue_mod
+
+import pandas as pd
+
+from sklearn.metrics import f1_score
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import distill
+
+sb = distill.sb
+
+
+def _rss_mb():
+    import psutil
+
+    return psutil.Process().memory_info().rss / 2**20
+
+
+def _profile(kind: str,
+             path: str,
+             sentences: List[str],
+             threads: int,
+             queue: mp.Queue
+            ):
+    """
+    Loads one model, scores `sentences` and reports timings and memory back
+    to the parent process
+    """
+    import torch
+    from run_store import PeakRSS
+
+    torch.set_num_threads(threads)
+    base_rss = _rss_mb()
+    with PeakRSS() as rss:
+        start = time.perf_counter()
+        if kind == 'student':
+            model = sb.load_student(path)
+        else:
+            tokenizer, model = sb.load_model(
+                path,
+                quantize=(kind == 'teacher-int8')
+            )
+        load_time = time.perf_counter() - start
+        load_rss = _rss_mb()
+
+        start = time.perf_counter()
+        if kind == 'student':
+            logits = distill.student_logits(model, sentences)
+        else:
+            logits = sb.predict_logits(sentences, tokenizer, model)
+        elapsed = time.perf_counter() - start
+
+    queue.put({
+        'logits': logits,
+        'load_seconds': load_time,
+        'sentences_per_second': len(sentences) / elapsed,
+        'model_rss_mb': load_rss - base_rss,
+        'peak_rss_mb': rss.peak_mb
+    })
+
+
+def profile_model(kind: str,
+                  path: str,
+                  sentences: List[str],
+                  threads: int=1,
+                  timeout: Optional[float]=None,
+                  poll: float=1.0
+                 ):
+    """
+    Profiles one model in a new process. Raises RuntimeError if the process
+    dies without reporting, e.g. when it is OOM-killed, or does not finish
+    within `timeout` seconds.
+    """
+    ctx = mp.get_context('spawn')
+    queue = ctx.Queue()
+    proc = ctx.Process(
+        target=_profile,
+        args=(kind, path, sentences, threads, queue)
+    )
+    proc.start()
+    start = time.perf_counter()
+    try:
+        while True:
+            try:
+                result = queue.get(timeout=poll)
+                break
+            except queue_mod.Empty:
+                pass
+            if not proc.is_alive():
+                # It may have reported just before exiting
+                try:
+                    result = queue.get(timeout=poll)
+                    break
+                except queue_mod.Empty:
+                    raise RuntimeError(
+                        f"profiling {kind} {path} failed, the worker exited "
+                        f"with code {proc.exitcode}"
+                    )
+            if timeout is not None and time.perf_counter()-start > timeout:
+                raise RuntimeError(
+                    f"profiling {kind} {path} timed out after {timeout}s"
+                )
+    finally:
+        proc.join(poll)
+        if proc.is_alive():
+            proc.terminate()
+        proc.join()
+    return result
+
+
+def disk_size_mb(path: str):
+    if os.path.isdir(path):
+        return sum(
+            os.path.getsize(os.path.join(root, f))
+            for root, _, files in os.walk(path)
+            for f in files
+        ) / 2**20
+    return os.path.getsize(path) / 2**20
+
+
+def evaluate(students: List[str],
+             model_dir: str=sb.MODEL_DIR,
+             quantized_teacher: bool=False,
+             n_sentences: Optional[int]=None,
+             threads: int=1,
+             timeout: Optional[float]=None
+            ):
+    """
+    Profiles the teacher and each student on the test split
+
+    Parameters
+    ----------
+    students
+        paths to student .joblib files
+    model_dir
+        directory of the fine-tuned teacher
+    quantized_teacher
+        also profile the teacher with dynamic int8 quantization
+    n_sentences
+        only use the first n test sentences
+    threads
+        torch intra-op threads per model
+    timeout
+        seconds each model may take to load and score, no limit by default
+
+    RETURNS
+    -------
+    pd.DataFrame
+        one row per model
+    """
+    sentences, labels = distill.load_sentence_data('test')
+    if n_sentences:
+        sentences, labels = sentences[:n_sentences], labels[:n_sentences]
+
+    candidates = [('teacher', model_dir)]
+    if quantized_teacher:
+        candidates.append(('teacher-int8', model_dir))
+    candidates += [('student', path) for path in students]
+
+    rows = []
+    teacher_preds = None
+    for kind, path in candidates:
+        result = profile_model(kind, path, sentences, threads, timeout)
+        preds = result.pop('logits').argmax(axis=1)
+        if teacher_preds is None:
+            teacher_preds = preds
+        rows.append({
+            'model': kind if kind != 'student' else os.path.basename(path),
+            'f1_gold': f1_score(labels, preds, average='macro'),
+            'f1_vs_teacher': f1_score(teacher_preds, preds, average='macro'),
+            'disk_mb': disk_size_mb(path),
+            **result
+        })
+    return pd.DataFrame(rows).set_index('model').round(4)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Compare distilled students with the teacher"
+    )
+    parser.add_argument('--student', nargs='*', default=[distill.STUDENT_PATH])
+    parser.add_argument('--model-dir', default=sb.MODEL_DIR)
+    parser.add_argument('--quantized-teacher', action='store_true')
+    parser.add_argument('--n-sentences', type=int)
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--timeout', type=float, default=None,
+                        help="seconds each model may take")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    report = evaluate(
+        students=args.student,
+        model_dir=args.model_dir,
+        quantized_teacher=args.quantized_teacher,
+        n_sentences=args.n_sentences,
+        threads=args.threads,
+        timeout=args.timeout
+    )
+    pd.set_option('display.width', 200)
+    print(report)
@@ -1,4 +1,14 @@
-from typing import Union, Callable
+from typing import Union, Callable, Optional
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext as _nullcontext
+import hashlib
+import inspect
+import multiprocessing as mp
+import os
+import pickle
+import shutil
+import tempfile
+import time
 
 import matplotlib.pyplot as plt
 import seaborn as sns
@@ -6,21 +16,35 @@ import seaborn as sns
 import numpy as np
 import pandas as pd
 
+import imblearn
 from imblearn.combine import SMOTEENN
 
 from sklearn.base import BaseEstimator
-from sklearn.model_selection import StratifiedKFold, train_test_split
+from sklearn.model_selection import (StratifiedKFold, train_test_split,
+                                     ParameterSampler)
 from sklearn.utils._testing import ignore_warnings
 from sklearn.exceptions import ConvergenceWarning
+from threadpoolctl import threadpool_limits
 
+from run_store import (PeakRSS, PhaseTimer, RunStore)
 
-def balance_data(X: pd.DataFrame,
-                 y: Union[pd.Series, np.ndarray],
-                 seed: int
-                ):
+
+# Resampled splits, keyed by the data and seed. The experiment functions take
+# cache_dir=None to disable it.
+RESAMPLE_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'cache', 'resample'
+)
+RESAMPLE_ARRAYS = ('X_resamp', 'X_test', 'y_resamp', 'y_test')
+TEST_SIZE = 0.1
+
+
+def resample(X: Union[pd.DataFrame, np.ndarray],
+             y: Union[pd.Series, np.ndarray],
+             seed: int
+            ):
     """
-    Performs SMOTE followed by Edited Nearest Neighbors to attempt to balance
-    the dataset.
+    Splits off a stratified test set and performs SMOTE followed by Edited
+    Nearest Neighbors on the training split only, to attempt to balance it.
 
     https://storm.cis.fordham.edu/~gweiss/selected-papers/batista-study-balancing-training-data.pdf
 
@@ -34,13 +58,97 @@ def balance_data(X: pd.DataFrame,
         random seed for reproducability
     """
     smote_enn = SMOTEENN(random_state=seed)
-    X_resamp, X_test, y_resamp, y_test = train_test_split(X, y, test_size=0.1, stratify=y, random_state=seed)
-    X_resamp, y_resamp = smote_enn.fit_resample(X, y)
+    X_train, X_test, y_train, y_test = train_test_split(
+        np.asarray(X), np.asarray(y),
+        test_size=TEST_SIZE, stratify=y, random_state=seed
+    )
+    X_resamp, y_resamp = smote_enn.fit_resample(X_train, y_train)
     return X_resamp, X_test, y_resamp, y_test
 
 
+def resample_key(X: Union[pd.DataFrame, np.ndarray],
+                 y: Union[pd.Series, np.ndarray],
+                 seed: int
+                ):
+    """
+    Content hash of everything the resampled splits depend on. Frames and
+    object arrays are hashed by value, since their raw bytes are pointers.
+    """
+    h = hashlib.sha256()
+    for arr in (X, y):
+        if not isinstance(arr, (pd.DataFrame, pd.Series)):
+            arr = np.asarray(arr)
+        if isinstance(arr, np.ndarray) and arr.dtype != object:
+            arr = np.ascontiguousarray(arr)
+            h.update(f"{arr.dtype.str}{arr.shape}".encode())
+            h.update(arr.tobytes())
+            continue
+        frame = pd.DataFrame(arr)
+        h.update(f"{frame.shape}{frame.dtypes.astype(str).tolist()}".encode())
+        h.update(repr(frame.columns.tolist()).encode())
+        h.update(
+            pd.util.hash_pandas_object(frame, index=False).values.tobytes()
+        )
+    h.update(f"{seed}|{TEST_SIZE}|imblearn={imblearn.__version__}".encode())
+    return h.hexdigest()
+
+
+def balance_data(X: Union[pd.DataFrame, np.ndarray],
+                 y: Union[pd.Series, np.ndarray],
+                 seed: int,
+                 cache_dir: Optional[str]=RESAMPLE_CACHE_DIR
+                ):
+    """
+    Resampled train/test splits for a seed, memoized on disk
+
+    The splits only depend on (X, y, seed), so a sweep over several models
+    resamples once per seed. Cached splits are memory-mapped read-only
+    rather than loaded, so workers running the same seed share the pages.
+
+    Parameters
+    ----------
+    X
+        data features
+    y
+        labels
+    seed
+        random seed for reproducability
+    cache_dir
+        directory of the cache, None to always resample
+
+    RETURNS
+    -------
+    tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+        X_resamp, X_test, y_resamp, y_test
+    """
+    if cache_dir is None:
+        return resample(X, y, seed)
+
+    path = os.path.join(cache_dir, resample_key(X, y, seed))
+    if not os.path.isdir(path):
+        arrays = resample(X, y, seed)
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=cache_dir, prefix='.tmp-')
+        for name, arr in zip(RESAMPLE_ARRAYS, arrays):
+            np.save(os.path.join(tmp, f"{name}.npy"), np.asarray(arr))
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            # Another worker cached the same seed first
+            shutil.rmtree(tmp, ignore_errors=True)
+    return tuple(
+        np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r')
+        for name in RESAMPLE_ARRAYS
+    )
+
+
+def clear_resample_cache(cache_dir: str=RESAMPLE_CACHE_DIR):
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+
 def prepare_model(model_type: BaseEstimator,
-                  model_args: dict
+                  model_args: dict,
+                  seed: Optional[int]=None
                  ):
     """
     Instantiates an object of the given model with the provided arguments
@@ -51,12 +159,15 @@ def prepare_model(model_type: BaseEstimator,
         sklearn model to be created
     model_args
         arguments for the model to be created with
+    seed
+        used as the model's random_state if it takes one and none is given,
+        so the model does not depend on the global random state
     """
-    if model_args:
-        model = model_type(**model_args)
-    else:
-        model = model_type()
-    return model
+    model_args = dict(model_args or {})
+    if (seed is not None and 'random_state' not in model_args
+            and 'random_state' in inspect.signature(model_type).parameters):
+        model_args['random_state'] = seed
+    return model_type(**model_args)
 
 @ignore_warnings(category=ConvergenceWarning)
 def train_eval(model: BaseEstimator,
@@ -66,7 +177,8 @@ def train_eval(model: BaseEstimator,
                y_test: Union[pd.Series, np.ndarray],
                metric: Callable,
                kfolds: int=5,
-               seed: int=0
+               seed: int=0,
+               timer: Optional[PhaseTimer]=None
               ):
     """
     Trains and evaluates a sklearn model
@@ -89,21 +201,26 @@ def train_eval(model: BaseEstimator,
         number of folds for cross-validation
     seed
         random seed for reproducability
+    timer
+        records the time of the 'cv' and 'eval' phases
     """
+    timer = timer or PhaseTimer()
     skf = StratifiedKFold(n_splits=kfolds, random_state=seed, shuffle=True)
-    for train_idx, test_idx in skf.split(X_train, y_train):
-        X_train_, X_test_ = X_train[train_idx], X_train[test_idx]
-        y_train_, y_test_ = y_train[train_idx], y_train[test_idx]
-        model.fit(X_train_, y_train_)
-        preds = model.predict(X_test_)
-        try:
-            score = metric(y_test_, preds.round(0).astype(int))
-        except:
-            print(y_test_[:10], preds[:10])
-            metric(y_test_, preds)
-
-    preds = model.predict(X_test)
-    final_score = metric(y_test, preds.round(0).astype(int))
+    with timer.phase('cv'):
+        for train_idx, test_idx in skf.split(X_train, y_train):
+            X_train_, X_test_ = X_train[train_idx], X_train[test_idx]
+            y_train_, y_test_ = y_train[train_idx], y_train[test_idx]
+            model.fit(X_train_, y_train_)
+            preds = model.predict(X_test_)
+            try:
+                score = metric(y_test_, preds.round(0).astype(int))
+            except:
+                print(y_test_[:10], preds[:10])
+                metric(y_test_, preds)
+
+    with timer.phase('eval'):
+        preds = model.predict(X_test)
+        final_score = metric(y_test, preds.round(0).astype(int))
 
     return final_score
 
@@ -113,7 +230,9 @@ def single_experiment(X: Union[pd.DataFrame, np.ndarray],
                       model_type: BaseEstimator,
                       metric: Callable,
                       seed: int,
-                      model_args: dict
+                      model_args: dict,
+                      store: Optional[RunStore]=None,
+                      cache_dir: Optional[str]=RESAMPLE_CACHE_DIR
                      ):
     """
     Conducts a single experiment.
@@ -138,11 +257,37 @@ def single_experiment(X: Union[pd.DataFrame, np.ndarray],
         seed for reproducability
     model_args
         arguments to be passed to the model at instantiation
+    store
+        records the run with its phase timings, peak RSS and model size
+    cache_dir
+        resampled split cache, None to always resample
     """
-    X_resamp, X_test, y_resamp, y_test = balance_data(X, y, seed)
-    model = prepare_model(model_type, model_args)
-    score = train_eval(model, X_resamp, X_test, y_resamp, y_test, metric)
-
+    timer = PhaseTimer()
+    start = time.perf_counter()
+    with PeakRSS() if store is not None else _nullcontext() as rss:
+        with timer.phase('resample'):
+            X_resamp, X_test, y_resamp, y_test = balance_data(
+                X, y, seed, cache_dir
+            )
+        model = prepare_model(model_type, model_args, seed)
+        score = train_eval(model, X_resamp, X_test, y_resamp, y_test, metric,
+                           timer=timer)
+
+    if store is not None:
+        store.record(
+            model=model_type.__name__,
+            params=model.get_params(),
+            seed=int(seed),
+            score=float(score),
+            n_train=len(y_resamp),
+            n_test=len(y_test),
+            resample_s=timer.seconds['resample'],
+            cv_s=timer.seconds['cv'],
+            eval_s=timer.seconds['eval'],
+            total_s=time.perf_counter() - start,
+            peak_rss_mb=rss.peak_mb,
+            model_bytes=len(pickle.dumps(model))
+        )
     return score
 
 
@@ -183,6 +328,139 @@ def show_experiment_results(scores: np.ndarray):
     print("Range: ", (round(scores.min(),4), round(scores.max(),4)))
 
 
+############
+# PARALLEL #
+############
+
+# Data shared by every experiment in a worker, set once per process
+_WORKER = {}
+
+
+def _init_worker(X, y, blas_threads: int):
+    """
+    Keeps the data in the worker and limits the BLAS/OpenMP threads of each
+    worker so n_jobs workers do not oversubscribe the cores
+    """
+    _WORKER['X'] = X
+    _WORKER['y'] = y
+    _WORKER['limits'] = threadpool_limits(limits=blas_threads)
+
+
+def _worker_experiment(i: int,
+                       seed: int,
+                       model_type: BaseEstimator,
+                       metric: Callable,
+                       model_args: dict,
+                       store: Optional[RunStore]=None,
+                       cache_dir: Optional[str]=RESAMPLE_CACHE_DIR
+                      ):
+    start = time.perf_counter()
+    score = single_experiment(
+        _WORKER['X'], _WORKER['y'], model_type, metric, seed, model_args,
+        store, cache_dir
+    )
+    return i, score, time.perf_counter() - start
+
+
+def resolve_n_jobs(n_jobs: int):
+    """
+    Number of workers, with negative values counting back from the number
+    of cores like joblib (-1 is every core)
+    """
+    cpus = os.cpu_count() or 1
+    if n_jobs < 0:
+        n_jobs = cpus + 1 + n_jobs
+    return max(1, n_jobs)
+
+
+def experiment_pool(X: Union[pd.DataFrame, np.ndarray],
+                    y: Union[pd.Series, np.ndarray],
+                    n_jobs: int=-1,
+                    blas_threads: int=1
+                   ):
+    """
+    Process pool whose workers hold X and y and run `_worker_experiment`
+    """
+    # spawn so workers do not inherit a parent's BLAS thread pools
+    return ProcessPoolExecutor(
+        max_workers=resolve_n_jobs(n_jobs),
+        mp_context=mp.get_context('spawn'),
+        initializer=_init_worker,
+        initargs=(X, y, blas_threads)
+    )
+
+
+def run_experiments_parallel(seeds: np.ndarray,
+                             X: Union[pd.DataFrame, np.ndarray],
+                             y: Union[pd.Series, np.ndarray],
+                             model_type: BaseEstimator,
+                             metric: Callable,
+                             model_args: dict={},
+                             n_jobs: int=-1,
+                             blas_threads: int=1,
+                             verbose: bool=True,
+                             store: Optional[RunStore]=None,
+                             cache_dir: Optional[str]=RESAMPLE_CACHE_DIR
+                            ):
+    """
+    Runs one experiment per seed on a process pool
+
+    Every experiment only depends on its seed, so the scores are the same as
+    a sequential run and are returned in the order of `seeds`.
+
+    Parameters
+    ----------
+    seeds
+        array of random seeds
+    X
+        data features
+    y
+        data labels
+    model_type
+        sklearn model
+    metric
+        sklearn scoring function
+    model_args
+        arguments to pass to the model at instantiation
+    n_jobs
+        number of worker processes, -1 for every core
+    blas_threads
+        BLAS/OpenMP threads per worker
+    verbose
+        print progress as experiments complete
+    store
+        run store every experiment is recorded in
+    cache_dir
+        resampled split cache, None to always resample
+
+    RETURNS
+    -------
+    np.ndarray
+        scores in the order of `seeds`
+    """
+    n_jobs = min(resolve_n_jobs(n_jobs), max(len(seeds), 1))
+    scores = [None] * len(seeds)
+    start = time.perf_counter()
+    with experiment_pool(X, y, n_jobs, blas_threads) as pool:
+        futures = [
+            pool.submit(
+                _worker_experiment, i, int(seed), model_type, metric,
+                model_args, store, cache_dir
+            )
+            for i, seed in enumerate(seeds)
+        ]
+        for done, future in enumerate(as_completed(futures), start=1):
+            i, score, elapsed = future.result()
+            scores[i] = score
+            if verbose:
+                print(
+                    f"Completed experiment {done}/{len(seeds)} "
+                    f"(seed {seeds[i]}) in {elapsed:.1f}s. Score: {score} "
+                    f"[{time.perf_counter()-start:.1f}s elapsed]"
+                )
+    return np.array(scores)
+
+
 def run_experiments(seeds: np.ndarray,
                     X: Union[pd.DataFrame, np.ndarray],
                     y: Union[pd.Series, np.ndarray],
@@ -190,7 +468,11 @@ def run_experiments(seeds: np.ndarray,
                     metric: Callable,
                     model_args: dict={},
                     verbose: bool=True,
-                    viz: bool=True
+                    viz: bool=True,
+                    n_jobs: int=1,
+                    blas_threads: int=1,
+                    store: Optional[RunStore]=None,
+                    cache_dir: Optional[str]=RESAMPLE_CACHE_DIR
                    ):
     """
     Runs seeds.shape[0] experiments using the provided data and model
@@ -214,21 +496,293 @@ def run_experiments(seeds: np.ndarray,
         print experiment results
     viz
         plot visuals and summary stats
+    n_jobs
+        number of worker processes, -1 for every core. 1 runs the
+        experiments one after another in this process.
+    blas_threads
+        BLAS/OpenMP threads per worker when n_jobs is not 1
+    store
+        run store every experiment is recorded in
+    cache_dir
+        resampled split cache, None to always resample
     """
-    scores = []
-
-    for i,seed in enumerate(seeds):
-        if verbose:
-            print(f"Running experiment {i+1}")
-        score = single_experiment(X, y, model_type, metric,
-                                  seed, model_args)
-        scores.append(score)
-        if verbose:
-            print(f"Completed experiment. Score: {score}")
-
-    scores = np.array(scores)
+    if resolve_n_jobs(n_jobs) > 1:
+        scores = run_experiments_parallel(
+            seeds, X, y, model_type, metric, model_args,
+            n_jobs=n_jobs,
+            blas_threads=blas_threads,
+            verbose=verbose,
+            store=store,
+            cache_dir=cache_dir
+        )
+    else:
+        scores = []
+        for i,seed in enumerate(seeds):
+            if verbose:
+                print(f"Running experiment {i+1}")
+            score = single_experiment(X, y, model_type, metric,
+                                      seed, model_args, store, cache_dir)
+            scores.append(score)
+            if verbose:
+                print(f"Completed experiment. Score: {score}")
+        scores = np.array(scores)
 
     if viz:
         show_experiment_results(scores)
 
     return scores
+
+
+##########
+# SEARCH #
+##########
+
+def _run_grid(pool: Optional[ProcessPoolExecutor],
+              tasks: list,
+              X: Union[pd.DataFrame, np.ndarray],
+              y: Union[pd.Series, np.ndarray],
+              model_type: BaseEstimator,
+              metric: Callable,
+              store: Optional[RunStore]=None,
+              cache_dir: Optional[str]=RESAMPLE_CACHE_DIR
+             ):
+    """
+    Runs (key, seed, model_args) experiments on the pool, or in this process
+    if there is no pool
+
+    RETURNS
+    -------
+    dict
+        key -> score
+    """
+    if pool is None:
+        return {
+            key: single_experiment(X, y, model_type, metric, seed, args,
+                                   store, cache_dir)
+            for key, seed, args in tasks
+        }
+    futures = [
+        pool.submit(_worker_experiment, key, seed, model_type, metric, args,
+                    store, cache_dir)
+        for key, seed, args in tasks
+    ]
+    results = {}
+    for future in as_completed(futures):
+        key, score, _ = future.result()
+        results[key] = score
+    return results
+
+
+def successive_halving(seeds: np.ndarray,
+                       X: Union[pd.DataFrame, np.ndarray],
+                       y: Union[pd.Series, np.ndarray],
+                       model_type: BaseEstimator,
+                       metric: Callable,
+                       space: Union[dict, list],
+                       n_configs: int=27,
+                       eta: int=3,
+                       min_seeds: int=1,
+                       model_args: dict={},
+                       n_jobs: int=-1,
+                       blas_threads: int=1,
+                       search_seed: int=0,
+                       verbose: bool=True,
+                       store: Optional[RunStore]=None,
+                       cache_dir: Optional[str]=RESAMPLE_CACHE_DIR,
+                       _pool: Optional[ProcessPoolExecutor]=None
+                      ):
+    """
+    Searches hyperparameters with successive halving over the experiment
+    protocol, using the number of seeds as the budget
+
+    Every configuration starts with `min_seeds` experiments. After each rung
+    only the best 1/eta by mean score are kept and the budget of the
+    survivors grows eta times, until they run on every seed. Rungs reuse the
+    scores of the seeds already run, so a survivor's final scores are the
+    same as `run_experiments` on all seeds with its parameters.
+
+    Parameters
+    ----------
+    seeds
+        array of random seeds, the full budget of a configuration
+    X
+        data features
+    y
+        data labels
+    model_type
+        sklearn model
+    metric
+        sklearn scoring function
+    space
+        parameter distributions or lists, as for RandomizedSearchCV
+    n_configs
+        number of configurations sampled from `space`
+    eta
+        fraction of configurations kept per rung is 1/eta
+    min_seeds
+        seeds every configuration runs on in the first rung
+    model_args
+        fixed arguments, overridden by the sampled ones
+    n_jobs
+        number of worker processes, -1 for every core, 1 runs in process
+    blas_threads
+        BLAS/OpenMP threads per worker
+    search_seed
+        seed for sampling the configurations
+    verbose
+        print each rung
+    store
+        run store every experiment is recorded in
+    cache_dir
+        resampled split cache, None to always resample
+
+    RETURNS
+    -------
+    tuple[dict, np.ndarray, pd.DataFrame]
+        best parameters, their scores on every seed, and one row per
+        configuration and rung
+    """
+    configs = [
+        {**model_args, **params}
+        for params in ParameterSampler(space, n_configs,
+                                       random_state=search_seed)
+    ]
+    seeds = [int(seed) for seed in seeds]
+    scores = {}
+    history = []
+    alive = list(range(len(configs)))
+    budget = min(max(min_seeds, 1), len(seeds))
+    rung = 0
+
+    pool = _pool
+    if pool is None and resolve_n_jobs(n_jobs) > 1:
+        pool = experiment_pool(X, y, n_jobs, blas_threads)
+    try:
+        while True:
+            start = time.perf_counter()
+            tasks = [
+                ((c, seed), seed, configs[c])
+                for c in alive for seed in seeds[:budget]
+                if (c, seed) not in scores
+            ]
+            scores.update(
+                _run_grid(pool, tasks, X, y, model_type, metric, store,
+                          cache_dir)
+            )
+            means = {
+                c: np.mean([scores[(c, seed)] for seed in seeds[:budget]])
+                for c in alive
+            }
+            for c in alive:
+                history.append({
+                    'rung': rung,
+                    'config': c,
+                    'n_seeds': budget,
+                    'mean_score': means[c],
+                    'params': configs[c]
+                })
+            if verbose:
+                best = max(alive, key=means.get)
+                print(
+                    f"Rung {rung}: {len(alive)} configs x {budget} seeds "
+                    f"({len(tasks)} experiments) in "
+                    f"{time.perf_counter()-start:.1f}s, "
+                    f"best mean {means[best]:.4f}"
+                )
+            if budget >= len(seeds) or len(alive) == 1:
+                break
+            alive = sorted(alive, key=means.get, reverse=True)
+            alive = alive[:max(1, len(alive)//eta)]
+            budget = min(budget*eta, len(seeds))
+            rung += 1
+
+        # Survivors of an early stop still get the full evaluation
+        tasks = [
+            ((c, seed), seed, configs[c])
+            for c in alive for seed in seeds if (c, seed) not in scores
+        ]
+        scores.update(_run_grid(pool, tasks, X, y, model_type, metric, store,
+                                cache_dir))
+    finally:
+        if pool is not _pool:
+            pool.shutdown()
+
+    best = max(
+        alive,
+        key=lambda c: np.mean([scores[(c, seed)] for seed in seeds])
+    )
+    best_scores = np.array([scores[(best, seed)] for seed in seeds])
+    if verbose:
+        print(
+            f"Ran {len(scores)} experiments instead of "
+            f"{len(configs)*len(seeds)} for a full search. "
+            f"Best mean score {best_scores.mean():.4f}: {configs[best]}"
+        )
+    return configs[best], best_scores, pd.DataFrame(history)
+
+
+def hyperband(seeds: np.ndarray,
+              X: Union[pd.DataFrame, np.ndarray],
+              y: Union[pd.Series, np.ndarray],
+              model_type: BaseEstimator,
+              metric: Callable,
+              space: Union[dict, list],
+              eta: int=3,
+              model_args: dict={},
+              n_jobs: int=-1,
+              blas_threads: int=1,
+              search_seed: int=0,
+              verbose: bool=True,
+              store: Optional[RunStore]=None,
+              cache_dir: Optional[str]=RESAMPLE_CACHE_DIR
+             ):
+    """
+    Runs successive halving brackets from many configurations on few seeds
+    to few configurations on every seed, which hedges against early rungs
+    being too noisy to rank configurations. Parameters are as for
+    `successive_halving`, all brackets share one process pool.
+
+    RETURNS
+    -------
+    tuple[dict, np.ndarray, pd.DataFrame]
+        best parameters, their scores on every seed, and the history of
+        every bracket
+    """
+    n_seeds = len(seeds)
+    s_max = int(np.floor(np.log(n_seeds)/np.log(eta) + 1e-9))
+    pool = None
+    if resolve_n_jobs(n_jobs) > 1:
+        pool = experiment_pool(X, y, n_jobs, blas_threads)
+    results = []
+    try:
+        for bracket, s in enumerate(range(s_max, -1, -1)):
+            n_configs = int(np.ceil((s_max+1)/(s+1) * eta**s))
+            min_seeds = max(1, int(n_seeds * eta**-s))
+            if verbose:
+                print(
+                    f"Bracket {bracket}: {n_configs} configs from "
+                    f"{min_seeds} seeds"
+                )
+            params, scores, history = successive_halving(
+                seeds, X, y, model_type, metric, space,
+                n_configs=n_configs,
+                eta=eta,
+                min_seeds=min_seeds,
+                model_args=model_args,
+                n_jobs=n_jobs,
+                blas_threads=blas_threads,
+                search_seed=search_seed+bracket,
+                verbose=verbose,
+                store=store,
+                cache_dir=cache_dir,
+                _pool=pool
+            )
+            history['bracket'] = bracket
+            results.append((params, scores, history))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    params, scores, _ = max(results, key=lambda r: r[1].mean())
+    history = pd.concat([r[2] for r in results], ignore_index=True)
+    return params, scores, history
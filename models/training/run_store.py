@@ -0,0 +1,260 @@
+"""
+Local store of experiment runs.
+
+Every experiment run through `experiments.py` with a store records its
+parameters, seed and score next to what it cost: wall time per phase
+(resampling, cross-validation folds, final evaluation), peak resident memory
+and the size of the pickled model. Runs are kept in a SQLite file, so sweeps
+from different sessions and worker processes end up in one place and
+training cost can be compared across models and over time.
+
+Example
+-------
+python models/training/run_store.py
+python models/training/run_store.py --experiment sweep --by model
+"""
+from typing import (Optional, Sequence, Union)
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+import psutil
+
+
+RUN_STORE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'runs.sqlite'
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    experiment TEXT,
+    model TEXT NOT NULL,
+    params TEXT,
+    seed INTEGER,
+    score REAL,
+    n_train INTEGER,
+    n_test INTEGER,
+    resample_s REAL,
+    cv_s REAL,
+    eval_s REAL,
+    total_s REAL,
+    peak_rss_mb REAL,
+    model_bytes INTEGER
+);
+CREATE INDEX IF NOT EXISTS runs_experiment_model ON runs (experiment, model);
+"""
+
+COLUMNS = [
+    'created_at', 'experiment', 'model', 'params', 'seed', 'score',
+    'n_train', 'n_test', 'resample_s', 'cv_s', 'eval_s', 'total_s',
+    'peak_rss_mb', 'model_bytes'
+]
+
+
+#############
+# PROFILING #
+#############
+
+class PeakRSS:
+    """
+    Samples the resident memory of this process in a background thread while
+    the context is open. The process-wide ru_maxrss only ever grows, so it
+    cannot tell runs in the same worker apart.
+    """
+    def __init__(self, interval: float=0.01):
+        self.interval = interval
+        self.peak = 0
+        self._process = psutil.Process()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._process.memory_info().rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = self._process.memory_info().rss
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._process.memory_info().rss)
+
+    @property
+    def peak_mb(self):
+        return self.peak / 2**20
+
+
+class PhaseTimer:
+    """
+    Accumulates wall time per named phase
+    """
+    def __init__(self):
+        self.seconds = {}
+
+    def phase(self, name: str):
+        timer = self
+
+        class _Phase:
+            def __enter__(self):
+                self.start = time.perf_counter()
+
+            def __exit__(self, *exc):
+                timer.seconds[name] = (
+                    timer.seconds.get(name, 0.0)
+                    + time.perf_counter() - self.start
+                )
+        return _Phase()
+
+
+#########
+# STORE #
+#########
+
+class RunStore:
+    def __init__(self,
+                 path: str=RUN_STORE_PATH,
+                 experiment: Optional[str]=None
+                ):
+        """
+        Parameters
+        ----------
+        path
+            SQLite file of the store, created if missing
+        experiment
+            name recorded with every run, to group the runs of a sweep
+
+        Only the path is kept, so a store can be pickled to worker
+        processes. Each call opens its own connection.
+        """
+        self.path = path
+        self.experiment = experiment
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        # WAL lets workers append while a notebook reads the reports
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def record(self, **run):
+        """
+        Appends a run. `params` may be a dict, it is stored as JSON.
+        """
+        run.setdefault('created_at', time.time())
+        run.setdefault('experiment', self.experiment)
+        if not isinstance(run.get('params'), (str, type(None))):
+            run['params'] = json.dumps(run['params'], default=str,
+                                       sort_keys=True)
+        values = [run.get(col) for col in COLUMNS]
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT INTO runs ({', '.join(COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in COLUMNS)})",
+                values
+            )
+
+    ###########
+    # REPORTS #
+    ###########
+
+    def runs(self,
+             experiment: Optional[str]=None,
+             model: Optional[str]=None
+            ):
+        """
+        Recorded runs, newest first, optionally for one experiment or model
+        """
+        clauses, params = [], []
+        if experiment is not None:
+            clauses.append("experiment = ?")
+            params.append(experiment)
+        if model is not None:
+            clauses.append("model = ?")
+            params.append(model)
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+        with self._connect() as conn:
+            runs = pd.read_sql_query(
+                f"SELECT * FROM runs {where}ORDER BY created_at DESC",
+                conn,
+                params=params
+            )
+        runs['created_at'] = pd.to_datetime(runs['created_at'], unit='s')
+        return runs
+
+    def summary(self,
+                by: Union[str, Sequence[str]]='model',
+                experiment: Optional[str]=None
+               ):
+        """
+        Score and cost per group, best mean score first
+
+        RETURNS
+        -------
+        pd.DataFrame
+            number of runs, mean and std of the score, mean time per phase,
+            the largest peak RSS and the mean model size per group
+        """
+        runs = self.runs(experiment)
+        if not len(runs):
+            return runs
+        by = [by] if isinstance(by, str) else list(by)
+        summary = runs.groupby(by).agg(
+            runs=('score', 'size'),
+            mean_score=('score', 'mean'),
+            std_score=('score', 'std'),
+            resample_s=('resample_s', 'mean'),
+            cv_s=('cv_s', 'mean'),
+            eval_s=('eval_s', 'mean'),
+            total_s=('total_s', 'mean'),
+            peak_rss_mb=('peak_rss_mb', 'max'),
+            model_mb=('model_bytes', lambda b: b.mean() / 2**20)
+        )
+        return summary.sort_values('mean_score', ascending=False)
+
+    def experiments(self):
+        """
+        Recorded experiments with their number of runs and time span
+        """
+        with self._connect() as conn:
+            result = pd.read_sql_query(
+                "SELECT experiment, COUNT(*) AS runs, "
+                "MIN(created_at) AS first_run, MAX(created_at) AS last_run, "
+                "SUM(total_s) AS total_s "
+                "FROM runs GROUP BY experiment ORDER BY last_run DESC",
+                conn
+            )
+        for col in ('first_run', 'last_run'):
+            result[col] = pd.to_datetime(result[col], unit='s')
+        return result
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Report on recorded experiment runs"
+    )
+    parser.add_argument('--path', default=RUN_STORE_PATH)
+    parser.add_argument('--experiment', default=None)
+    parser.add_argument('--by', nargs='+', default=['model'])
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    store = RunStore(args.path)
+    pd.set_option('display.width', 200)
+    if args.experiment is None:
+        print(store.experiments().to_string(index=False))
+        print()
+    print(store.summary(args.by, args.experiment).to_string())
@@ -0,0 +1,195 @@
+"""
+Import-time budget for the dashboard modules.
+
+Every Streamlit session imports the page's analysis modules, so whatever they
+import at module level is paid on cold start and by every new server process.
+This imports each module in a fresh interpreter under `python -X importtime`
+and checks two things:
+
+- the median cumulative import time stays within the module's budget
+- none of the heavy dependencies that are only needed to draw charts or load
+  models (plotly, pydeck, pyvis, sklearn, joblib, ...) is imported eagerly
+
+The exit code is 1 if any check fails, so it can run in CI next to the tests.
+
+Example
+-------
+python scripts/import_budget.py
+python scripts/import_budget.py --repeat 9 --top 15
+"""
+from typing import (Dict, List, Optional, Tuple)
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+
+APP_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app'
+)
+
+# Median cumulative import time per module, in milliseconds
+BUDGETS_MS = {
+    'utils': 400,
+    'model_registry': 600,
+    'feature_store': 600,
+    'opportunity_engine': 1200,
+    'account_analysis': 1200,
+    'account_loader': 1200,
+    'global_analysis': 1200,
+    'snapshot': 1200,
+}
+
+# Packages that must only be imported when they are used
+LAZY_PACKAGES = (
+    'plotly', 'pydeck', 'pyvis', 'sklearn', 'joblib', 'torch',
+    'transformers', 'matplotlib', 'seaborn'
+)
+
+
+###########
+# PARSING #
+###########
+
+def parse_importtime(stderr: str):
+    """
+    Parses the output of `python -X importtime`
+
+    RETURNS
+    -------
+    dict[str, tuple[int, int]]
+        (self, cumulative) microseconds per imported module. A module
+        imported more than once keeps its last entry.
+    """
+    timings = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            # Header line
+            continue
+        timings[parts[2].strip()] = (int(parts[0]), int(parts[1]))
+    return timings
+
+
+def eager_imports(timings: Dict[str, Tuple[int, int]],
+                  packages: Tuple[str, ...]=LAZY_PACKAGES
+                 ):
+    """
+    Lazy packages that were imported, by top-level package
+    """
+    found = {name.split('.')[0] for name in timings}
+    return sorted(found & set(packages))
+
+
+#############
+# MEASURING #
+#############
+
+def import_once(module: str, cwd: str=APP_DIR):
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=cwd,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(
+            f"import {module} failed: "
+            f"{(result.stderr.strip().splitlines() or [''])[-1]}"
+        )
+    return parse_importtime(result.stderr)
+
+
+def measure(module: str, repeat: int=5, cwd: str=APP_DIR):
+    """
+    Imports a module `repeat` times, each in a new interpreter. The first
+    import also compiles bytecode and is discarded.
+
+    RETURNS
+    -------
+    tuple[float, dict]
+        median cumulative import time in milliseconds and the timings of
+        the last run
+    """
+    import_once(module, cwd)
+    cumulative, timings = [], {}
+    for _ in range(repeat):
+        timings = import_once(module, cwd)
+        cumulative.append(timings[module][1] / 1000)
+    return statistics.median(cumulative), timings
+
+
+def top_level(timings: Dict[str, Tuple[int, int]], n: int=10):
+    """
+    Slowest top-level packages by cumulative time
+    """
+    totals = {
+        name: cum for name, (_, cum) in timings.items() if '.' not in name
+    }
+    return sorted(totals.items(), key=lambda kv: -kv[1])[:n]
+
+
+def check(budgets: Dict[str, float]=BUDGETS_MS,
+          repeat: int=5,
+          top: int=0,
+          cwd: str=APP_DIR
+         ):
+    """
+    Measures every module against its budget
+
+    RETURNS
+    -------
+    list[str]
+        failed checks
+    """
+    failures = []
+    for module, budget in budgets.items():
+        try:
+            ms, timings = measure(module, repeat, cwd)
+        except RuntimeError as err:
+            failures.append(str(err))
+            print(f"[FAIL] {module}: {err}")
+            continue
+        eager = eager_imports(timings)
+        ok = ms <= budget and not eager
+        print(
+            f"[{'ok  ' if ok else 'FAIL'}] {module:<20} {ms:8.1f}ms "
+            f"(budget {budget}ms)"
+            + (f" eager: {', '.join(eager)}" if eager else "")
+        )
+        if ms > budget:
+            failures.append(f"{module} took {ms:.1f}ms, budget {budget}ms")
+        if eager:
+            failures.append(f"{module} imports {', '.join(eager)} eagerly")
+        for name, cum in top_level(timings, top):
+            print(f"         {name:<30} {cum/1000:8.1f}ms")
+    return failures
+
+
+def parse_args(argv: Optional[List[str]]=None):
+    parser = argparse.ArgumentParser(
+        description="Check the import time of the dashboard modules"
+    )
+    parser.add_argument('modules', nargs='*', default=None,
+                        help="modules to check, all by default")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=0,
+                        help="show the slowest top-level imports per module")
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help="multiply every budget, e.g. on slow CI runners")
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    budgets = {
+        module: budget*args.scale for module, budget in BUDGETS_MS.items()
+        if not args.modules or module in args.modules
+    }
+    failures = check(budgets, args.repeat, args.top)
+    if failures:
+        print("\n".join(failures))
+        raise SystemExit(1)
@@ -0,0 +1,348 @@
+"""
+Load test of the dashboard pages.
+
+Simulates N reps using one Streamlit process at the same time. Every rep is a
+thread that drives the pages headlessly with Streamlit's AppTest, following
+an interaction script (open a page, select an account, toggle the graph
+physics, change the SMA period, click Predict, ...). Every page load and
+interaction reruns the page script, as it would on the server, and is timed.
+
+The report has the throughput and the p50/p95/p99 latency of every page and
+every interaction, for the whole run. Run it from the repository root, with
+the same database and files the dashboard uses, and raise --sessions until
+the latencies degrade.
+
+AppTest installs a mock runtime for every run. The pages only cache with
+`st.cache_resource`, which does not use it, so sessions can share one process
+the way they do on the server.
+
+The exit code is 1 if --max-p95 is given and a page's p95 latency exceeds it.
+
+Example
+-------
+python scripts/load_test.py --sessions 10 --iterations 3
+python scripts/load_test.py --sessions 25 --script account --ramp 10 \\
+    --json load.json --max-p95 5000
+"""
+from typing import (Callable, Dict, List, Optional, Tuple)
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import (asdict, dataclass)
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+
+APP_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app'
+)
+
+PAGES = {
+    'home': 'Home.py',
+    'global': os.path.join('pages', '1_Global_View.py'),
+    'account': os.path.join('pages', '2_Account_View.py'),
+}
+
+PERCENTILES = (50, 95, 99)
+
+
+################
+# INTERACTIONS #
+################
+
+def widget(widgets, label: str):
+    """
+    The widget with a given label
+    """
+    for w in widgets:
+        if w.label == label:
+            return w
+    raise LookupError(f"no widget labelled {label!r}")
+
+
+def select_account(at, rng: random.Random):
+    account = widget(at.selectbox, 'Select an account:')
+    account.select_index(rng.randrange(len(account.options)))
+    at.run()
+
+
+def toggle_physics(at, rng: random.Random):
+    physics = widget(at.checkbox, 'Disable Graph Physics')
+    physics.set_value(not physics.value)
+    at.run()
+
+
+def change_sma(at, rng: random.Random):
+    widget(at.selectbox, 'Number of Days for Trendline').select(
+        rng.randrange(1, 30)
+    )
+    at.run()
+
+
+def predict(at, rng: random.Random):
+    for w in at.number_input:
+        if w.label.startswith(('Passes', 'Failures', 'New members')):
+            w.set_value(rng.randint(0, 20))
+        elif w.label.startswith('Duration'):
+            w.set_value(rng.uniform(0, 3600))
+    widget(at.button, 'Predict').click()
+    at.run()
+
+
+INTERACTIONS: Dict[str, Callable] = {
+    'select_account': select_account,
+    'toggle_physics': toggle_physics,
+    'change_sma': change_sma,
+    'predict': predict,
+}
+
+# (page, interaction) steps. 'load' opens the page in a new tab.
+SCRIPTS: Dict[str, List[Tuple[str, str]]] = {
+    'rep': [
+        ('home', 'load'),
+        ('account', 'load'),
+        ('account', 'select_account'),
+        ('account', 'toggle_physics'),
+        ('account', 'select_account'),
+        ('global', 'load'),
+        ('global', 'change_sma'),
+        ('global', 'predict'),
+    ],
+    'account': [
+        ('account', 'load'),
+        ('account', 'select_account'),
+        ('account', 'toggle_physics'),
+        ('account', 'select_account'),
+        ('account', 'select_account'),
+    ],
+    'global': [
+        ('global', 'load'),
+        ('global', 'change_sma'),
+        ('global', 'change_sma'),
+        ('global', 'predict'),
+    ],
+}
+
+
+###########
+# RUNNING #
+###########
+
+@dataclass
+class Sample:
+    session: int
+    page: str
+    interaction: str
+    seconds: float
+    error: Optional[str] = None
+
+
+def run_session(session: int,
+                script: List[Tuple[str, str]],
+                iterations: int=1,
+                seed: int=0,
+                timeout: float=60.0,
+                think: float=0.0,
+                delay: float=0.0
+               ):
+    """
+    Runs an interaction script for one simulated rep
+
+    Parameters
+    ----------
+    think
+        maximum pause between steps, in seconds
+    delay
+        pause before the first step, in seconds
+
+    RETURNS
+    -------
+    list[Sample]
+        one sample per step
+    """
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(f"{seed}-{session}")
+    apps, samples = {}, []
+    time.sleep(delay)
+    for _ in range(iterations):
+        for page, interaction in script:
+            error = None
+            start = time.perf_counter()
+            try:
+                if interaction == 'load':
+                    apps[page] = AppTest.from_file(
+                        os.path.join(APP_DIR, PAGES[page]),
+                        default_timeout=timeout
+                    )
+                    apps[page].run()
+                else:
+                    INTERACTIONS[interaction](apps[page], rng)
+                if apps[page].exception:
+                    error = apps[page].exception[0].message
+            except Exception as err:
+                error = f"{type(err).__name__}: {err}"
+            samples.append(Sample(
+                session, page, interaction, time.perf_counter()-start, error
+            ))
+            if think:
+                time.sleep(rng.uniform(0, think))
+    return samples
+
+
+def run_load(sessions: int,
+             script: List[Tuple[str, str]],
+             iterations: int=1,
+             seed: int=0,
+             timeout: float=60.0,
+             think: float=0.0,
+             ramp: float=0.0
+            ):
+    """
+    Runs `sessions` simulated reps concurrently. Their starts are spread
+    evenly over `ramp` seconds.
+
+    RETURNS
+    -------
+    tuple[list[Sample], float]
+        every sample and the wall time of the run in seconds
+    """
+    if APP_DIR not in sys.path:
+        # Streamlit puts the main script's directory on the path
+        sys.path.insert(0, APP_DIR)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        futures = [
+            pool.submit(
+                run_session, i, script, iterations, seed, timeout, think,
+                ramp*i/sessions
+            )
+            for i in range(sessions)
+        ]
+        samples = [s for future in futures for s in future.result()]
+    return samples, time.perf_counter() - start
+
+
+#############
+# REPORTING #
+#############
+
+def percentile(values: List[float], q: float):
+    """
+    q-th percentile with linear interpolation between the closest ranks
+    """
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    rank = (len(values) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+def summarize(samples: List[Sample], wall: float):
+    """
+    Latency and throughput per page and per (page, interaction). The page
+    rows have the interaction '*'.
+
+    RETURNS
+    -------
+    list[dict]
+        one row per group, latencies in milliseconds and throughput in
+        steps per second
+    """
+    groups: Dict[Tuple[str, str], List[Sample]] = {}
+    for s in samples:
+        groups.setdefault((s.page, '*'), []).append(s)
+        groups.setdefault((s.page, s.interaction), []).append(s)
+    rows = []
+    for (page, interaction), group in sorted(groups.items()):
+        ms = [s.seconds*1000 for s in group]
+        row = {
+            'page': page,
+            'interaction': interaction,
+            'count': len(group),
+            'errors': sum(s.error is not None for s in group),
+            'throughput': len(group) / wall if wall else float('nan'),
+        }
+        for q in PERCENTILES:
+            row[f"p{q}"] = percentile(ms, q)
+        rows.append(row)
+    return rows
+
+
+def format_report(rows: List[dict], wall: float, sessions: int):
+    total = sum(r['count'] for r in rows if r['interaction'] == '*')
+    lines = [
+        f"{sessions} sessions, {total} steps in {wall:.1f}s "
+        f"({total/wall if wall else float('nan'):.2f} steps/s)",
+        f"{'page':<8} {'interaction':<15} {'count':>6} {'errors':>6} "
+        f"{'steps/s':>8} "
+        + ' '.join(f"{'p'+str(q)+' ms':>9}" for q in PERCENTILES)
+    ]
+    for r in rows:
+        lines.append(
+            f"{r['page']:<8} {r['interaction']:<15} {r['count']:>6} "
+            f"{r['errors']:>6} {r['throughput']:>8.2f} "
+            + ' '.join(f"{r['p'+str(q)]:>9.1f}" for q in PERCENTILES)
+        )
+    return '\n'.join(lines)
+
+
+def parse_args(argv: Optional[List[str]]=None):
+    parser = argparse.ArgumentParser(
+        description="Load test the dashboard pages with concurrent sessions"
+    )
+    parser.add_argument('--sessions', type=int, default=5)
+    parser.add_argument('--iterations', type=int, default=1,
+                        help="times every session repeats its script")
+    parser.add_argument('--script', choices=sorted(SCRIPTS), default='rep')
+    parser.add_argument('--ramp', type=float, default=0.0,
+                        help="seconds over which the sessions start")
+    parser.add_argument('--think', type=float, default=0.0,
+                        help="maximum pause between steps, in seconds")
+    parser.add_argument('--timeout', type=float, default=60.0,
+                        help="maximum seconds per page run")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', default=None,
+                        help="also write the summary and samples to a file")
+    parser.add_argument('--max-p95', type=float, default=None,
+                        help="fail if a page's p95 latency exceeds it, in ms")
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    samples, wall = run_load(
+        args.sessions,
+        SCRIPTS[args.script],
+        iterations=args.iterations,
+        seed=args.seed,
+        timeout=args.timeout,
+        think=args.think,
+        ramp=args.ramp
+    )
+    rows = summarize(samples, wall)
+    print(format_report(rows, wall, args.sessions))
+    errors = sorted({s.error for s in samples if s.error})
+    for error in errors[:10]:
+        print(f"error: {error}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'args': vars(args),
+                'wall': wall,
+                'summary': rows,
+                'samples': [asdict(s) for s in samples]
+            }, f, indent=2)
+    slow = [
+        r for r in rows
+        if args.max_p95 is not None and r['interaction'] == '*'
+        and r['p95'] > args.max_p95
+    ]
+    for r in slow:
+        print(f"{r['page']} p95 {r['p95']:.1f}ms exceeds {args.max_p95}ms")
+    if slow:
+        raise SystemExit(1)
@@ -0,0 +1,293 @@
+"""
+Full offline rebuild of the CRM graph with `neo4j-admin database import`.
+
+The Account, Contact and Opportunity CSVs are converted into node and
+relationship files for the bulk importer with the same transforms as
+`ingest.py` (lookup node dedup, AnnualRevenue bucketing), done on whole
+columns with pandas. The importer then writes the store in one offline pass,
+which is far faster than replaying transactional loads into an emptied
+database.
+
+The database must be stopped while importing.
+
+Example
+-------
+sudo neo4j stop
+python setup/admin_import.py --run
+sudo neo4j start
+python setup/migrations.py
+"""
+from typing import Optional
+import argparse
+import os
+import subprocess
+import time
+
+import pandas as pd
+
+import sources as src
+from hierarchy import (hierarchy_rows, HIERARCHY_PROPERTIES)
+from healthcheck import (build_manifest, save_manifest, MANIFEST_PATH)
+
+
+###########
+# GLOBALS #
+###########
+
+IMPORT_DIR = './setup/import/'
+
+# neo4j-admin column types for non-string properties
+PROPERTY_TYPES = {
+    'accountId': 'long',
+    'contactId': 'long',
+    'oppId': 'long',
+    'reportsTo': 'long',
+    'amount': 'long',
+    'year': 'long',
+    'openDate': 'date',
+    'closedDate': 'date',
+    'rowHash': 'long',
+    'version': 'long',
+    'depth': 'long',
+    'topManagerId': 'long',
+    'managementChain': 'long[]',
+    'directReports': 'long',
+    'spanOfControl': 'long',
+}
+
+
+#########
+# FILES #
+#########
+
+def typed(col: str):
+    return f"{col}:{PROPERTY_TYPES[col]}" if col in PROPERTY_TYPES else col
+
+
+def node_table(frame: pd.DataFrame, label: str, key: str, props: list):
+    """
+    Builds an import node table. The id space is the label, and the key is
+    also kept as a typed property.
+    """
+    nodes = frame[props].dropna(subset=[key]).drop_duplicates(subset=[key])
+    nodes = nodes.rename(columns={c: typed(c) for c in props})
+    nodes.insert(0, f':ID({label})', nodes[typed(key)])
+    nodes[':LABEL'] = label
+    return nodes
+
+
+def lookup_table(values: pd.Series, label: str, prop: str):
+    values = values.dropna().drop_duplicates()
+    return pd.DataFrame({
+        f':ID({label})': values.values,
+        typed(prop): values.values,
+        ':LABEL': label
+    })
+
+
+def rel_table(frame: pd.DataFrame,
+              src_label: str,
+              src_key: str,
+              col: str,
+              dst_label: str,
+              rel_type: str,
+              dst_ids: Optional[pd.Series]=None
+             ):
+    """
+    Builds an import relationship table. If `dst_ids` is given, only
+    relationships to existing nodes are kept, like MATCH in the loaders.
+    """
+    pairs = src.link_pairs(frame, src_key, col)
+    if dst_ids is not None:
+        pairs = pairs[pairs['dst'].isin(dst_ids)]
+    return pd.DataFrame({
+        f':START_ID({src_label})': pairs['src'].values,
+        f':END_ID({dst_label})': pairs['dst'].values,
+        ':TYPE': rel_type
+    })
+
+
+def build_import_files(account_csv: str=src.ACCOUNT_CSV,
+                       contact_csv: str=src.CONTACT_CSV,
+                       opportunity_csv: str=src.OPPORTUNITY_CSV,
+                       import_dir: str=IMPORT_DIR,
+                       manifest_path: Optional[str]=MANIFEST_PATH,
+                       verbose: bool=True
+                      ):
+    """
+    Converts the source CSVs into neo4j-admin import files. The counts of
+    the files are recorded as the manifest for healthcheck.py.
+
+    RETURNS
+    -------
+    tuple[list[str], list[str]]
+        node files and relationship files
+    """
+    start = time.perf_counter()
+    version = int(time.time()*1000)
+    accounts = src.account_frame(src.read_csv(account_csv))
+    contacts = src.contact_frame(src.read_csv(contact_csv))
+    opps = src.opportunity_frame(src.read_csv(opportunity_csv))
+    if verbose:
+        print(f"Read sources in {time.perf_counter()-start:.2f}s")
+
+    pairs = src.link_pairs(contacts, 'contactId', src.REPORTS_TO_LINK[0])
+    chains = pd.DataFrame(hierarchy_rows(
+        contacts['contactId'].dropna().tolist(),
+        zip(pairs['src'].tolist(), pairs['dst'].tolist())
+    ))
+    chains['managementChain'] = chains['managementChain'].map(
+        lambda chain: ';'.join(map(str, chain))
+    )
+    contacts = contacts.merge(chains, on='contactId', how='left')
+
+    nodes = {
+        'Account': node_table(
+            accounts, 'Account', 'accountId', src.ACCOUNT_PROPERTIES
+        ),
+        'Contact': node_table(
+            contacts, 'Contact', 'contactId',
+            src.CONTACT_PROPERTIES + HIERARCHY_PROPERTIES
+        ),
+        'Opportunity': node_table(
+            opps, 'Opportunity', 'oppId', src.OPPORTUNITY_PROPERTIES
+        ),
+    }
+    nodes['Opportunity'][':LABEL'] = 'Opportunity;' + nodes['Opportunity'][
+        'status'
+    ]
+    rels = {}
+
+    # Lookup nodes come from every column that feeds the same label
+    for frame, lookups in ((accounts, src.ACCOUNT_LOOKUPS),
+                           (opps, src.OPPORTUNITY_LOOKUPS)):
+        for col, label, prop, rel_type in lookups:
+            values = frame[col]
+            if label in nodes:
+                values = pd.concat([nodes[label][typed(prop)], values])
+            nodes[label] = lookup_table(values, label, prop)
+
+    ids = {label: table.iloc[:, 0] for label, table in nodes.items()}
+    for frame, label, key, links in (
+        (accounts, 'Account', 'accountId', src.ACCOUNT_LOOKUPS),
+        (contacts, 'Contact', 'contactId', src.CONTACT_LINKS),
+        (opps, 'Opportunity', 'oppId',
+         src.OPPORTUNITY_LOOKUPS + src.OPPORTUNITY_LINKS),
+    ):
+        for col, dst_label, _, rel_type in links:
+            rels[f"{label}-{rel_type}-{dst_label}"] = rel_table(
+                frame, label, key, col, dst_label, rel_type, ids[dst_label]
+            )
+    col, dst_label, _, rel_type = src.REPORTS_TO_LINK
+    rels['Contact-REPORTS_TO-Contact'] = rel_table(
+        contacts, 'Contact', 'contactId', col, dst_label, rel_type,
+        ids[dst_label]
+    )
+    if manifest_path is not None:
+        labels = pd.concat([t[':LABEL'] for t in nodes.values()])
+        save_manifest(
+            build_manifest(
+                version,
+                labels.str.split(';').explode().value_counts().to_dict(),
+                pd.concat([t[':TYPE'] for t in rels.values()])
+                .value_counts().to_dict()
+            ),
+            manifest_path
+        )
+    # Same stamp as common.bump_graph_version, written at import time
+    nodes['GraphVersion'] = pd.DataFrame({
+        ':ID(GraphVersion)': ['crm'],
+        'name': ['crm'],
+        typed('version'): [version],
+        ':LABEL': ['GraphVersion']
+    })
+
+    os.makedirs(import_dir, exist_ok=True)
+    node_files, rel_files = [], []
+    for name, table in nodes.items():
+        path = os.path.join(import_dir, f"nodes-{name}.csv")
+        table.to_csv(path, index=False)
+        node_files.append(path)
+    for name, table in rels.items():
+        path = os.path.join(import_dir, f"rels-{name}.csv")
+        table.to_csv(path, index=False)
+        rel_files.append(path)
+
+    if verbose:
+        n_nodes = sum(len(t) for t in nodes.values())
+        n_rels = sum(len(t) for t in rels.values())
+        print(
+            f"Wrote {n_nodes} nodes and {n_rels} relationships to "
+            f"{import_dir} in {time.perf_counter()-start:.2f}s"
+        )
+    return node_files, rel_files
+
+
+##########
+# IMPORT #
+##########
+
+def import_command(node_files: list,
+                   rel_files: list,
+                   database: str='neo4j',
+                   neo4j_admin: str='neo4j-admin'
+                  ):
+    return (
+        [neo4j_admin, 'database', 'import', 'full']
+        + [f'--nodes={f}' for f in node_files]
+        + [f'--relationships={f}' for f in rel_files]
+        + [
+            '--overwrite-destination=true',
+            '--multiline-fields=true',
+            '--skip-duplicate-nodes=true',
+            database
+        ]
+    )
+
+
+def run_import(node_files: list,
+               rel_files: list,
+               database: str='neo4j',
+               neo4j_admin: str='neo4j-admin',
+               verbose: bool=True
+              ):
+    cmd = import_command(node_files, rel_files, database, neo4j_admin)
+    if verbose:
+        print(' '.join(cmd))
+    start = time.perf_counter()
+    subprocess.run(cmd, check=True)
+    if verbose:
+        print(f"Imported in {time.perf_counter()-start:.2f}s")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Rebuild the CRM graph offline with neo4j-admin import"
+    )
+    parser.add_argument('--account-csv', default=src.ACCOUNT_CSV)
+    parser.add_argument('--contact-csv', default=src.CONTACT_CSV)
+    parser.add_argument('--opportunity-csv', default=src.OPPORTUNITY_CSV)
+    parser.add_argument('--import-dir', default=IMPORT_DIR)
+    parser.add_argument('--manifest', default=MANIFEST_PATH)
+    parser.add_argument('--database', default='neo4j')
+    parser.add_argument('--neo4j-admin', default='neo4j-admin')
+    parser.add_argument('--run', action='store_true',
+                        help="run neo4j-admin after writing the files")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    node_files, rel_files = build_import_files(
+        args.account_csv,
+        args.contact_csv,
+        args.opportunity_csv,
+        args.import_dir,
+        args.manifest
+    )
+    if args.run:
+        run_import(node_files, rel_files, args.database, args.neo4j_admin)
+    else:
+        print(' '.join(import_command(
+            node_files, rel_files, args.database, args.neo4j_admin
+        )))
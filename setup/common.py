@@ -0,0 +1,176 @@
+"""
+Helpers shared by the graph setup scripts: connection arguments, batching and
+parallel batched writes.
+"""
+from typing import (Iterable, List, Optional)
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import time
+
+import pandas as pd
+from neo4j import GraphDatabase
+
+
+##############
+# CONNECTION #
+##############
+
+def add_connection_args(parser: argparse.ArgumentParser):
+    parser.add_argument('--uri', default='bolt://localhost:7687')
+    parser.add_argument('--user', default='neo4j')
+    parser.add_argument('--password', default=None)
+    parser.add_argument('--database', default=None)
+    return parser
+
+
+def get_driver(args: argparse.Namespace):
+    return GraphDatabase.driver(args.uri, auth=(args.user, args.password))
+
+
+############
+# BATCHING #
+############
+
+def chunks(items: List, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i+size]
+
+
+def to_records(df: pd.DataFrame):
+    """
+    Converts a dataframe to a list of dicts of plain Python values that the
+    driver can send as parameters. Missing values become None.
+    """
+    df = df.astype(object)
+    return df.where(df.notna(), None).to_dict('records')
+
+
+def run_write(driver,
+              query: str,
+              database: Optional[str]=None,
+              **params
+             ):
+    """
+    Runs a write query in its own managed transaction, which the driver
+    retries on transient errors such as deadlocks
+    """
+    with driver.session(database=database) as session:
+        summary = session.execute_write(
+            lambda tx: tx.run(query, **params).consume()
+        )
+    return summary.counters
+
+
+def write_batches(driver,
+                  query: str,
+                  rows: List[dict],
+                  batch_size: int=5000,
+                  database: Optional[str]=None
+                 ):
+    """
+    Writes `rows` with an `UNWIND $rows AS row` query, one bounded
+    transaction per batch
+
+    RETURNS
+    -------
+    int
+        number of rows written
+    """
+    for batch in chunks(rows, batch_size):
+        run_write(driver, query, database, rows=batch)
+    return len(rows)
+
+
+def write_batches_parallel(driver,
+                           jobs: Iterable[tuple],
+                           batch_size: int=5000,
+                           workers: int=4,
+                           database: Optional[str]=None
+                          ):
+    """
+    Writes several (query, rows) jobs concurrently. Every batch of every job
+    is its own transaction, so batches are spread across all workers.
+
+    RETURNS
+    -------
+    int
+        number of rows written
+    """
+    tasks = [
+        (query, batch)
+        for query, rows in jobs
+        for batch in chunks(rows, batch_size)
+    ]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(run_write, driver, query, database, rows=batch)
+            for query, batch in tasks
+        ]
+        for f in futures:
+            f.result()
+    return sum(len(batch) for _, batch in tasks)
+
+
+#################
+# GRAPH VERSION #
+#################
+
+GRAPH_VERSION_QUERY = (
+    "MERGE (v:GraphVersion {name: 'crm'}) "
+    "SET v.version = timestamp(), v.updatedAt = datetime(), "
+    "v.changes = $changes "
+    "RETURN v.version AS version"
+)
+
+
+def bump_graph_version(driver,
+                       database: Optional[str]=None,
+                       changes: int=0
+                      ):
+    """
+    Stamps the graph with a new version after a load so downstream caches
+    can key on it. Versions are millisecond timestamps, so they keep
+    increasing across full rebuilds.
+    """
+    records, _, _ = driver.execute_query(
+        GRAPH_VERSION_QUERY,
+        changes=changes,
+        database_=database
+    )
+    return records[0]['version']
+
+
+#############
+# REPORTING #
+#############
+
+class RateReporter:
+    def __init__(self, name: str, verbose: bool=True):
+        self.name = name
+        self.verbose = verbose
+        self.rows = 0
+        self.start = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def update(self, n: int):
+        self.rows += n
+        if self.verbose:
+            print(
+                f"  {self.name}: {self.rows} rows "
+                f"({self.rows/max(self.elapsed, 1e-9):,.0f} rows/s)"
+            )
+
+    def done(self):
+        if self.verbose:
+            print(
+                f"{self.name}: {self.rows} rows in {self.elapsed:.2f}s "
+                f"({self.rows/max(self.elapsed, 1e-9):,.0f} rows/s)"
+            )
+        return {
+            'rows': self.rows,
+            'seconds': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows/max(self.elapsed, 1e-9), 1)
+        }
@@ -0,0 +1,358 @@
+"""
+Synthetic Account, Contact and Opportunity CSVs at any scale.
+
+The CSVs have the columns of the source CSVs and values drawn from the same
+picklists (stages, sources, types, ratings, ...), so every loader builds the
+graph described in `neo4j-graph-builder.cypher` from them:
+
+    python setup/generate.py --accounts 100000 --opportunities 5000000
+    python setup/ingest.py --account-csv ./setup/generated/Account.csv \\
+        --contact-csv ./setup/generated/Contact.csv \\
+        --opportunity-csv ./setup/generated/Opportunity.csv
+
+Rows are generated and written one at a time. Memory grows with the number of
+accounts (two integers per account to place contacts), not with the number
+of contacts or opportunities. The same seed always produces the same files.
+
+Skew controls
+-------------
+--whales, --whale-share
+    a few accounts that receive a large share of all opportunities
+--deep-chains, --chain-depth
+    accounts whose contacts form a single REPORTS_TO chain
+"""
+from typing import (Dict, Iterator, List)
+from array import array
+from dataclasses import (asdict, dataclass)
+from datetime import (date, timedelta)
+import argparse
+import csv
+import json
+import math
+import os
+import random
+import time
+
+
+OUTPUT_DIR = './setup/generated/'
+STATES_CSV = './app/resources/statelatlong.csv'
+
+ACCOUNT_COLUMNS = [
+    'id', 'Name', 'Type', 'BillingStreet', 'BillingCity', 'BillingState',
+    'BillingPostalCode', 'ShippingState', 'Phone', 'Website', 'Description',
+    'Rating', 'YearStarted', 'AccountSource', 'CleanStatus', 'Ownership',
+    'AnnualRevenue'
+]
+CONTACT_COLUMNS = [
+    'id', 'AccountId', 'Salutation', 'FirstName', 'LastName', 'Title',
+    'Department', 'ReportsToId', 'LeadSource', 'OtherState'
+]
+OPPORTUNITY_COLUMNS = [
+    'id', 'AccountId', 'ContactId', 'Name', 'Description', 'Amount',
+    'StageName', 'Type', 'LeadSource', 'CloseDate'
+]
+
+#############
+# PICKLISTS #
+#############
+
+ACCOUNT_TYPES = [
+    'Prospect', 'Customer - Direct', 'Customer - Channel',
+    'Channel Partner / Reseller', 'Installation Partner',
+    'Technology Partner', 'Other'
+]
+RATINGS = ['Hot', 'Warm', 'Cold']
+SOURCES = ['Web', 'Phone Inquiry', 'Partner Referral', 'Purchased List',
+           'Other']
+CLEAN_STATUSES = ['Matched', 'Different', 'Acknowledged', 'Not Found',
+                  'Inactive', 'Pending', 'Skipped']
+OWNERSHIPS = ['Public', 'Private', 'Subsidiary', 'Other']
+# (stage, weight), open stages first
+STAGES = [
+    ('Prospecting', 10), ('Qualification', 9), ('Needs Analysis', 8),
+    ('Value Proposition', 7), ('Id. Decision Makers', 6),
+    ('Perception Analysis', 5), ('Proposal/Price Quote', 5),
+    ('Negotiation/Review', 4), ('Closed Won', 25), ('Closed Lost', 21)
+]
+OPPORTUNITY_TYPES = [
+    'New Customer', 'Existing Customer - Upgrade',
+    'Existing Customer - Replacement', 'Existing Customer - Downgrade'
+]
+SALUTATIONS = ['Mr.', 'Ms.', 'Mrs.', 'Dr.', 'Prof.']
+FIRST_NAMES = ['Avery', 'Blake', 'Casey', 'Devon', 'Emery', 'Finley',
+               'Harper', 'Jordan', 'Kendall', 'Logan', 'Morgan', 'Parker',
+               'Quinn', 'Riley', 'Rowan', 'Sawyer', 'Taylor', 'Skyler']
+LAST_NAMES = ['Adams', 'Brooks', 'Carter', 'Diaz', 'Ellis', 'Foster',
+              'Garcia', 'Hayes', 'Ito', 'James', 'Khan', 'Lopez', 'Meyer',
+              'Nguyen', 'Owens', 'Patel', 'Reyes', 'Silva', 'Turner', 'Wu']
+TITLES = ['CEO', 'CFO', 'CTO', 'VP Sales', 'VP Engineering', 'Director',
+          'Senior Manager', 'Manager', 'Team Lead', 'Analyst', 'Engineer',
+          'Buyer']
+DEPARTMENTS = ['Executive', 'Finance', 'Engineering', 'Sales', 'Marketing',
+               'Operations', 'Procurement', 'IT']
+NAME_SYLLABLES = ['ac', 'bel', 'cor', 'dyn', 'ex', 'fin', 'gal', 'hex',
+                  'ion', 'jet', 'kor', 'lum', 'max', 'nov', 'opt', 'prim',
+                  'quan', 'ros', 'syn', 'tek', 'ul', 'vel', 'wex', 'zen']
+NAME_SUFFIXES = ['Inc', 'Corp', 'LLC', 'Group', 'Systems', 'Holdings',
+                 'Labs', 'Partners']
+
+FIRST_OPEN_DATE = date(2018, 1, 1)
+OPEN_DATE_DAYS = 6*365
+
+
+@dataclass
+class ScaleConfig:
+    accounts: int = 1000
+    contacts_per_account: int = 5
+    opportunities: int = 20000
+    whales: int = 0
+    whale_share: float = 0.0
+    deep_chains: int = 0
+    chain_depth: int = 50
+    seed: int = 0
+
+
+def load_states(path: str=STATES_CSV):
+    with open(path) as f:
+        return [row['City'] for row in csv.DictReader(f)]
+
+
+def account_name(acct_id: int):
+    """
+    Unique, digit-free company name of an account. The dashboard takes the
+    company name from an opportunity name up to its first digit.
+    """
+    n, parts = acct_id, []
+    while True:
+        n, i = divmod(n, len(NAME_SYLLABLES))
+        parts.append(NAME_SYLLABLES[i])
+        if not n:
+            break
+    suffix = NAME_SUFFIXES[acct_id % len(NAME_SUFFIXES)]
+    return f"{''.join(parts).capitalize()} {suffix}"
+
+
+##########
+# LAYOUT #
+##########
+
+class ContactLayout:
+    """
+    Contact ids of every account. Contacts are numbered account by account,
+    so an account's contacts are a contiguous id range.
+    """
+    def __init__(self, cfg: ScaleConfig):
+        rng = random.Random(f"{cfg.seed}-layout")
+        self.first = array('q')
+        self.count = array('l')
+        next_id = 1
+        for acct_id in range(1, cfg.accounts+1):
+            if acct_id <= cfg.deep_chains:
+                n = cfg.chain_depth
+            else:
+                n = max(1, round(rng.expovariate(1/cfg.contacts_per_account)))
+            self.first.append(next_id)
+            self.count.append(n)
+            next_id += n
+        self.total = next_id - 1
+
+    def contacts(self, acct_id: int):
+        first = self.first[acct_id-1]
+        return range(first, first + self.count[acct_id-1])
+
+
+########
+# ROWS #
+########
+
+def account_rows(cfg: ScaleConfig, states: List[str]) -> Iterator[list]:
+    rng = random.Random(f"{cfg.seed}-account")
+    for acct_id in range(1, cfg.accounts+1):
+        name = account_name(acct_id)
+        domain = name.split()[0].lower()
+        billing = rng.choice(states)
+        yield [
+            acct_id,
+            name,
+            rng.choice(ACCOUNT_TYPES),
+            f"{rng.randint(1, 9999)} {rng.choice(LAST_NAMES)} St",
+            f"{rng.choice(LAST_NAMES)}ville",
+            billing,
+            f"{rng.randint(10000, 99999)}",
+            billing if rng.random() < 0.8 else rng.choice(states),
+            f"({rng.randint(200, 999)}) 555-{rng.randint(0, 9999):04d}",
+            f"www.{domain}.com",
+            f"{name} builds {rng.choice(DEPARTMENTS).lower()} software",
+            rng.choice(RATINGS),
+            rng.randint(1900, 2022),
+            rng.choice(SOURCES),
+            rng.choice(CLEAN_STATUSES),
+            rng.choice(OWNERSHIPS),
+            # In thousands, bucketed by the loaders
+            int(rng.lognormvariate(math.log(30000), 0.9))
+        ]
+
+
+def contact_rows(cfg: ScaleConfig,
+                 layout: ContactLayout,
+                 states: List[str]
+                ) -> Iterator[list]:
+    rng = random.Random(f"{cfg.seed}-contact")
+    for acct_id in range(1, cfg.accounts+1):
+        contacts = layout.contacts(acct_id)
+        deep = acct_id <= cfg.deep_chains
+        for i, contact_id in enumerate(contacts):
+            if i == 0:
+                manager = ''
+            elif deep:
+                # Each contact reports to the one before it
+                manager = contact_id - 1
+            else:
+                manager = contacts[rng.randrange(i)]
+            yield [
+                contact_id,
+                acct_id,
+                rng.choice(SALUTATIONS),
+                rng.choice(FIRST_NAMES),
+                rng.choice(LAST_NAMES),
+                TITLES[0] if i == 0 else rng.choice(TITLES[1:]),
+                rng.choice(DEPARTMENTS),
+                manager,
+                rng.choice(SOURCES),
+                rng.choice(states)
+            ]
+
+
+def opportunity_rows(cfg: ScaleConfig,
+                     layout: ContactLayout
+                    ) -> Iterator[list]:
+    rng = random.Random(f"{cfg.seed}-opportunity")
+    stages, weights = zip(*STAGES)
+    whales = min(cfg.whales, cfg.accounts)
+    for opp_id in range(1, cfg.opportunities+1):
+        if whales and rng.random() < cfg.whale_share:
+            acct_id = rng.randint(1, whales)
+        else:
+            acct_id = rng.randint(1, cfg.accounts)
+        contacts = layout.contacts(acct_id)
+        opened = FIRST_OPEN_DATE + timedelta(rng.randrange(OPEN_DATE_DAYS))
+        closed = opened + timedelta(rng.randrange(1, 180))
+        stage = rng.choices(stages, weights)[0]
+        yield [
+            opp_id,
+            acct_id,
+            contacts[rng.randrange(len(contacts))],
+            f"{account_name(acct_id)} {opened.isoformat()}",
+            f"{rng.choice(OPPORTUNITY_TYPES)} deal",
+            int(rng.lognormvariate(math.log(50000), 1.0)),
+            stage,
+            rng.choice(OPPORTUNITY_TYPES),
+            rng.choice(SOURCES),
+            closed.isoformat()
+        ]
+
+
+###########
+# WRITING #
+###########
+
+def write_csv(path: str, columns: List[str], rows: Iterator[list]):
+    """
+    Streams rows to a CSV
+
+    RETURNS
+    -------
+    int
+        number of rows written
+    """
+    n = 0
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for n, row in enumerate(rows, start=1):
+            writer.writerow(row)
+    os.replace(tmp, path)
+    return n
+
+
+def generate(cfg: ScaleConfig,
+             out_dir: str=OUTPUT_DIR,
+             states_csv: str=STATES_CSV,
+             verbose: bool=True
+            ):
+    """
+    Writes Account.csv, Contact.csv and Opportunity.csv, and the settings
+    they were generated with
+
+    RETURNS
+    -------
+    dict
+        number of rows per file
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    states = load_states(states_csv)
+    layout = ContactLayout(cfg)
+    counts: Dict[str, int] = {}
+    for filename, columns, rows in (
+        ('Account.csv', ACCOUNT_COLUMNS, account_rows(cfg, states)),
+        ('Contact.csv', CONTACT_COLUMNS, contact_rows(cfg, layout, states)),
+        ('Opportunity.csv', OPPORTUNITY_COLUMNS,
+         opportunity_rows(cfg, layout)),
+    ):
+        start = time.perf_counter()
+        counts[filename] = write_csv(
+            os.path.join(out_dir, filename), columns, rows
+        )
+        if verbose:
+            print(
+                f"Wrote {counts[filename]} rows to {filename} in "
+                f"{time.perf_counter()-start:.2f}s"
+            )
+    with open(os.path.join(out_dir, 'generate.json'), 'w') as f:
+        json.dump({'config': asdict(cfg), 'rows': counts}, f, indent=2)
+    return counts
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Generate synthetic CRM CSVs at scale"
+    )
+    defaults = ScaleConfig()
+    parser.add_argument('--out-dir', default=OUTPUT_DIR)
+    parser.add_argument('--accounts', type=int, default=defaults.accounts)
+    parser.add_argument('--contacts-per-account', type=int,
+                        default=defaults.contacts_per_account,
+                        help="mean number of contacts per account")
+    parser.add_argument('--opportunities', type=int,
+                        default=defaults.opportunities)
+    parser.add_argument('--whales', type=int, default=defaults.whales,
+                        help="number of whale accounts")
+    parser.add_argument('--whale-share', type=float,
+                        default=defaults.whale_share,
+                        help="share of opportunities that go to whales")
+    parser.add_argument('--deep-chains', type=int,
+                        default=defaults.deep_chains,
+                        help="number of accounts with a single deep "
+                             "REPORTS_TO chain")
+    parser.add_argument('--chain-depth', type=int,
+                        default=defaults.chain_depth)
+    parser.add_argument('--seed', type=int, default=defaults.seed)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    generate(
+        ScaleConfig(
+            accounts=args.accounts,
+            contacts_per_account=args.contacts_per_account,
+            opportunities=args.opportunities,
+            whales=args.whales,
+            whale_share=args.whale_share,
+            deep_chains=args.deep_chains,
+            chain_depth=args.chain_depth,
+            seed=args.seed
+        ),
+        args.out_dir
+    )
@@ -0,0 +1,294 @@
+"""
+Health check of the CRM graph against the manifest written by the loaders.
+
+After every load the loaders write a manifest with the number of nodes per
+label and relationships per type they wrote, counted from the source rows
+rather than read back from the graph, and stamped with the graph version. The
+check reads the same numbers from the count store, which answers a count over
+a single label or relationship type without touching any nodes, so it
+finishes in milliseconds regardless of the size of the graph.
+
+The exit code makes it usable as a readiness probe:
+
+- 0: the graph matches the manifest
+- 1: the database cannot be reached or there is no manifest
+- 2: the graph does not match the manifest
+
+Example
+-------
+python setup/healthcheck.py && streamlit run ./app/Home.py
+python setup/healthcheck.py --count
+"""
+from typing import (Dict, List, Optional)
+import argparse
+import json
+import os
+import time
+
+import sources as src
+from common import (add_connection_args, get_driver)
+
+
+MANIFEST_PATH = './setup/manifest.json'
+
+# Bookkeeping nodes written by the migrations and loaders, not by the data
+EXCLUDED_LABELS = ('SchemaMigration', 'GraphVersion')
+
+
+###########
+# QUERIES #
+###########
+
+def count_store_query(labels: List[str], rel_types: List[str]):
+    """
+    One count per label and relationship type. Every branch is a single
+    label or type pattern, so each is planned as a count store lookup.
+    """
+    parts = [
+        f"MATCH (n:`{label}`) "
+        f"RETURN 'node' AS kind, '{label}' AS name, count(n) AS count"
+        for label in labels
+    ] + [
+        f"MATCH ()-[r:`{rel_type}`]->() "
+        f"RETURN 'relationship' AS kind, '{rel_type}' AS name, "
+        "count(r) AS count"
+        for rel_type in rel_types
+    ]
+    return " UNION ALL ".join(parts)
+
+
+############
+# COUNTING #
+############
+
+def graph_counts(driver, database: Optional[str]=None):
+    """
+    Reads the count store for every label and relationship type
+
+    RETURNS
+    -------
+    dict
+        {'nodes': {label: count}, 'relationships': {type: count}}
+    """
+    counts = {'nodes': {}, 'relationships': {}}
+    with driver.session(database=database) as session:
+        labels = [
+            label for label in session.run("CALL db.labels()").value()
+            if label not in EXCLUDED_LABELS
+        ]
+        rel_types = session.run("CALL db.relationshipTypes()").value()
+        if not labels and not rel_types:
+            return counts
+        result = session.run(count_store_query(labels, rel_types))
+        for record in result:
+            key = 'nodes' if record['kind'] == 'node' else 'relationships'
+            counts[key][record['name']] = record['count']
+    return counts
+
+
+def total_nodes(driver, database: Optional[str]=None):
+    """
+    Number of data nodes, excluding the bookkeeping labels
+    """
+    return sum(graph_counts(driver, database)['nodes'].values())
+
+
+def graph_version(driver, database: Optional[str]=None):
+    with driver.session(database=database) as session:
+        record = session.run(
+            "MATCH (v:GraphVersion {name: 'crm'}) RETURN v.version"
+        ).single()
+    return record[0] if record else None
+
+
+############
+# MANIFEST #
+############
+
+def build_manifest(version: Optional[int],
+                   nodes: Dict[str, int],
+                   relationships: Dict[str, int]
+                  ):
+    return {
+        'version': version,
+        'writtenAt': int(time.time()*1000),
+        'nodes': {k: int(v) for k, v in sorted(nodes.items()) if v},
+        'relationships': {
+            k: int(v) for k, v in sorted(relationships.items()) if v
+        }
+    }
+
+
+def save_manifest(manifest: dict, path: str=MANIFEST_PATH):
+    """
+    Writes the manifest atomically so a probe never reads half a file
+    """
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
+    return path
+
+
+def load_manifest(path: str=MANIFEST_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+class SourceCounts:
+    """
+    Counts the nodes and relationships a load writes from the transformed
+    source frames. Nodes are merged on their key and relationships on their
+    ends, so both are counted as distinct values, and a relationship only
+    counts if its target node is written too.
+    """
+    def __init__(self):
+        # Keys or lookup values per label
+        self.nodes = {}
+        # Status label of every opportunity, the last row wins
+        self.status = {}
+        # (src, dst) pairs per (label, relationship type, target label)
+        self.pairs = {}
+
+    def add(self,
+            label: str,
+            frame,
+            lookups: list=(),
+            links: list=()
+           ):
+        key = src.NODE_KEYS[label]
+        frame = frame.dropna(subset=[key])
+        self.nodes.setdefault(label, set()).update(frame[key].tolist())
+        if 'status' in frame:
+            self.status.update(
+                zip(frame[key].tolist(), frame['status'].tolist())
+            )
+        for col, dst_label, _, _ in lookups:
+            self.nodes.setdefault(dst_label, set()).update(
+                frame[col].dropna().tolist()
+            )
+        for col, dst_label, _, rel_type in list(lookups) + list(links):
+            pairs = src.link_pairs(frame, key, col)
+            self.pairs.setdefault((label, rel_type, dst_label), set()).update(
+                zip(pairs['src'].tolist(), pairs['dst'].tolist())
+            )
+
+    def counts(self):
+        """
+        RETURNS
+        -------
+        tuple[dict, dict]
+            nodes per label and relationships per type
+        """
+        nodes = {label: len(values) for label, values in self.nodes.items()}
+        for status in self.status.values():
+            nodes[status] = nodes.get(status, 0) + 1
+        relationships = {}
+        for (_, rel_type, dst_label), pairs in self.pairs.items():
+            targets = self.nodes.get(dst_label, set())
+            relationships[rel_type] = relationships.get(rel_type, 0) + sum(
+                dst in targets for _, dst in pairs
+            )
+        return nodes, relationships
+
+    def manifest(self, version: Optional[int]):
+        return build_manifest(version, *self.counts())
+
+
+#########
+# CHECK #
+#########
+
+def diff_counts(expected: dict, actual: dict):
+    """
+    Compares two sets of counts
+
+    RETURNS
+    -------
+    list[tuple[str, str, int, int]]
+        (kind, name, expected, actual) for every count that differs
+    """
+    diffs = []
+    for kind in ('nodes', 'relationships'):
+        exp, act = expected.get(kind, {}), actual.get(kind, {})
+        for name in sorted(set(exp) | set(act)):
+            if exp.get(name, 0) != act.get(name, 0):
+                diffs.append((kind, name, exp.get(name, 0), act.get(name, 0)))
+    return diffs
+
+
+def check(driver,
+          database: Optional[str]=None,
+          path: str=MANIFEST_PATH,
+          verbose: bool=True
+         ):
+    """
+    Compares the graph with the manifest
+
+    RETURNS
+    -------
+    int
+        exit code, see the module docstring
+    """
+    start = time.perf_counter()
+    try:
+        manifest = load_manifest(path)
+    except (OSError, ValueError) as err:
+        print(f"ERROR: cannot read manifest {path}: {err}")
+        return 1
+    try:
+        counts = graph_counts(driver, database)
+        version = graph_version(driver, database)
+    except Exception as err:
+        print(f"ERROR: cannot reach the database: {err}")
+        return 1
+
+    diffs = diff_counts(manifest, counts)
+    if version != manifest.get('version'):
+        print(
+            f"ERROR: manifest is for graph version {manifest.get('version')}, "
+            f"the graph is at version {version}"
+        )
+    for kind, name, exp, act in diffs:
+        print(f"ERROR: expected {exp} {name} {kind}, got {act}")
+    ok = not diffs and version == manifest.get('version')
+    if verbose:
+        n_nodes = sum(counts['nodes'].values())
+        n_rels = sum(counts['relationships'].values())
+        print(
+            f"{'OK' if ok else 'FAILED'}: {n_nodes} nodes and {n_rels} "
+            f"relationships at version {version} "
+            f"({(time.perf_counter()-start)*1000:.1f}ms)"
+        )
+    return 0 if ok else 2
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Check the CRM graph against the loader manifest"
+    )
+    add_connection_args(parser)
+    parser.add_argument('--manifest', default=MANIFEST_PATH)
+    parser.add_argument('--count', action='store_true',
+                        help="print the number of data nodes and exit")
+    parser.add_argument('--quiet', action='store_true')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    driver = get_driver(args)
+    try:
+        if args.count:
+            print(total_nodes(driver, args.database))
+            code = 0
+        else:
+            code = check(
+                driver,
+                args.database,
+                args.manifest,
+                verbose=not args.quiet
+            )
+    finally:
+        driver.close()
+    raise SystemExit(code)
@@ -0,0 +1,107 @@
+"""
+Precomputed Contact management chains.
+
+The REPORTS_TO hierarchy is small enough to resolve on the client. For every
+Contact we store its depth, its top manager, its full chain of managers and
+its span of control, so org-chart questions are point lookups on indexed
+properties instead of variable-length REPORTS_TO traversals.
+"""
+from typing import (Dict, Iterable, Optional, Tuple)
+
+
+HIERARCHY_PROPERTIES = [
+    'depth', 'topManagerId', 'managementChain', 'directReports',
+    'spanOfControl'
+]
+
+WRITE_HIERARCHY_QUERY = (
+    "UNWIND $rows AS row "
+    "MATCH (con:Contact {contactId: row.contactId}) "
+    "SET con.depth = row.depth, "
+    "con.topManagerId = row.topManagerId, "
+    "con.managementChain = row.managementChain, "
+    "con.directReports = row.directReports, "
+    "con.spanOfControl = row.spanOfControl"
+)
+
+
+def management_chains(contact_ids: Iterable[int],
+                      reports_to: Iterable[Tuple[int, int]]
+                     ):
+    """
+    Resolves the management chain of every contact
+
+    A manager that is not a known contact ends the chain, the same way the
+    REPORTS_TO relationship is only created when the manager exists. Cycles
+    are broken at the first repeated contact.
+
+    Parameters
+    ----------
+    contact_ids
+        every contact id
+    reports_to
+        (contact id, manager id) pairs
+
+    RETURNS
+    -------
+    dict[int, dict]
+        contact id -> depth, topManagerId, managementChain (direct manager
+        first), directReports and spanOfControl (all reports, direct or not)
+    """
+    contacts = set(contact_ids)
+    manager: Dict[int, Optional[int]] = {
+        sub: mgr for sub, mgr in reports_to
+        if sub in contacts and mgr in contacts and sub != mgr
+    }
+    chains: Dict[int, list] = {}
+
+    for start in contacts:
+        if start in chains:
+            continue
+        # Walk up until a contact with a known chain or the top
+        path = [start]
+        on_path = {start}
+        node = manager.get(start)
+        while node is not None and node not in chains and node not in on_path:
+            path.append(node)
+            on_path.add(node)
+            node = manager.get(node)
+        above = chains[node] if node in chains else []
+        if node is not None and node not in chains:
+            # Cycle: treat the repeated contact as the top
+            manager.pop(path[-1], None)
+            node, above = None, []
+        tail = ([node] + above) if node is not None else []
+        for i in range(len(path)-1, -1, -1):
+            chains[path[i]] = path[i+1:] + tail
+
+    direct = dict.fromkeys(contacts, 0)
+    span = dict.fromkeys(contacts, 0)
+    for sub, chain in chains.items():
+        if chain:
+            direct[chain[0]] += 1
+        for mgr in chain:
+            span[mgr] += 1
+
+    return {
+        con: {
+            'depth': len(chain),
+            'topManagerId': chain[-1] if chain else con,
+            'managementChain': chain,
+            'directReports': direct[con],
+            'spanOfControl': span[con]
+        }
+        for con, chain in chains.items()
+    }
+
+
+def hierarchy_rows(contact_ids: Iterable[int],
+                   reports_to: Iterable[Tuple[int, int]]
+                  ):
+    """
+    Management chains as rows for `WRITE_HIERARCHY_QUERY`
+    """
+    return [
+        {'contactId': con, **props}
+        for con, props in management_chains(contact_ids, reports_to).items()
+    ]
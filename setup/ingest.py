@@ -0,0 +1,348 @@
+"""
+Bulk loads the CRM graph from the source CSVs.
+
+Replaces the row-by-row LOAD CSV MERGE in `neo4j-graph-builder.cypher`. The
+CSVs are read in chunks, lookup nodes (State, Stage, Source, Rating, ...) are
+deduplicated on the client, and nodes and relationships are written with
+batched, parameterized UNWIND statements, one bounded transaction per batch.
+Relationship batches are written by parallel workers. Schema migrations are
+applied before loading so every MERGE and MATCH on a key is an index seek.
+
+Example
+-------
+python setup/ingest.py --workers 4 --batch-size 5000
+"""
+from typing import Optional
+import argparse
+import time
+
+import pandas as pd
+
+import sources as src
+from common import (add_connection_args, get_driver, to_records,
+                    write_batches, write_batches_parallel,
+                    bump_graph_version, RateReporter)
+from migrations import migrate
+from healthcheck import (save_manifest, SourceCounts, MANIFEST_PATH)
+from hierarchy import (hierarchy_rows, WRITE_HIERARCHY_QUERY)
+
+
+###########
+# QUERIES #
+###########
+
+def node_query(label: str, key: str):
+    return (
+        "UNWIND $rows AS row "
+        f"MERGE (n:{label} {{{key}: row.{key}}}) "
+        "SET n += row"
+    )
+
+
+def status_label_query(label: str, key: str, status: str):
+    others = ':'.join(s for s in src.STATUS_LABELS if s != status)
+    return (
+        "UNWIND $rows AS row "
+        f"MATCH (n:{label} {{{key}: row.key}}) "
+        f"REMOVE n:{others} "
+        f"SET n:{status}"
+    )
+
+
+def lookup_query(label: str, prop: str):
+    return (
+        "UNWIND $rows AS row "
+        f"MERGE (:{label} {{{prop}: row.value}})"
+    )
+
+
+def rel_query(src_label: str,
+              src_key: str,
+              dst_label: str,
+              dst_prop: str,
+              rel_type: str
+             ):
+    return (
+        "UNWIND $rows AS row "
+        f"MATCH (a:{src_label} {{{src_key}: row.src}}) "
+        f"MATCH (b:{dst_label} {{{dst_prop}: row.dst}}) "
+        f"MERGE (a)-[:{rel_type}]->(b)"
+    )
+
+
+CLEAR_QUERY = (
+    "MATCH (n) WHERE NOT n:SchemaMigration AND NOT n:GraphVersion "
+    "CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 10000 ROWS"
+)
+
+
+##########
+# LOADER #
+##########
+
+class GraphIngest:
+    def __init__(self,
+                 driver,
+                 database: Optional[str]=None,
+                 batch_size: int=5000,
+                 chunksize: int=20000,
+                 workers: int=4,
+                 verbose: bool=True,
+                 manifest_path: Optional[str]=MANIFEST_PATH
+                ):
+        self.driver = driver
+        self.database = database
+        self.batch_size = batch_size
+        self.chunksize = chunksize
+        self.workers = workers
+        self.verbose = verbose
+        # Counts recorded for healthcheck.py after a load, None to skip
+        self.manifest_path = manifest_path
+        self.counts = SourceCounts()
+        # Lookup values already written, per (label, property)
+        self.seen = {}
+        self.stats = {}
+
+    def log(self, msg: str):
+        if self.verbose:
+            print(msg)
+
+    def clear(self):
+        self.log("Clearing existing graph...")
+        with self.driver.session(database=self.database) as session:
+            session.run(CLEAR_QUERY).consume()
+
+    def ensure_schema(self):
+        migrate(self.driver, self.database, verbose=self.verbose)
+
+    def record_manifest(self, version: Optional[int]):
+        if self.manifest_path is not None:
+            path = save_manifest(
+                self.counts.manifest(version),
+                self.manifest_path
+            )
+            self.log(f"Wrote manifest to {path}")
+
+    def write_nodes(self, label: str, frame: pd.DataFrame, props: list):
+        key = src.NODE_KEYS[label]
+        rows = to_records(frame[props].dropna(subset=[key]))
+        n = write_batches(
+            self.driver,
+            node_query(label, key),
+            rows,
+            self.batch_size,
+            self.database
+        )
+        if 'status' in props:
+            self.write_status_labels(label, frame)
+        return n
+
+    def write_status_labels(self, label: str, frame: pd.DataFrame):
+        """
+        Moves every node to the label of its current status. Labels cannot
+        be parameters, so there is one query per status.
+        """
+        key = src.NODE_KEYS[label]
+        frame = frame.dropna(subset=[key])
+        jobs = [
+            (
+                status_label_query(label, key, status),
+                to_records(
+                    frame.loc[frame['status'] == status, [key]]
+                    .rename(columns={key: 'key'})
+                )
+            )
+            for status in src.STATUS_LABELS
+        ]
+        return write_batches_parallel(
+            self.driver,
+            jobs,
+            self.batch_size,
+            self.workers,
+            self.database
+        )
+
+    def write_lookups(self, frame: pd.DataFrame, lookups: list):
+        n = 0
+        for (label, prop), values in src.lookup_values(frame, lookups).items():
+            seen = self.seen.setdefault((label, prop), set())
+            new = values - seen
+            if not new:
+                continue
+            rows = [{'value': v} for v in sorted(new)]
+            n += write_batches(
+                self.driver,
+                lookup_query(label, prop),
+                to_records(pd.DataFrame(rows)),
+                self.batch_size,
+                self.database
+            )
+            seen.update(new)
+        return n
+
+    def write_rels(self, label: str, frame: pd.DataFrame, links: list):
+        key = src.NODE_KEYS[label]
+        jobs = [
+            (
+                rel_query(label, key, dst_label, dst_prop, rel_type),
+                to_records(src.link_pairs(frame, key, col))
+            )
+            for col, dst_label, dst_prop, rel_type in links
+        ]
+        return write_batches_parallel(
+            self.driver,
+            jobs,
+            self.batch_size,
+            self.workers,
+            self.database
+        )
+
+    def load_entity(self,
+                    name: str,
+                    path: str,
+                    label: str,
+                    frame_fx,
+                    props: list,
+                    lookups: list,
+                    links: list
+                   ):
+        nodes = RateReporter(f"{name} nodes", self.verbose)
+        rels = RateReporter(f"{name} relationships", self.verbose)
+        for raw in src.read_csv_chunks(path, self.chunksize):
+            frame = frame_fx(raw)
+            self.write_lookups(frame, lookups)
+            nodes.update(self.write_nodes(label, frame, props))
+            rels.update(self.write_rels(label, frame, lookups + links))
+            self.counts.add(label, frame, lookups, links)
+            self.on_chunk(label, frame)
+        self.stats[f"{name} nodes"] = nodes.done()
+        self.stats[f"{name} relationships"] = rels.done()
+
+    def on_chunk(self, label: str, frame: pd.DataFrame):
+        """
+        Hook called with every transformed chunk after it is written
+        """
+        if label == 'Contact':
+            self._contact_ids += frame['contactId'].dropna().tolist()
+            self._reports_to.append(
+                src.link_pairs(frame, 'contactId', src.REPORTS_TO_LINK[0])
+            )
+            self.counts.add(label, frame, links=[src.REPORTS_TO_LINK])
+
+    def load_reports_to(self):
+        # Managers can appear in a later chunk than their reports, so the
+        # hierarchy is written once every Contact exists. Each batch is an
+        # index seek on contactId for both ends.
+        _, dst_label, dst_prop, rel_type = src.REPORTS_TO_LINK
+        pairs = pd.concat(self._reports_to, ignore_index=True)
+        reporter = RateReporter("REPORTS_TO relationships", self.verbose)
+        reporter.update(write_batches_parallel(
+            self.driver,
+            [(
+                rel_query('Contact', 'contactId', dst_label, dst_prop,
+                          rel_type),
+                to_records(pairs)
+            )],
+            self.batch_size,
+            self.workers,
+            self.database
+        ))
+        self.stats["REPORTS_TO relationships"] = reporter.done()
+        self.write_hierarchy(
+            self._contact_ids,
+            zip(pairs['src'].tolist(), pairs['dst'].tolist())
+        )
+
+    def write_hierarchy(self, contact_ids: list, reports_to):
+        """
+        Stores the precomputed management chain of every Contact
+        """
+        reporter = RateReporter("Contact hierarchy", self.verbose)
+        rows = hierarchy_rows(contact_ids, reports_to)
+        reporter.update(write_batches(
+            self.driver,
+            WRITE_HIERARCHY_QUERY,
+            rows,
+            self.batch_size,
+            self.database
+        ))
+        self.stats["Contact hierarchy"] = reporter.done()
+
+    def run(self,
+            account_csv: str=src.ACCOUNT_CSV,
+            contact_csv: str=src.CONTACT_CSV,
+            opportunity_csv: str=src.OPPORTUNITY_CSV,
+            clear: bool=True
+           ):
+        start = time.perf_counter()
+        self._contact_ids = []
+        self._reports_to = []
+        self.counts = SourceCounts()
+        if clear:
+            self.clear()
+        self.ensure_schema()
+        self.load_entity(
+            'Account', account_csv, 'Account', src.account_frame,
+            src.ACCOUNT_PROPERTIES, src.ACCOUNT_LOOKUPS, []
+        )
+        self.load_entity(
+            'Contact', contact_csv, 'Contact', src.contact_frame,
+            src.CONTACT_PROPERTIES, [], src.CONTACT_LINKS
+        )
+        self.load_reports_to()
+        self.load_entity(
+            'Opportunity', opportunity_csv, 'Opportunity',
+            src.opportunity_frame, src.OPPORTUNITY_PROPERTIES,
+            src.OPPORTUNITY_LOOKUPS, src.OPPORTUNITY_LINKS
+        )
+        total = time.perf_counter() - start
+        rows = sum(s['rows'] for s in self.stats.values())
+        version = bump_graph_version(self.driver, self.database, rows)
+        self.log(
+            f"Loaded {rows} rows in {total:.2f}s ({rows/total:,.0f} rows/s), "
+            f"graph version {version}"
+        )
+        self.record_manifest(version)
+        return self.stats
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Bulk load the CRM graph with batched UNWIND writes"
+    )
+    add_connection_args(parser)
+    parser.add_argument('--account-csv', default=src.ACCOUNT_CSV)
+    parser.add_argument('--contact-csv', default=src.CONTACT_CSV)
+    parser.add_argument('--opportunity-csv', default=src.OPPORTUNITY_CSV)
+    parser.add_argument('--batch-size', type=int, default=5000,
+                        help="rows per transaction")
+    parser.add_argument('--chunksize', type=int, default=20000,
+                        help="CSV rows read at a time")
+    parser.add_argument('--workers', type=int, default=4,
+                        help="parallel relationship writers")
+    parser.add_argument('--no-clear', action='store_true',
+                        help="do not delete the existing graph first")
+    parser.add_argument('--manifest', default=MANIFEST_PATH,
+                        help="where to record the counts for healthcheck.py")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    driver = get_driver(args)
+    try:
+        GraphIngest(
+            driver,
+            database=args.database,
+            batch_size=args.batch_size,
+            chunksize=args.chunksize,
+            workers=args.workers,
+            manifest_path=args.manifest
+        ).run(
+            account_csv=args.account_csv,
+            contact_csv=args.contact_csv,
+            opportunity_csv=args.opportunity_csv,
+            clear=not args.no_clear
+        )
+    finally:
+        driver.close()
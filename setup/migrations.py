@@ -0,0 +1,265 @@
+"""
+Versioned schema migrations for the CRM graph.
+
+Each migration is a list of schema statements. Applied versions are recorded
+as (:SchemaMigration {version}) nodes, so running the migrations again only
+applies the ones that are missing. Migrations run before any data is loaded
+so every MERGE and MATCH on a key property is an index seek.
+
+Example
+-------
+python setup/migrations.py --dry-run
+python setup/migrations.py
+python setup/migrations.py --verify
+"""
+from typing import Optional
+from datetime import date
+import argparse
+import time
+
+from common import (add_connection_args, get_driver, run_write)
+
+
+##############
+# MIGRATIONS #
+##############
+
+# (version, description, statements)
+MIGRATIONS = [
+    (1, "Uniqueness constraints on entity ids", [
+        "CREATE CONSTRAINT account_id IF NOT EXISTS "
+        "FOR (n:Account) REQUIRE n.accountId IS UNIQUE",
+        "CREATE CONSTRAINT contact_id IF NOT EXISTS "
+        "FOR (n:Contact) REQUIRE n.contactId IS UNIQUE",
+        "CREATE CONSTRAINT opp_id IF NOT EXISTS "
+        "FOR (n:Opportunity) REQUIRE n.oppId IS UNIQUE",
+    ]),
+    (2, "Uniqueness constraints on lookup values", [
+        f"CREATE CONSTRAINT {label.lower()}_{prop} IF NOT EXISTS "
+        f"FOR (n:{label}) REQUIRE n.{prop} IS UNIQUE"
+        for label, prop in (
+            ('State', 'state'),
+            ('Stage', 'stage'),
+            ('Source', 'source'),
+            ('OpportunityType', 'type'),
+            ('Rating', 'rating'),
+            ('Year', 'year'),
+            ('CleanStatus', 'status'),
+            ('Ownership', 'ownership'),
+            ('AnnualRevenue', 'annualRevenue'),
+        )
+    ]),
+    (3, "Range and text indexes for filtered properties", [
+        "CREATE RANGE INDEX account_type IF NOT EXISTS "
+        "FOR (n:Account) ON (n.type)",
+        "CREATE TEXT INDEX account_name IF NOT EXISTS "
+        "FOR (n:Account) ON (n.name)",
+        "CREATE TEXT INDEX contact_name IF NOT EXISTS "
+        "FOR (n:Contact) ON (n.name)",
+    ]),
+    (4, "Graph version stamp", [
+        "CREATE CONSTRAINT graph_version_name IF NOT EXISTS "
+        "FOR (n:GraphVersion) REQUIRE n.name IS UNIQUE",
+    ]),
+    (5, "Contact hierarchy lookups", [
+        "CREATE RANGE INDEX contact_top_manager IF NOT EXISTS "
+        "FOR (n:Contact) ON (n.topManagerId)",
+    ]),
+    (6, "Opportunity status", [
+        "CREATE RANGE INDEX opportunity_status IF NOT EXISTS "
+        "FOR (n:Opportunity) ON (n.status)",
+    ]),
+    (7, "Opportunity dates", [
+        "CREATE RANGE INDEX opportunity_open_date IF NOT EXISTS "
+        "FOR (n:Opportunity) ON (n.openDate)",
+        "CREATE RANGE INDEX opportunity_closed_date IF NOT EXISTS "
+        "FOR (n:Opportunity) ON (n.closedDate)",
+    ]),
+]
+
+BOOTSTRAP = (
+    "CREATE CONSTRAINT schema_migration_version IF NOT EXISTS "
+    "FOR (n:SchemaMigration) REQUIRE n.version IS UNIQUE"
+)
+
+# Point lookups the dashboard and loaders rely on, with example parameters
+VERIFY_QUERIES = [
+    ("MATCH (acct:Account {accountId: $acct_num}) RETURN acct.name",
+     {'acct_num': 1}),
+    ("MATCH (con:Contact {contactId: $contact_id}) RETURN con",
+     {'contact_id': 1}),
+    ("MATCH (opp:Opportunity {oppId: $opp_id}) RETURN opp",
+     {'opp_id': 1}),
+    ("MATCH (stg:Stage {stage: $stage}) RETURN stg",
+     {'stage': 'Closed Won'}),
+    ("MATCH (st:State {state: $state}) RETURN st",
+     {'state': 'CA'}),
+    ("MATCH (src:Source {source: $source}) RETURN src",
+     {'source': 'Web'}),
+    ("MATCH (opt:OpportunityType {type: $type}) RETURN opt",
+     {'type': 'New Customer'}),
+    ("MATCH (acct:Account) WHERE acct.type = $type RETURN acct",
+     {'type': 'Customer'}),
+    ("MATCH (con:Contact) WHERE con.topManagerId = $contact_id RETURN con",
+     {'contact_id': 1}),
+    ("MATCH (opp:Opportunity) WHERE opp.status = $status RETURN opp",
+     {'status': 'Open'}),
+    ("MATCH (opp:Opportunity:Open) "
+     "WHERE opp.openDate >= $start AND opp.openDate <= $end RETURN opp",
+     {'start': date(2020, 1, 1), 'end': date(2020, 3, 31)}),
+    ("UNWIND $acct_nums AS acctNum "
+     "MATCH (acct:Account {accountId: acctNum}) RETURN acct",
+     {'acct_nums': [1, 2]}),
+]
+
+INDEX_OPERATORS = ('IndexSeek', 'IndexScan', 'IndexContainsScan')
+
+
+###########
+# RUNNING #
+###########
+
+def applied_versions(driver, database: Optional[str]=None):
+    with driver.session(database=database) as session:
+        result = session.run(
+            "MATCH (m:SchemaMigration) RETURN m.version AS version"
+        )
+        return {record['version'] for record in result}
+
+
+def pending_migrations(driver, database: Optional[str]=None):
+    applied = applied_versions(driver, database)
+    return [m for m in MIGRATIONS if m[0] not in applied]
+
+
+def migrate(driver,
+            database: Optional[str]=None,
+            dry_run: bool=False,
+            verbose: bool=True
+           ):
+    """
+    Applies every migration that has not been applied yet, in order
+
+    Parameters
+    ----------
+    driver
+        neo4j driver
+    database
+        database to migrate, defaults to the server default
+    dry_run
+        only print the statements that would run
+    verbose
+        print progress
+
+    RETURNS
+    -------
+    list[int]
+        versions applied (or that would be applied on a dry run)
+    """
+    if not dry_run:
+        with driver.session(database=database) as session:
+            session.run(BOOTSTRAP).consume()
+
+    pending = pending_migrations(driver, database)
+    if verbose and not pending:
+        print("Schema is up to date")
+
+    for version, description, statements in pending:
+        if verbose:
+            print(f"Migration {version}: {description}")
+        for stmt in statements:
+            if verbose:
+                print(f"  {stmt}")
+            if not dry_run:
+                # Schema changes need their own auto-commit transactions
+                with driver.session(database=database) as session:
+                    session.run(stmt).consume()
+        if not dry_run:
+            run_write(
+                driver,
+                "MERGE (m:SchemaMigration {version: $version}) "
+                "SET m.description = $description, "
+                "m.appliedAt = datetime()",
+                database,
+                version=version,
+                description=description
+            )
+
+    if pending and not dry_run:
+        with driver.session(database=database) as session:
+            session.run("CALL db.awaitIndexes(300)").consume()
+    return [m[0] for m in pending]
+
+
+#############
+# VERIFYING #
+#############
+
+def plan_operators(plan: dict):
+    """
+    Flattens an EXPLAIN plan into its operator names
+    """
+    ops = [plan['operatorType']]
+    for child in plan.get('children', []):
+        ops += plan_operators(child)
+    return ops
+
+
+def verify_index_usage(driver,
+                       database: Optional[str]=None,
+                       queries: list=VERIFY_QUERIES,
+                       verbose: bool=True
+                      ):
+    """
+    EXPLAINs each query and checks its plan uses an index
+
+    RETURNS
+    -------
+    list[str]
+        queries whose plan does not use an index
+    """
+    failures = []
+    with driver.session(database=database) as session:
+        for query, params in queries:
+            summary = session.run(f"EXPLAIN {query}", **params).consume()
+            ops = plan_operators(summary.plan)
+            uses_index = any(
+                any(name in op for name in INDEX_OPERATORS) for op in ops
+            )
+            if not uses_index:
+                failures.append(query)
+            if verbose:
+                status = 'ok  ' if uses_index else 'SCAN'
+                print(f"[{status}] {query}\n       {' <- '.join(ops)}")
+    return failures
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Apply schema migrations to the CRM graph"
+    )
+    add_connection_args(parser)
+    parser.add_argument('--dry-run', action='store_true',
+                        help="print pending migrations without applying")
+    parser.add_argument('--verify', action='store_true',
+                        help="EXPLAIN the lookup queries and check that "
+                             "they use indexes")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    driver = get_driver(args)
+    try:
+        start = time.perf_counter()
+        migrate(driver, args.database, dry_run=args.dry_run)
+        if not args.dry_run:
+            print(f"Migrations finished in {time.perf_counter()-start:.2f}s")
+        if args.verify:
+            failures = verify_index_usage(driver, args.database)
+            if failures:
+                raise SystemExit(
+                    f"{len(failures)} queries do not use an index"
+                )
+    finally:
+        driver.close()
@@ -1,3 +1,6 @@
+// Reference definition of the graph model. setup/ingest.py builds the same
+// graph with batched UNWIND writes and is what setup-neo4j.sh runs.
+//
 // Clear any existing data
 MATCH (n) DETACH DELETE n;
 
@@ -73,11 +76,12 @@ MERGE (con)-[:SOURCED_FROM]->(src)
 MERGE (con)-[:WORKS_IN]->(st);
 
 // Add contact reporting heirarchy relationships
-MATCH (sub:Contact WHERE sub.contactId <> 'NA')
-MATCH (mgr:Contact WHERE mgr.contactId = sub.reportsTo)
-MERGE (sub)-[:REPORTS_TO]->(mgr)
-REMOVE sub.reportsToId
-REMOVE mgr.reportsToId;
+MATCH (sub:Contact WHERE sub.reportsTo <> 'NA')
+MATCH (mgr:Contact {contactId: sub.reportsTo})
+MERGE (sub)-[:REPORTS_TO]->(mgr);
+
+// Precomputed management chains (setup/hierarchy.py) are only written by the
+// Python loaders
 
 //
 // OPPORTUNITY
@@ -89,7 +93,8 @@ MERGE (op:Opportunity {
     description: row.Description,
     amount: row.Amount,
     oppId: toInteger(row.id),
-    closedDate: row.CloseDate
+    openDate: date(right(row.Name, 10)),
+    closedDate: date(row.CloseDate)
 })
 MERGE (stg:Stage {stage: row.StageName})
 MERGE (opt:OpportunityType {type: row.Type})
@@ -102,3 +107,13 @@ MERGE (op)-[:IN_STAGE]->(stg)
 MERGE (op)-[:HAS_TYPE]->(opt)
 MERGE (op)-[:SOURCED_FROM]->(src)
 MERGE (op)-[:WORKING_WITH]->(con);
+
+// Status property and label, so open/won/lost filters skip the Stage hop
+MATCH (op:Opportunity)-[:IN_STAGE]->(stg:Stage)
+SET op.status = CASE stg.stage
+    WHEN 'Closed Won' THEN 'ClosedWon'
+    WHEN 'Closed Lost' THEN 'ClosedLost'
+    ELSE 'Open' END
+FOREACH (_ IN CASE WHEN op.status = 'Open' THEN [1] ELSE [] END | SET op:Open)
+FOREACH (_ IN CASE WHEN op.status = 'ClosedWon' THEN [1] ELSE [] END | SET op:ClosedWon)
+FOREACH (_ IN CASE WHEN op.status = 'ClosedLost' THEN [1] ELSE [] END | SET op:ClosedLost);
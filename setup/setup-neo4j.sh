@@ -1,57 +1,46 @@
 #! /bin/bash
 
 force_flag=''
+rebuild_flag=''
 
-while getopts 'f' flag;
+while getopts 'fr' flag;
 do
     case "${flag}" in
         f) force_flag='true' ;;
+        r) rebuild_flag='true' ;;
     esac
 done
 
-exp_nodes=26148
-exp_edges=130000
-
 get_order () {
-	n=$(cypher-shell --user neo4j \
-		--password none \
-		"MATCH (n) RETURN COUNT(n);")
-	n=$(echo "$n" | grep -oE '[0-9]+')
-	echo $n
-}
-get_size () {
-	n=$(cypher-shell --user neo4j \
-		--password none \
-		"MATCH ()-[r]->() RETURN COUNT(r)")
-	n=$(echo "$n" | grep -oE '[0-9]+')
-	echo $n
+	${PYTHON:-python3} ./setup/healthcheck.py --count
 }
 
-n_nodes=$(get_order)
-n_edges=$(get_size)
-
-if [ $n_nodes -eq $exp_nodes ] && [ $n_edges -eq $exp_edges ] && [ ! $force_flag ];
+# Full offline rebuild with neo4j-admin import
+if [ $rebuild_flag ];
 then
-	echo "Graph present, will not attempt to rebuild..."
-else
-	echo "Graph empty or has unexpected size/order, building..."
-	cypher-shell --user neo4j \
-		--password none \
-		-f ./setup/neo4j-graph-builder.cypher
+	echo "Rebuilding graph offline with neo4j-admin import..."
+	neo4j stop
+	${PYTHON:-python3} ./setup/admin_import.py --run || exit 1
+	neo4j start
+	until cypher-shell --user neo4j --password none "RETURN 1;" > /dev/null 2>&1;
+	do
+		sleep 1
+	done
 fi
 
-# Validate proper size and order
-n_nodes=$(get_order)
-n_edges=$(get_size)
+# Constraints and indexes are applied before any loading
+${PYTHON:-python3} ./setup/migrations.py || exit 1
 
-if [ ! $n_nodes -eq $exp_nodes ];
-then
-	echo "ERROR: Expected $exp_nodes nodes, got $n_nodes"
-	exit 2
-fi
+n_nodes=$(get_order) || exit 1
 
-if [ ! $n_edges -eq $exp_edges ];
+if [ $n_nodes -gt 0 ] && [ ! $force_flag ];
 then
-	echo "ERROR: Expected $exp_edges edges, got $n_edges"
-	exit 3
+	echo "Graph present, syncing changes..."
+	${PYTHON:-python3} ./setup/sync.py || exit 1
+else
+	echo "Graph empty or rebuild forced, building..."
+	${PYTHON:-python3} ./setup/ingest.py || exit 1
 fi
+
+# Validate the per-label and per-type counts against the loader manifest
+${PYTHON:-python3} ./setup/healthcheck.py || exit 2
@@ -0,0 +1,255 @@
+"""
+Source CSVs for the CRM graph and the vectorized transforms that turn their
+rows into node properties and relationship keys.
+
+The transforms mirror `neo4j-graph-builder.cypher` so every loader builds the
+same graph.
+"""
+import functools
+
+import numpy as np
+import pandas as pd
+
+
+###########
+# SOURCES #
+###########
+
+ACCOUNT_CSV = "https://maca-screener.s3.us-east-2.amazonaws.com/Account.csv"
+CONTACT_CSV = "https://maca-screener.s3.us-east-2.amazonaws.com/Contact.csv"
+OPPORTUNITY_CSV = (
+    "https://maca-screener.s3.us-east-2.amazonaws.com/Opportunity-Reduced.csv"
+)
+
+# Key property of each entity label
+NODE_KEYS = {
+    "Account": "accountId",
+    "Contact": "contactId",
+    "Opportunity": "oppId"
+}
+
+# rowHash is a hash of the transformed source row, used by sync.py to find
+# rows that changed since the last load
+ACCOUNT_PROPERTIES = [
+    'accountId', 'name', 'type', 'billingStreet', 'billingCity',
+    'billingPostalCode', 'phoneNumber', 'website', 'description', 'rowHash'
+]
+CONTACT_PROPERTIES = [
+    'contactId', 'name', 'title', 'department', 'reportsTo', 'rowHash'
+]
+OPPORTUNITY_PROPERTIES = [
+    'oppId', 'name', 'description', 'amount', 'openDate', 'closedDate',
+    'status', 'rowHash'
+]
+
+# Opportunities carry their status as both a property and a label, so open,
+# won and lost partitions are label scans instead of hops to Stage
+STATUS_LABELS = ['Open', 'ClosedWon', 'ClosedLost']
+CLOSED_STAGES = {
+    'Closed Won': 'ClosedWon',
+    'Closed Lost': 'ClosedLost'
+}
+
+# (column, label, property, relationship type)
+# Lookup nodes are created from the values in the column
+ACCOUNT_LOOKUPS = [
+    ('billingState', 'State', 'state', 'BILLING_ADR_IN'),
+    ('shippingState', 'State', 'state', 'SHIPPING_ADR_IN'),
+    ('rating', 'Rating', 'rating', 'GIVEN_RATING'),
+    ('year', 'Year', 'year', 'FOUNDED'),
+    ('source', 'Source', 'source', 'SOURCED_FROM'),
+    ('cleanStatus', 'CleanStatus', 'status', 'HAS_CLEAN_STATUS'),
+    ('ownership', 'Ownership', 'ownership', 'IS_CORP_TYPE'),
+    ('annualRevenue', 'AnnualRevenue', 'annualRevenue', 'HAS_ANNUAL_REVENUE'),
+]
+OPPORTUNITY_LOOKUPS = [
+    ('stage', 'Stage', 'stage', 'IN_STAGE'),
+    ('type', 'OpportunityType', 'type', 'HAS_TYPE'),
+]
+# Links only connect to nodes that already exist
+CONTACT_LINKS = [
+    ('accountId', 'Account', 'accountId', 'WORKS_FOR'),
+    ('source', 'Source', 'source', 'SOURCED_FROM'),
+    ('state', 'State', 'state', 'WORKS_IN'),
+]
+OPPORTUNITY_LINKS = [
+    ('accountId', 'Account', 'accountId', 'WITH'),
+    ('source', 'Source', 'source', 'SOURCED_FROM'),
+    ('contactId', 'Contact', 'contactId', 'WORKING_WITH'),
+]
+REPORTS_TO_LINK = ('reportsTo', 'Contact', 'contactId', 'REPORTS_TO')
+
+LOOKUP_LABELS = sorted({
+    label for _, label, _, _ in ACCOUNT_LOOKUPS + OPPORTUNITY_LOOKUPS
+})
+
+REVENUE_BINS = [-np.inf] + [10000*i for i in range(1, 11)] + [np.inf]
+REVENUE_LABELS = (
+    ['<10M']
+    + [f'{10*i}M-{10*(i+1)}M' for i in range(1, 10)]
+    + ['100M<']
+)
+
+
+###########
+# READING #
+###########
+
+def read_csv_chunks(path: str, chunksize: int=10000):
+    """
+    Reads a source CSV in chunks with every column as a string, the same
+    way LOAD CSV sees them
+    """
+    return pd.read_csv(path, dtype=str, chunksize=chunksize)
+
+
+def read_csv(path: str):
+    return pd.read_csv(path, dtype=str)
+
+
+##############
+# TRANSFORMS #
+##############
+
+def to_int(col: pd.Series):
+    """
+    Vectorized toInteger(): truncates numeric strings, anything else is null
+    """
+    return np.trunc(pd.to_numeric(col, errors='coerce')).astype('Int64')
+
+
+def revenue_bucket(col: pd.Series):
+    """
+    Vectorized AnnualRevenue bucketing from the CASE in the cypher script.
+    Missing or unparsable values fall through to the ELSE branch.
+    """
+    buckets = pd.cut(
+        to_int(col).astype(float),
+        bins=REVENUE_BINS,
+        labels=REVENUE_LABELS,
+        right=False
+    ).astype(object)
+    return buckets.where(buckets.notna(), '100M<')
+
+
+def to_date(col: pd.Series):
+    """
+    Vectorized date(): parses date strings into `datetime.date` values, which
+    the driver sends as native Cypher dates. Anything else is null.
+    """
+    dates = pd.to_datetime(col, errors='coerce')
+    return dates.dt.date.astype(object).where(dates.notna(), None)
+
+
+def opportunity_status(stage: pd.Series):
+    """
+    Vectorized status label of an opportunity from its stage name
+    """
+    return stage.map(CLOSED_STAGES).fillna('Open')
+
+
+def row_hash(frame: pd.DataFrame):
+    """
+    64-bit hash of every column of each row. Columns are hashed as strings
+    so the hash does not depend on the dtype a chunk happened to infer.
+    """
+    hashes = pd.util.hash_pandas_object(frame.astype(str), index=False)
+    return hashes.astype('int64')
+
+
+def with_row_hash(fx):
+    """
+    Adds a rowHash column, computed over the transformed row, to the output
+    of a frame transform
+    """
+    @functools.wraps(fx)
+    def wrapper(raw: pd.DataFrame):
+        frame = fx(raw)
+        frame['rowHash'] = row_hash(frame).values
+        return frame
+    return wrapper
+
+
+@with_row_hash
+def account_frame(raw: pd.DataFrame):
+    return pd.DataFrame({
+        'accountId': to_int(raw['id']),
+        'name': raw['Name'],
+        'type': raw['Type'],
+        'billingStreet': raw['BillingStreet'],
+        'billingCity': raw['BillingCity'],
+        'billingPostalCode': raw['BillingPostalCode'],
+        'phoneNumber': raw['Phone'],
+        'website': raw['Website'],
+        'description': raw['Description'],
+        'billingState': raw['BillingState'],
+        'shippingState': raw['ShippingState'],
+        'rating': raw['Rating'],
+        'year': to_int(raw['YearStarted']),
+        'source': raw['AccountSource'],
+        'cleanStatus': raw['CleanStatus'],
+        'ownership': raw['Ownership'],
+        'annualRevenue': revenue_bucket(raw['AnnualRevenue'])
+    })
+
+
+@with_row_hash
+def contact_frame(raw: pd.DataFrame):
+    return pd.DataFrame({
+        'contactId': to_int(raw['id']),
+        # Null if any part is missing, like string + in Cypher
+        'name': raw['Salutation'] + ' ' + raw['FirstName'] + ' '
+                + raw['LastName'],
+        'title': raw['Title'],
+        'department': raw['Department'],
+        'reportsTo': to_int(raw['ReportsToId']),
+        'accountId': to_int(raw['AccountId']),
+        'source': raw['LeadSource'],
+        'state': raw['OtherState']
+    })
+
+
+@with_row_hash
+def opportunity_frame(raw: pd.DataFrame):
+    return pd.DataFrame({
+        'oppId': to_int(raw['id']),
+        'name': raw['Name'],
+        'description': raw['Description'],
+        'amount': to_int(raw['Amount']),
+        # Opportunity names end with the date they were opened
+        'openDate': to_date(
+            raw['Name'].str.extract(r'(\d{4}-\d{2}-\d{2})$', expand=False)
+        ),
+        'closedDate': to_date(raw['CloseDate']),
+        'stage': raw['StageName'],
+        'status': opportunity_status(raw['StageName']),
+        'type': raw['Type'],
+        'accountId': to_int(raw['AccountId']),
+        'source': raw['LeadSource'],
+        'contactId': to_int(raw['ContactId'])
+    })
+
+
+def lookup_values(frame: pd.DataFrame, lookups: list):
+    """
+    Distinct non-null values per lookup label in a chunk
+
+    RETURNS
+    -------
+    dict[tuple[str, str], set]
+        (label, property) -> values
+    """
+    values = {}
+    for col, label, prop, _ in lookups:
+        vals = frame[col].dropna().unique().tolist()
+        values.setdefault((label, prop), set()).update(vals)
+    return values
+
+
+def link_pairs(frame: pd.DataFrame, key: str, col: str):
+    """
+    Distinct (key, value) pairs for one relationship type, dropping rows
+    where either end is missing
+    """
+    pairs = frame[[key, col]].dropna().drop_duplicates()
+    return pairs.rename(columns={key: 'src', col: 'dst'})
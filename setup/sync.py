@@ -0,0 +1,253 @@
+"""
+Incremental sync of the CRM graph with the source CSVs.
+
+Every node written by the loaders carries a `rowHash` of its source row. A
+sync compares the hashes in the CSVs with the ones in the graph and only
+touches the difference:
+
+- new rows are created with their relationships
+- changed rows are updated and only their own outgoing relationships are
+  rewired
+- rows missing from the source are deleted
+
+Relationships from unchanged rows are also created when their target node is
+new (e.g. an opportunity whose contact only now exists). The graph version
+stamp is bumped when anything changed, so the cost of a nightly refresh is
+proportional to the volume of changes rather than the size of the graph.
+
+Example
+-------
+python setup/sync.py
+"""
+import argparse
+import time
+
+import neo4j
+import pandas as pd
+
+import sources as src
+from common import (add_connection_args, get_driver, to_records,
+                    write_batches, bump_graph_version)
+from healthcheck import (graph_version, SourceCounts, MANIFEST_PATH)
+from ingest import GraphIngest
+
+
+###########
+# QUERIES #
+###########
+
+def hashes_query(label: str, key: str):
+    return f"MATCH (n:{label}) RETURN n.{key} AS key, n.rowHash AS hash"
+
+
+def delete_nodes_query(label: str, key: str):
+    return (
+        "UNWIND $rows AS row "
+        f"MATCH (n:{label} {{{key}: row.key}}) "
+        "DETACH DELETE n"
+    )
+
+
+def delete_rels_query(label: str, key: str, rel_types: list):
+    return (
+        "UNWIND $rows AS row "
+        f"MATCH (n:{label} {{{key}: row.key}})-[r:{'|'.join(rel_types)}]->() "
+        "DELETE r"
+    )
+
+
+PRUNE_LOOKUPS_QUERY = (
+    f"MATCH (n:{'|'.join(src.LOOKUP_LABELS)}) "
+    "WHERE NOT (n)--() "
+    "DELETE n"
+)
+
+
+########
+# SYNC #
+########
+
+class DeltaSync(GraphIngest):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Ids created by this sync, per label
+        self.new_ids = {}
+        # Transformed source rows, per label
+        self.frames = {}
+
+    def existing_hashes(self, label: str):
+        key = src.NODE_KEYS[label]
+        df = self.driver.execute_query(
+            hashes_query(label, key),
+            database_=self.database,
+            result_transformer_=neo4j.Result.to_df
+        )
+        if not len(df):
+            return pd.Series(dtype='int64')
+        return df.dropna(subset=['key']).set_index('key')['hash']
+
+    def diff(self, label: str, frame: pd.DataFrame):
+        """
+        Splits the source rows into new and changed rows, and lists the ids
+        in the graph that are no longer in the source
+        """
+        key = src.NODE_KEYS[label]
+        existing = self.existing_hashes(label)
+        frame = frame.dropna(subset=[key]).drop_duplicates(
+            subset=[key],
+            keep='last'
+        )
+        known = frame[key].isin(existing.index).values
+        new = frame[~known]
+        old = frame[known]
+        changed = old[
+            old['rowHash'].values != existing.reindex(old[key].values).values
+        ]
+        removed = existing.index.difference(frame[key].dropna())
+        return new, changed, removed.tolist()
+
+    def delete_nodes(self, label: str, ids: list):
+        key = src.NODE_KEYS[label]
+        return write_batches(
+            self.driver,
+            delete_nodes_query(label, key),
+            [{'key': int(i)} for i in ids],
+            self.batch_size,
+            self.database
+        )
+
+    def delete_rels(self, label: str, frame: pd.DataFrame, links: list):
+        key = src.NODE_KEYS[label]
+        rel_types = sorted({rel_type for _, _, _, rel_type in links})
+        return write_batches(
+            self.driver,
+            delete_rels_query(label, key, rel_types),
+            to_records(frame[[key]].rename(columns={key: 'key'})),
+            self.batch_size,
+            self.database
+        )
+
+    def sync_entity(self,
+                    path: str,
+                    label: str,
+                    frame_fx,
+                    props: list,
+                    lookups: list,
+                    links: list
+                   ):
+        key = src.NODE_KEYS[label]
+        frame = frame_fx(src.read_csv(path))
+        new, changed, removed = self.diff(label, frame)
+        self.log(
+            f"{label}: {len(new)} new, {len(changed)} changed, "
+            f"{len(removed)} removed"
+        )
+
+        self.delete_nodes(label, removed)
+        self.delete_rels(label, changed, lookups + links)
+
+        upsert = pd.concat([new, changed], ignore_index=True)
+        self.write_lookups(upsert, lookups)
+        self.write_nodes(label, upsert, props)
+        self.new_ids[label] = set(new[key].tolist())
+        self.write_rels(label, upsert, lookups + links)
+
+        # Unchanged rows whose link target was only just created
+        for link in links:
+            col, dst_label = link[0], link[1]
+            targets = self.new_ids.get(dst_label)
+            if not targets:
+                continue
+            rows = frame[frame[col].isin(targets)]
+            if len(rows):
+                self.write_rels(label, rows, [link])
+
+        self.frames[label] = frame
+        # The source is the whole graph after a sync
+        self.counts.add(label, frame, lookups, links)
+        self.stats[label] = {
+            'new': len(new),
+            'changed': len(changed),
+            'removed': len(removed)
+        }
+        return len(new) + len(changed) + len(removed)
+
+    def run(self,
+            account_csv: str=src.ACCOUNT_CSV,
+            contact_csv: str=src.CONTACT_CSV,
+            opportunity_csv: str=src.OPPORTUNITY_CSV
+           ):
+        start = time.perf_counter()
+        self.counts = SourceCounts()
+        self.ensure_schema()
+        changes = self.sync_entity(
+            account_csv, 'Account', src.account_frame,
+            src.ACCOUNT_PROPERTIES, src.ACCOUNT_LOOKUPS, []
+        )
+        contact_changes = self.sync_entity(
+            contact_csv, 'Contact', src.contact_frame,
+            src.CONTACT_PROPERTIES, [],
+            src.CONTACT_LINKS + [src.REPORTS_TO_LINK]
+        )
+        if contact_changes:
+            # Any change can move whole subtrees, and resolving every chain
+            # on the client is cheap
+            contacts = self.frames['Contact']
+            pairs = src.link_pairs(contacts, 'contactId', 'reportsTo')
+            self.write_hierarchy(
+                contacts['contactId'].dropna().tolist(),
+                zip(pairs['src'].tolist(), pairs['dst'].tolist())
+            )
+        changes += contact_changes
+        changes += self.sync_entity(
+            opportunity_csv, 'Opportunity', src.opportunity_frame,
+            src.OPPORTUNITY_PROPERTIES, src.OPPORTUNITY_LOOKUPS,
+            src.OPPORTUNITY_LINKS
+        )
+
+        if changes:
+            with self.driver.session(database=self.database) as session:
+                session.run(PRUNE_LOOKUPS_QUERY).consume()
+            version = bump_graph_version(self.driver, self.database, changes)
+            self.log(f"Graph version bumped to {version}")
+        else:
+            version = graph_version(self.driver, self.database)
+        self.log(
+            f"Synced {changes} changed rows in "
+            f"{time.perf_counter()-start:.2f}s"
+        )
+        self.record_manifest(version)
+        return self.stats
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Incrementally sync the CRM graph with the source CSVs"
+    )
+    add_connection_args(parser)
+    parser.add_argument('--account-csv', default=src.ACCOUNT_CSV)
+    parser.add_argument('--contact-csv', default=src.CONTACT_CSV)
+    parser.add_argument('--opportunity-csv', default=src.OPPORTUNITY_CSV)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--manifest', default=MANIFEST_PATH)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    driver = get_driver(args)
+    try:
+        DeltaSync(
+            driver,
+            database=args.database,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            manifest_path=args.manifest
+        ).run(
+            account_csv=args.account_csv,
+            contact_csv=args.contact_csv,
+            opportunity_csv=args.opportunity_csv
+        )
+    finally:
+        driver.close()
@@ -0,0 +1,83 @@
+"""
+Benchmarks of the dashboard's query and analysis functions.
+
+Every benchmark runs against the local stand-in (`fake_graph.py`) at each
+data scale in BENCH_SCALES, a comma-separated list of multiples of the
+shipped dataset (default "1"). If NEO4J_URI is set, the query benchmarks also
+run against that database at whatever scale it was loaded with.
+
+A plain test run skips the benchmarks; they only run with --benchmark-only.
+Results are stored as JSON by pytest-benchmark. A run is compared with a saved
+baseline and fails on regressions:
+
+    BENCH_SCALES=1,10,100 python -m pytest tests/benchmarks \\
+        --benchmark-only --benchmark-autosave
+    BENCH_SCALES=1,10,100 python -m pytest tests/benchmarks \\
+        --benchmark-only --benchmark-compare \\
+        --benchmark-compare-fail=median:25%
+"""
+import os
+import sys
+sys.path.insert(0, './app')
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+pytest.importorskip('pandas')
+pytest.importorskip('neo4j')
+
+
+SCALES = [
+    int(s) for s in os.environ.get('BENCH_SCALES', '1').split(',') if s
+]
+NEO4J_URI = os.environ.get('NEO4J_URI')
+
+BACKENDS = [f"fake-{scale}x" for scale in SCALES] + (
+    ['neo4j'] if NEO4J_URI else []
+)
+
+
+def pytest_collection_modifyitems(config, items):
+    """
+    Skips the benchmarks unless --benchmark-only is given, so a plain test run
+    does not time them
+    """
+    if config.getoption('benchmark_only'):
+        return
+    skip = pytest.mark.skip(reason="benchmarks only run with --benchmark-only")
+    for item in items:
+        if 'benchmark' in getattr(item, 'fixturenames', ()):
+            item.add_marker(skip)
+
+
+@pytest.fixture(scope='session', params=BACKENDS)
+def conn(request):
+    """
+    A connector per backend, shared by the session
+    """
+    if request.param == 'neo4j':
+        from utils import GraphConnector
+        conn = GraphConnector(
+            NEO4J_URI,
+            os.environ.get('NEO4J_USER', 'neo4j'),
+            os.environ.get('NEO4J_PASSWORD')
+        )
+    else:
+        from fake_graph import FakeConnector
+        conn = FakeConnector(scale=int(request.param[5:-1]))
+    yield conn
+    conn.close()
+
+
+@pytest.fixture(scope='session', params=SCALES, ids=lambda s: f"{s}x")
+def scale(request):
+    """
+    Data scale of the benchmarks that do not query the graph
+    """
+    return request.param
+
+
+@pytest.fixture(scope='session')
+def acct_nums(conn):
+    import account_analysis as aa
+    return aa.get_account_numbers(conn)
@@ -0,0 +1,280 @@
+"""
+Local stand-in for the Neo4j database used by the benchmarks.
+
+`FakeConnector` has the interface of `utils.GraphConnector`. It does not run
+Cypher. It reads the columns a query returns from its RETURN clause and
+answers with synthetic rows of the size the real query would return at the
+given scale, so the benchmarks measure the Python side of every `get_*`
+function (result transformation, DataFrame construction and what follows)
+without a database.
+"""
+import csv
+import re
+
+import numpy as np
+import pandas as pd
+
+
+# A scale of 1 is roughly the size of the shipped dataset
+BASE_ACCOUNTS = 1000
+OPPS_PER_ACCOUNT = 20
+CONTACTS_PER_ACCOUNT = 5
+
+STAGES = [
+    'Prospecting', 'Qualification', 'Needs Analysis', 'Value Proposition',
+    'Id. Decision Makers', 'Perception Analysis', 'Proposal/Price Quote',
+    'Negotiation/Review', 'Closed Won', 'Closed Lost'
+]
+SOURCES = ['Web', 'Phone Inquiry', 'Partner Referral', 'Purchased List',
+           'Other']
+TYPES = ['New Customer', 'Existing Customer - Upgrade',
+         'Existing Customer - Replacement', 'Existing Customer - Downgrade']
+LABELS = ['Account', 'Contact', 'Opportunity', 'State', 'Stage', 'Source',
+          'OpportunityType', 'Rating', 'Year', 'CleanStatus', 'Ownership',
+          'AnnualRevenue']
+REL_TYPES = ['WITH', 'WORKS_FOR', 'REPORTS_TO', 'WORKING_WITH', 'IN_STAGE',
+             'SOURCED_FROM', 'HAS_TYPE', 'BILLING_ADR_IN', 'SHIPPING_ADR_IN']
+
+with open('./app/resources/statelatlong.csv') as f:
+    STATES = [row['City'] for row in csv.DictReader(f)]
+
+
+##########
+# PARSER #
+##########
+
+def return_columns(query: str):
+    """
+    Column names of a query's result, as the driver names them: the alias if
+    there is one, the expression text otherwise
+    """
+    clause = query[query.rindex('RETURN ')+len('RETURN '):].rstrip('; ')
+    parts, depth, current = [], 0, ''
+    for char in clause:
+        depth += char in '([{'
+        depth -= char in ')]}'
+        if char == ',' and depth == 0:
+            parts.append(current)
+            current = ''
+        else:
+            current += char
+    parts.append(current)
+    columns = []
+    for part in parts:
+        match = re.search(r'\s+AS\s+`?([^`]+)`?\s*$', part)
+        columns.append(match.group(1) if match else part.strip())
+    return columns
+
+
+#########
+# GRAPH #
+#########
+
+class FakeNode(dict):
+    def __init__(self, element_id: str, label: str, **props):
+        super().__init__(props)
+        self.element_id = element_id
+        self.labels = frozenset([label])
+
+
+class FakeRelationship:
+    def __init__(self, start: FakeNode, end: FakeNode, rel_type: str):
+        self.nodes = (start, end)
+        self.type = rel_type
+
+
+class FakeGraph:
+    def __init__(self, nodes: list, relationships: list):
+        self.nodes = nodes
+        self.relationships = relationships
+
+
+class FakeResult:
+    def __init__(self, records: list):
+        self.records = records
+
+
+#############
+# CONNECTOR #
+#############
+
+class FakeConnector:
+    def __init__(self, scale: int=1, seed: int=0):
+        self.scale = scale
+        self.n_accounts = BASE_ACCOUNTS * scale
+        self.account_ids = np.arange(1, self.n_accounts+1)
+        self.rng = np.random.default_rng(seed)
+
+    def close(self):
+        pass
+
+    def n_rows(self, query: str, params: dict):
+        if 'UNWIND $acct_nums' in query:
+            n = len(params['acct_nums'])
+            if 'Stage' in query and 'COUNT(opp)' in query:
+                return n * len(STAGES)
+            if 'opp.name' in query:
+                return n * OPPS_PER_ACCOUNT
+            return n
+        if '$acct_num' in query:
+            if 'opp.name' in query:
+                return OPPS_PER_ACCOUNT
+            if 'WORKS_FOR' in query:
+                return CONTACTS_PER_ACCOUNT
+            return 1
+        if 'st.state, SUM' in query:
+            return len(STATES)
+        if 'KEYS(n)' in query:
+            return 1
+        if 'COUNT(acct.accountId)' in query:
+            return 20
+        return self.n_accounts
+
+    def values(self, column: str, n: int, params: dict):
+        rng = self.rng
+        col = column.lower()
+        if 'accountid' in col or column == 'Account Id':
+            if 'acct_nums' in params:
+                ids = np.asarray(params['acct_nums'])
+                return np.repeat(ids, max(n // max(len(ids), 1), 1))[:n]
+            return self.account_ids[:n]
+        if col.startswith('count'):
+            return rng.integers(1, 40, n)
+        if col.startswith('sum') or col.startswith('avg') or 'amount' in col:
+            return rng.integers(1_000, 500_000, n)
+        if 'state' in col:
+            return rng.choice(STATES, n)
+        if 'stage' in col:
+            return rng.choice(STAGES, n)
+        if 'source' in col:
+            return rng.choice(SOURCES, n)
+        if 'opt.type' in col or 'type' == col:
+            return rng.choice(TYPES, n)
+        if 'date' in col:
+            days = rng.integers(0, 1500, n)
+            return [str(d) for d in np.datetime64('2020-01-01') + days]
+        if 'opp.name' in col:
+            days = rng.integers(0, 1500, n)
+            return [
+                f"Company {i} {d}" for i, d in
+                zip(rng.integers(1, 1000, n),
+                    np.datetime64('2020-01-01') + days)
+            ]
+        if 'keys' in col:
+            return [['accountId', 'name', 'type', 'rowHash']] * n
+        if 'description' in col:
+            return ['Lorem ipsum dolor sit amet'] * n
+        return [f"{column} {i}" for i in rng.integers(1, 10_000, n)]
+
+    def frame(self, query: str, params: dict):
+        n = self.n_rows(query, params)
+        return pd.DataFrame({
+            col: self.values(col, n, params) for col in return_columns(query)
+        })
+
+    def subgraph(self, acct_num: int):
+        acct = FakeNode('a', 'Account', name=f"Company {acct_num}")
+        nodes, rels = [acct], []
+        for i in range(CONTACTS_PER_ACCOUNT):
+            con = FakeNode(f"c{i}", 'Contact', name=f"Contact {i}")
+            nodes.append(con)
+            rels.append(FakeRelationship(con, acct, 'WORKS_FOR'))
+            if i:
+                rels.append(FakeRelationship(con, nodes[1], 'REPORTS_TO'))
+        for label, prop, value in (('State', 'state', STATES[0]),
+                                   ('Source', 'source', SOURCES[0]),
+                                   ('Rating', 'rating', 'Hot'),
+                                   ('Year', 'year', 1990)):
+            node = FakeNode(label, label, **{prop: value})
+            nodes.append(node)
+            rels.append(FakeRelationship(acct, node, 'HAS'))
+        return FakeGraph(nodes, rels)
+
+    def query(self,
+              query: str,
+              parameters: dict=None,
+              database: str=None,
+              result_transformer_=None,
+              **kwargs
+             ):
+        params = {**(parameters or {}), **kwargs}
+        if 'db.labels' in query:
+            df = pd.DataFrame({'label': LABELS})
+        elif 'db.relationshipTypes' in query:
+            df = pd.DataFrame({'relationshipType': REL_TYPES})
+        elif 'GraphVersion' in query:
+            return FakeResult([[1]])
+        elif 'COLLECT(DISTINCT acct.accountId)' in query:
+            return FakeResult([[self.account_ids.tolist()]])
+        else:
+            df = None
+
+        name = getattr(result_transformer_, '__name__', None)
+        if name == 'graph':
+            return self.subgraph(params.get('acct_num'))
+        df = self.frame(query, params) if df is None else df
+        if name == 'to_df':
+            return df
+        if name == 'data':
+            return df.to_dict('records')
+        return FakeResult(df.values.tolist())
+
+
+########
+# DATA #
+########
+
+def opportunity_table(scale: int=1, seed: int=0):
+    """
+    Rows of `opportunity_engine.LOAD_QUERY`
+    """
+    rng = np.random.default_rng(seed)
+    n_accounts = BASE_ACCOUNTS * scale
+    n = n_accounts * OPPS_PER_ACCOUNT
+    open_date = np.datetime64('2020-01-01') + rng.integers(0, 1500, n)
+    stage = rng.choice(STAGES, n)
+    return pd.DataFrame({
+        'account': rng.integers(1, n_accounts+1, n),
+        'name': [f"Company {d}" for d in open_date],
+        'openDate': open_date.astype(str),
+        'closedDate': (open_date + rng.integers(0, 200, n)).astype(str),
+        'amount': rng.integers(1_000, 500_000, n),
+        'description': 'Lorem ipsum dolor sit amet',
+        'contact': [f"Contact {i}" for i in rng.integers(1, 5*n_accounts, n)],
+        'source': rng.choice(SOURCES, n),
+        'stage': stage,
+        'type': rng.choice(TYPES, n),
+        'status': pd.Series(stage).map({
+            'Closed Won': 'ClosedWon', 'Closed Lost': 'ClosedLost'
+        }).fillna('Open').values,
+        'state': rng.choice(STATES, n)
+    })
+
+
+def churn_dataset(scale: int=1, seed: int=0, n_orgs: int=25812):
+    """
+    Synthetic stand-in for the churn CSV, with its columns and roughly its
+    share of missing milestones
+    """
+    rng = np.random.default_rng(seed)
+    n = n_orgs * scale
+    created = np.datetime64('2022-01-01') + rng.integers(0, 365, n)
+
+    def milestone(after, share, max_days):
+        days = after + rng.integers(0, max_days, n)
+        return np.where(rng.random(n) < share, days.astype(str), None)
+
+    data = {
+        'organization_id': np.arange(n),
+        'organization_created_at': created.astype(str),
+        'first_run_at': milestone(created, 0.4, 10),
+        'first_used_feature_a': milestone(created, 0.13, 30),
+        'first_used_feature_b': milestone(created, 0.04, 40),
+        'subscription_created_at': milestone(created, 0.024, 60),
+        'initial_mrr': np.where(rng.random(n) < 0.024, 100.0, np.nan),
+    }
+    for prefix in ('num_passes_week', 'num_failures_week',
+                   'sum_test_duration_week', 'num_members_added_week'):
+        for week in range(1, 9):
+            data[f"{prefix}_{week}"] = rng.poisson(20, n).astype(float)
+    return pd.DataFrame(data)
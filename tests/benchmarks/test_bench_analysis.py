@@ -0,0 +1,171 @@
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+pytest.importorskip('pandas')
+pytest.importorskip('plotly')
+pytest.importorskip('pyvis')
+
+import neo4j
+
+import account_analysis as aa
+import global_analysis as ga
+from feature_store import FeatureStore
+from opportunity_engine import OpportunityEngine
+from fake_graph import (FakeConnector, churn_dataset, opportunity_table)
+
+
+@pytest.fixture(scope='module')
+def opportunities(scale):
+    """
+    Raw opportunity results for every account at the scale
+    """
+    conn = FakeConnector(scale)
+    return aa.get_accounts_opportunities(conn.account_ids.tolist(), conn)
+
+
+@pytest.fixture(scope='module')
+def preprocessed(opportunities):
+    return aa.preproc_results_dataframe(opportunities.copy())
+
+
+@pytest.fixture(scope='module')
+def sub_data(scale):
+    return ga.sub_feature_engineering(
+        ga.preprocess_sub_data(churn_dataset(scale))
+    )
+
+
+@pytest.fixture(scope='module')
+def engine(scale):
+    return OpportunityEngine(opportunity_table(scale))
+
+
+############
+# ANALYSIS #
+############
+
+class TestOpportunityAnalysis:
+    def test_preproc_results_dataframe(self, benchmark, opportunities):
+        result = benchmark.pedantic(
+            aa.preproc_results_dataframe,
+            setup=lambda: ((opportunities.copy(),), {}),
+            rounds=10
+        )
+        assert len(result) == len(opportunities)
+
+    def test_opportunity_summary(self, benchmark, preprocessed):
+        metrics, _ = benchmark(aa.opportunity_summary, preprocessed)
+        assert metrics['Total Account Value'] > 0
+
+    def test_opportunity_summary_by_account(self, benchmark, preprocessed):
+        metrics = benchmark(aa.opportunity_summary_by_account, preprocessed)
+        assert len(metrics)
+
+    def test_visualize_graph(self, benchmark):
+        graph = FakeConnector().subgraph(1)
+        viz = benchmark(aa.visualize_graph, graph)
+        assert len(viz.nodes) == len(graph.nodes)
+
+
+class TestOpportunityEngine:
+    def test_load(self, benchmark, scale):
+        table = opportunity_table(scale)
+        engine = benchmark(OpportunityEngine, table)
+        assert len(engine) == len(table)
+
+    @pytest.mark.parametrize('method', [
+        'number_opportunities_per_account',
+        'number_open_opps_per_account',
+        'sum_open_opps_per_account',
+        'average_opp_value_per_account',
+        'opp_value_per_state',
+    ])
+    def test_aggregate(self, benchmark, engine, method):
+        assert len(benchmark(getattr(engine, method)))
+
+    def test_account_opportunities(self, benchmark, engine):
+        acct_num = int(engine.accounts[0])
+        assert len(benchmark(engine.account_opportunities, acct_num))
+
+    def test_accounts_stage_breakdown(self, benchmark, engine):
+        acct_nums = engine.accounts[:10].tolist()
+        assert len(benchmark(engine.accounts_stage_breakdown, acct_nums))
+
+
+################
+# SUBSCRIPTION #
+################
+
+class TestSubscriptionPipeline:
+    def test_preprocess(self, benchmark, scale):
+        raw = churn_dataset(scale)
+        result = benchmark.pedantic(
+            ga.preprocess_sub_data,
+            setup=lambda: ((raw.copy(),), {}),
+            rounds=5
+        )
+        assert 'sub_in_6_weeks' in result
+
+    def test_feature_engineering(self, benchmark, scale):
+        data = ga.preprocess_sub_data(churn_dataset(scale))
+        result = benchmark.pedantic(
+            ga.sub_feature_engineering,
+            setup=lambda: ((data.copy(),), {}),
+            rounds=5
+        )
+        assert set(ga.SUB_FEATURES) <= set(result.columns)
+
+    def test_feature_store_build(self, benchmark, sub_data):
+        store = benchmark(FeatureStore.from_frame, sub_data)
+        assert len(store) == sub_data['organization_id'].nunique()
+
+    def test_feature_store_gather(self, benchmark, sub_data):
+        store = FeatureStore.from_frame(sub_data)
+        org_ids = store.ids[::max(len(store) // 1000, 1)]
+        rows = benchmark(store.rows, org_ids)
+        assert rows.shape == (len(org_ids), len(ga.SUB_FEATURES))
+
+
+##########
+# CHARTS #
+##########
+
+class TestCharts:
+    def test_distribution_chart(self, benchmark, scale):
+        data = FakeConnector(scale).query(
+            "MATCH (acct:Account)<-[:WITH]-(opp:Opportunity) "
+            "RETURN acct.accountId, COUNT(opp);",
+            result_transformer_=neo4j.Result.to_df
+        ).rename(columns={'COUNT(opp)': 'Opportunities'})
+        fig = benchmark(ga.create_distribution_chart, data, 'Opportunities')
+        assert fig is not None
+
+    def test_map_distribution_chart(self, benchmark):
+        data = ga.get_opp_value_per_state(FakeConnector()).rename(columns={
+            'SUM(toInteger(opp.amount))': 'value',
+            'st.state': 'State'
+        })
+        assert benchmark(ga.create_map_distribution_chart, data) is not None
+
+    def test_ts_dist_charts(self, benchmark, sub_data):
+        daily = ga.daily_subscriptions(sub_data)
+        assert benchmark(ga.create_ts_dist_charts, daily, 10)
+
+    def test_correlation_matrix(self, benchmark, sub_data):
+        assert len(benchmark(ga.sub_correlation_matrix, sub_data))
+
+    def test_correlation_heatmap(self, benchmark, sub_data):
+        corr = ga.sub_correlation_matrix(sub_data)
+        assert benchmark(ga.correlation_heatmap, corr) is not None
+
+    def test_opportunity_summary_graphs(self, benchmark, preprocessed):
+        _, dfs = aa.opportunity_summary(preprocessed)
+        assert benchmark(aa.opportunity_summary_graphs, dfs)
+
+    def test_comparison_stage_chart(self, benchmark):
+        breakdown = aa.get_accounts_stage_breakdown([1, 2, 3], FakeConnector())
+        assert benchmark(aa.comparison_stage_chart, breakdown) is not None
+
+    def test_sentiment_dist(self, benchmark):
+        sentiments = aa.get_financial_sentiments(1)
+        assert benchmark(aa.create_sentiment_dist, sentiments) is not None
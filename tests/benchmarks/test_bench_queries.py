@@ -0,0 +1,87 @@
+from datetime import date
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+pytest.importorskip('pandas')
+
+import account_analysis as aa
+import global_analysis as ga
+from fake_graph import FakeConnector
+
+
+START, END = date(2020, 1, 1), date(2020, 12, 31)
+
+GLOBAL_AGGREGATES = [
+    ga.get_number_opportunities_per_account,
+    ga.get_number_open_opps_per_account,
+    ga.get_number_closed_won_opps_per_account,
+    ga.get_average_opp_value_per_account,
+    ga.get_sum_closed_opps_per_account,
+    ga.get_sum_open_opps_per_account,
+    ga.get_opp_value_per_state,
+]
+
+
+def name(fx):
+    return fx.__name__
+
+
+class TestGlobalQueries:
+    @pytest.mark.parametrize('fx', GLOBAL_AGGREGATES, ids=name)
+    def test_aggregate(self, benchmark, conn, fx):
+        result = benchmark(fx, conn)
+        assert result is not None
+
+    @pytest.mark.parametrize('fx', GLOBAL_AGGREGATES, ids=name)
+    def test_aggregate_date_range(self, benchmark, conn, fx):
+        result = benchmark(fx, conn, START, END)
+        assert result is not None
+
+    @pytest.mark.parametrize('fx', [
+        ga.get_node_labels,
+        ga.get_edge_types,
+        ga.get_company_billing_states,
+        ga.get_company_shipping_states,
+    ], ids=name)
+    def test_catalog(self, benchmark, conn, fx):
+        assert benchmark(fx, conn)
+
+    def test_node_properties(self, benchmark, conn):
+        assert benchmark(ga.get_node_properties, conn, 'Account')
+
+    def test_distribution_adj_per_account(self, benchmark, conn):
+        result = benchmark(
+            ga.get_distribution_adj_per_account, conn, 'Source', 'source'
+        )
+        assert result is not None
+
+    def test_adj_per_account(self, benchmark, conn):
+        if not isinstance(conn, FakeConnector):
+            pytest.skip("labels cannot be query parameters in Cypher")
+        benchmark(ga.get_adj_per_account, conn, 'Source')
+
+
+class TestAccountQueries:
+    def test_account_numbers(self, benchmark, conn):
+        assert benchmark(aa.get_account_numbers, conn)
+
+    @pytest.mark.parametrize('fx', [
+        aa.get_account_subgraph,
+        aa.get_node_company_name,
+        aa.get_account_opportunities,
+        aa.get_account_contacts,
+    ], ids=name)
+    def test_single_account(self, benchmark, conn, acct_nums, fx):
+        result = benchmark(fx, acct_nums[0], conn)
+        assert result is not None
+
+    @pytest.mark.parametrize('n_accounts', [2, 10])
+    @pytest.mark.parametrize('fx', [
+        aa.get_accounts_summary,
+        aa.get_accounts_opportunities,
+        aa.get_accounts_stage_breakdown,
+    ], ids=name)
+    def test_multi_account(self, benchmark, conn, acct_nums, fx, n_accounts):
+        result = benchmark(fx, acct_nums[:n_accounts], conn)
+        assert len(result)
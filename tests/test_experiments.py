@@ -0,0 +1,48 @@
+import sys
+sys.path.insert(0, './models/training')
+
+import pytest
+
+pytest.importorskip('sklearn')
+pytest.importorskip('imblearn')
+pytest.importorskip('seaborn')
+
+import numpy as np
+import pandas as pd
+
+import experiments as ex
+
+
+class TestHyperband:
+    def test_serial_creates_no_pool(self, monkeypatch):
+        def no_pool(*args, **kwargs):
+            raise AssertionError("n_jobs=1 must run in process")
+
+        def fake_experiment(X, y, model_type, metric, seed, model_args,
+                            store=None, cache_dir=None):
+            return model_args['C'] + seed / 100
+
+        monkeypatch.setattr(ex, 'experiment_pool', no_pool)
+        monkeypatch.setattr(ex, 'single_experiment', fake_experiment)
+        params, scores, history = ex.hyperband(
+            np.arange(9), None, None, None, None,
+            space={'C': [0.1, 1.0, 10.0]},
+            n_jobs=1,
+            verbose=False
+        )
+        assert params['C'] == 10.0
+        assert len(scores) == 9
+        assert history['bracket'].nunique() > 1
+
+
+class TestResampleKey:
+    def test_object_columns_hash_by_value(self):
+        def frame():
+            return pd.DataFrame({
+                'a': [1.0, 2.0, 3.0],
+                'b': [str(i) for i in ('x', 'y', 'z')]
+            })
+        y = pd.Series([0, 1, 0])
+        assert ex.resample_key(frame(), y, 0) == \
+            ex.resample_key(frame(), y.copy(), 0)
+        assert ex.resample_key(frame(), y, 0) != ex.resample_key(frame(), y, 1)
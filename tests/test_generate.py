@@ -0,0 +1,62 @@
+import csv
+import sys
+sys.path.insert(0, './setup')
+
+import pytest
+
+import generate as gen
+
+
+@pytest.fixture
+def cfg():
+    return gen.ScaleConfig(
+        accounts=50, opportunities=2000, whales=2, whale_share=0.5,
+        deep_chains=1, chain_depth=30, seed=7
+    )
+
+
+def read(path):
+    with open(path, newline='') as f:
+        return list(csv.DictReader(f))
+
+
+class TestGenerate:
+    def test_seeded(self, cfg, tmp_path):
+        gen.generate(cfg, str(tmp_path / 'a'), verbose=False)
+        gen.generate(cfg, str(tmp_path / 'b'), verbose=False)
+        for name in ('Account.csv', 'Contact.csv', 'Opportunity.csv'):
+            assert (tmp_path / 'a' / name).read_text() == \
+                (tmp_path / 'b' / name).read_text()
+
+    def test_references(self, cfg, tmp_path):
+        counts = gen.generate(cfg, str(tmp_path), verbose=False)
+        assert counts['Account.csv'] == cfg.accounts
+        assert counts['Opportunity.csv'] == cfg.opportunities
+        contacts = {
+            row['id']: row for row in read(tmp_path / 'Contact.csv')
+        }
+        for row in contacts.values():
+            if row['ReportsToId']:
+                manager = contacts[row['ReportsToId']]
+                assert manager['AccountId'] == row['AccountId']
+        for row in read(tmp_path / 'Opportunity.csv'):
+            assert contacts[row['ContactId']]['AccountId'] == row['AccountId']
+
+    def test_skew(self, cfg, tmp_path):
+        gen.generate(cfg, str(tmp_path), verbose=False)
+        opps = read(tmp_path / 'Opportunity.csv')
+        whale_opps = sum(row['AccountId'] in ('1', '2') for row in opps)
+        assert whale_opps > cfg.opportunities * cfg.whale_share
+        chain = [
+            row for row in read(tmp_path / 'Contact.csv')
+            if row['AccountId'] == '1'
+        ]
+        assert len(chain) == cfg.chain_depth
+        assert all(
+            int(row['ReportsToId']) == int(row['id']) - 1 for row in chain[1:]
+        )
+
+    def test_account_names_have_no_digits(self):
+        names = {gen.account_name(i) for i in range(1, 5000)}
+        assert len(names) == 4999
+        assert not any(c.isdigit() for name in names for c in name)
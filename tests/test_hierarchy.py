@@ -0,0 +1,31 @@
+import sys
+sys.path.insert(0, './setup')
+
+from hierarchy import management_chains
+
+
+class TestManagementChains:
+    def test_chain(self):
+        chains = management_chains([1, 2, 3, 4], [(2, 1), (3, 2), (4, 2)])
+        assert chains[1] == {
+            'depth': 0,
+            'topManagerId': 1,
+            'managementChain': [],
+            'directReports': 1,
+            'spanOfControl': 3
+        }
+        assert chains[3]['managementChain'] == [2, 1]
+        assert chains[3]['depth'] == 2
+        assert chains[3]['topManagerId'] == 1
+        assert chains[2]['directReports'] == 2
+
+    def test_unknown_manager_ends_chain(self):
+        chains = management_chains([1, 2], [(2, 99)])
+        assert chains[2]['depth'] == 0
+        assert chains[2]['topManagerId'] == 2
+
+    def test_cycle(self):
+        chains = management_chains([1, 2, 3], [(1, 2), (2, 3), (3, 1)])
+        assert sorted(c['depth'] for c in chains.values()) == [0, 1, 2]
+        tops = {c['topManagerId'] for c in chains.values()}
+        assert len(tops) == 1
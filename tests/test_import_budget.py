@@ -0,0 +1,36 @@
+import sys
+sys.path.insert(0, './scripts')
+
+from import_budget import (eager_imports, parse_importtime, top_level)
+
+
+OUTPUT = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:      1500 |       2100 |   numpy.core
+import time:       300 |       2400 | numpy
+import time:        80 |         80 |     plotly.io
+import time:       200 |        280 |   plotly
+import time:        50 |       2730 | global_analysis
+"""
+
+
+class TestParseImporttime:
+    def test_parse(self):
+        timings = parse_importtime(OUTPUT)
+        assert timings['numpy'] == (300, 2400)
+        assert timings['plotly.io'] == (80, 80)
+        assert 'imported package' not in timings
+        assert len(timings) == 6
+
+    def test_ignores_other_output(self):
+        assert parse_importtime("Traceback (most recent call last):\n") == {}
+
+    def test_eager_imports(self):
+        timings = parse_importtime(OUTPUT)
+        assert eager_imports(timings) == ['plotly']
+        assert eager_imports(timings, ('pydeck',)) == []
+
+    def test_top_level(self):
+        timings = parse_importtime(OUTPUT)
+        assert top_level(timings, 2) == [('global_analysis', 2730),
+                                         ('numpy', 2400)]
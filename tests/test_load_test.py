@@ -0,0 +1,44 @@
+import sys
+sys.path.insert(0, './scripts')
+
+import pytest
+
+from load_test import (SCRIPTS, INTERACTIONS, PAGES, Sample, percentile,
+                       summarize)
+
+
+class TestPercentile:
+    def test_interpolates(self):
+        values = [1, 2, 3, 4, 5]
+        assert percentile(values, 50) == 3
+        assert percentile(values, 95) == pytest.approx(4.8)
+        assert percentile([10], 99) == 10
+
+    def test_unsorted(self):
+        assert percentile([5, 1, 4, 2, 3], 0) == 1
+
+
+class TestSummarize:
+    def test_groups(self):
+        samples = [
+            Sample(0, 'account', 'load', 1.0),
+            Sample(0, 'account', 'select_account', 0.2),
+            Sample(1, 'account', 'select_account', 0.4, 'boom'),
+        ]
+        rows = {(r['page'], r['interaction']): r
+                for r in summarize(samples, 2.0)}
+        assert rows['account', '*']['count'] == 3
+        assert rows['account', '*']['throughput'] == 1.5
+        assert rows['account', 'select_account']['errors'] == 1
+        assert rows['account', 'select_account']['p50'] == pytest.approx(300)
+
+    def test_scripts_are_runnable(self):
+        for script in SCRIPTS.values():
+            opened = set()
+            for page, interaction in script:
+                assert page in PAGES
+                if interaction == 'load':
+                    opened.add(page)
+                else:
+                    assert interaction in INTERACTIONS
+                    assert page in opened
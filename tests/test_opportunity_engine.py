@@ -0,0 +1,136 @@
+import sys
+sys.path.insert(0, './app')
+sys.path.insert(0, './tests/benchmarks')
+
+from datetime import date
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+pytest.importorskip('neo4j')
+
+import account_analysis as aa
+import global_analysis as ga
+from fake_graph import (opportunity_table, return_columns)
+from opportunity_engine import OpportunityEngine
+
+
+STATUS_LABELS = ('Open', 'ClosedWon', 'ClosedLost')
+
+
+class TableConnector:
+    """
+    Answers the aggregate queries of both views from an opportunity table
+    with Cypher's semantics: status labels come from the status property,
+    null dates fail range predicates, SUM skips nulls and AVG of only nulls
+    is null
+    """
+    def __init__(self, table: pd.DataFrame):
+        self.table = table
+
+    def query(self,
+              query: str,
+              parameters: dict=None,
+              database: str=None,
+              result_transformer_=None,
+              **params
+             ):
+        rows = self.table
+        opened = pd.to_datetime(rows['openDate'], errors='coerce')
+        mask = pd.Series(True, index=rows.index)
+        if 'start' in params:
+            mask &= opened >= pd.Timestamp(params['start'])
+        if 'end' in params:
+            mask &= opened <= pd.Timestamp(params['end'])
+        for status in STATUS_LABELS:
+            if f"NOT opp:{status}" in query:
+                mask &= rows['status'].ne(status)
+            elif f":Opportunity:{status})" in query:
+                mask &= rows['status'].eq(status)
+        if 'acct_nums' in params:
+            mask &= rows['account'].isin(params['acct_nums'])
+        rows = rows[mask]
+
+        columns = return_columns(query)
+        if columns[0] == 'st.state':
+            keys = ['state']
+        elif 'Stage' in columns:
+            keys = ['account', 'stage']
+        else:
+            keys = ['account']
+        groups = rows.dropna(subset=keys).groupby(keys)['amount']
+        if 'COUNT(opp)' in query:
+            values = [groups.size()]
+        elif 'SUM(' in query and 'Stage' in columns:
+            values = [groups.size(), groups.sum(min_count=0)]
+        elif 'SUM(' in query:
+            values = [groups.sum(min_count=0)]
+        else:
+            values = [groups.mean()]
+        frame = pd.concat(values, axis=1).reset_index()
+        frame.columns = columns
+        return frame
+
+
+def same(engine: pd.DataFrame, cypher: pd.DataFrame):
+    keys = list(engine.columns[:-2 if 'Stage' in engine else -1])
+    engine = engine.sort_values(keys).reset_index(drop=True)
+    cypher = cypher[engine.columns].sort_values(keys).reset_index(drop=True)
+    pd.testing.assert_frame_equal(
+        engine.astype(float, errors='ignore'),
+        cypher.astype(float, errors='ignore'),
+        check_dtype=False
+    )
+
+
+@pytest.fixture(scope='module')
+def table():
+    table = opportunity_table(scale=1, seed=3)
+    table['amount'] = table['amount'].astype(float)
+    table.loc[::7, 'amount'] = None
+    table.loc[::11, 'status'] = None
+    table.loc[::13, 'openDate'] = None
+    table.loc[::17, 'stage'] = None
+    table.loc[::19, 'state'] = None
+    # An account whose opportunities have no amounts at all
+    table.loc[table['account'] == 1, 'amount'] = None
+    return table
+
+
+@pytest.fixture(scope='module')
+def engine(table):
+    return OpportunityEngine(table)
+
+
+DATES = [(None, None), (date(2021, 1, 1), date(2022, 6, 30)),
+         (date(2021, 1, 1), None)]
+
+
+@pytest.mark.parametrize('start, end', DATES)
+class TestEngineMatchesQueries:
+    @pytest.mark.parametrize('method, fx', [
+        ('number_opportunities_per_account',
+         ga.get_number_opportunities_per_account),
+        ('number_open_opps_per_account', ga.get_number_open_opps_per_account),
+        ('number_closed_won_opps_per_account',
+         ga.get_number_closed_won_opps_per_account),
+        ('average_opp_value_per_account',
+         ga.get_average_opp_value_per_account),
+        ('sum_closed_opps_per_account', ga.get_sum_closed_opps_per_account),
+        ('sum_open_opps_per_account', ga.get_sum_open_opps_per_account),
+        ('opp_value_per_state', ga.get_opp_value_per_state),
+    ])
+    def test_global(self, table, engine, method, fx, start, end):
+        same(
+            getattr(engine, method)(start, end),
+            fx(TableConnector(table), start, end)
+        )
+
+    def test_accounts_stage_breakdown(self, table, engine, start, end):
+        acct_nums = [1, 2, 3, 10, 999999]
+        same(
+            engine.accounts_stage_breakdown(acct_nums, start, end),
+            aa.get_accounts_stage_breakdown(
+                acct_nums, TableConnector(table), start, end
+            )
+        )